@@ -1,3 +1,6 @@
+import base64
+import json
+
 import pytest
 from pyutils import load_dotenv, path_join, find_project_root
 from redis.asyncio import Redis
@@ -14,8 +17,11 @@ env = get_celery_env()
 conf = env.redis
 
 QUEUE_NAME = "celery"
+TEST_QUEUE_NAME = "vodify:test:broker"
 redis_client = create_celery_redis_client(conf)
 client = CeleryRedisBrokerClient(env.redis)
+# A small chunk size makes the iteration span several `LRANGE` calls
+chunked_client = CeleryRedisBrokerClient(env.redis, scan_chunk_size=2)
 
 
 @pytest.mark.asyncio
@@ -31,6 +37,65 @@ async def test_queue():
     print(await client.get_received_task_bodies(IO_NET_QUEUE_NAME))
 
 
+@pytest.mark.asyncio
+async def test_empty_queue():
+    await redis_client.delete(TEST_QUEUE_NAME)
+    assert await client.count(TEST_QUEUE_NAME) == 0
+    assert await client.peek(TEST_QUEUE_NAME, offset=0, limit=10) == []
+    assert [t async for t in chunked_client.iter_received_tasks(TEST_QUEUE_NAME)] == []
+
+
+@pytest.mark.asyncio
+async def test_peek_and_iter():
+    await redis_client.delete(TEST_QUEUE_NAME)
+    # Celery pushes to the head, so task 0 is consumed first
+    for i in range(5):
+        await redis_client.lpush(TEST_QUEUE_NAME, create_envelope(f"id{i}", [i], {"key": f"v{i}"}))  # type: ignore
+
+    assert await client.count(TEST_QUEUE_NAME) == 5
+    tasks = [t async for t in chunked_client.iter_received_tasks(TEST_QUEUE_NAME)]
+    assert [t.headers.id for t in tasks] == [f"id{i}" for i in range(5)]
+    assert tasks[1].get_parsed_body() == {"args": [1], "kwargs": {"key": "v1"}}
+
+    assert [t.headers.id for t in await chunked_client.peek(TEST_QUEUE_NAME, offset=1, limit=3)] == ["id1", "id2", "id3"]
+    assert [t.headers.id for t in await client.peek(TEST_QUEUE_NAME, offset=4, limit=10)] == ["id4"]
+    assert await client.peek(TEST_QUEUE_NAME, offset=5, limit=10) == []
+    tasks = [t async for t in chunked_client.iter_received_tasks(TEST_QUEUE_NAME, offset=3)]
+    assert [t.headers.id for t in tasks] == ["id3", "id4"]
+
+    await redis_client.delete(TEST_QUEUE_NAME)
+
+
+def create_envelope(task_id: str, args: list, kwargs: dict) -> str:
+    # The kombu message layout, with the body encoded as `[args, kwargs, embed]`
+    body = json.dumps([args, kwargs, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}])
+    return json.dumps(
+        {
+            "body": base64.b64encode(body.encode("utf-8")).decode("utf-8"),
+            "content-encoding": "utf-8",
+            "content-type": "application/json",
+            "headers": {
+                "lang": "py",
+                "task": "test_task",
+                "id": task_id,
+                "retries": 0,
+                "root_id": task_id,
+                "parent_id": None,
+                "ignore_result": False,
+            },
+            "properties": {
+                "correlation_id": task_id,
+                "reply_to": "test",
+                "delivery_mode": 2,
+                "delivery_info": {"exchange": "", "routing_key": TEST_QUEUE_NAME},
+                "priority": 0,
+                "body_encoding": "base64",
+                "delivery_tag": f"tag-{task_id}",
+            },
+        }
+    )
+
+
 async def get_all_keys(client: Redis, pattern: str) -> list[str]:
     keys = []
     async for key in client.scan_iter(pattern):
@@ -0,0 +1,24 @@
+import pytest
+
+from tests.testutils.test_utils_misc import load_test_dotenv
+from vodify.celery import CeleryWorkerRegistry, CeleryWorkerInfo, IO_NET_QUEUE_NAME
+from vodify.env import get_celery_env
+
+load_test_dotenv(".env-server-dev")
+# load_test_dotenv(".env-server-prod")
+
+registry = CeleryWorkerRegistry(get_celery_env().redis, ttl_sec=5)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat():
+    info = CeleryWorkerInfo(name="celery@test", queues=[IO_NET_QUEUE_NAME], concurrency=2)
+    await registry.beat(info)
+
+    workers = [w for w in await registry.list_workers() if w.name == info.name]
+    assert len(workers) == 1
+    assert workers[0].queues == [IO_NET_QUEUE_NAME]
+    assert workers[0].updated_at > 0
+
+    await registry.remove(info.name)
+    assert len([w for w in await registry.list_workers() if w.name == info.name]) == 0
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from tests.testutils.test_utils_misc import load_test_dotenv
@@ -23,3 +25,39 @@ async def test_repository():
     await repo.delete(task_uname=task_uname)
     assert not await repo.exists(task_uname=task_uname)
     assert await repo.get(task_uname=task_uname) is None
+
+
+@pytest.mark.asyncio
+async def test_claim():
+    task_uname = "test_task"
+    results = await asyncio.gather(*[repo.claim(task_uname=task_uname) for _ in range(4)])
+    assert len([r for r in results if r is None]) == 1
+    assert await repo.get(task_uname=task_uname) == TaskStatus.PENDING
+
+    await repo.set_failure(task_uname=task_uname)
+    assert await repo.claim(task_uname=task_uname) is None
+    await repo.set_success(task_uname=task_uname)
+    assert await repo.claim(task_uname=task_uname) is not None
+    with pytest.raises(ValueError):
+        await repo.set_failure(task_uname=task_uname)
+
+    await repo.delete(task_uname=task_uname)
+
+
+@pytest.mark.asyncio
+async def test_bulk_query():
+    task_unames = [f"test_bulk:{i}" for i in range(5)]
+    for task_uname in task_unames:
+        await repo.set_pending(task_uname=task_uname)
+    await repo.set_failure(task_uname=task_unames[0])
+
+    statuses = await repo.get_many(task_unames + ["test_bulk:none"])
+    assert statuses[task_unames[0]] == TaskStatus.FAILURE
+    assert statuses[task_unames[1]] == TaskStatus.PENDING
+    assert statuses["test_bulk:none"] is None
+
+    failed = [entry async for entry in repo.list_by_status(prefix="test_bulk:", status=TaskStatus.FAILURE)]
+    assert [entry.task_uname for entry in failed] == [task_unames[0]]
+
+    for task_uname in task_unames:
+        await repo.delete(task_uname=task_uname)
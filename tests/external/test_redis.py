@@ -1,8 +1,10 @@
+import asyncio
+
 import pytest
 
 from tests.testutils.test_utils_misc import load_test_dotenv
 from vodify.env import get_celery_env
-from vodify.external.redis import RedisQueue, create_app_redis_client
+from vodify.external.redis import RedisQueue, create_app_redis_client, get_redis_pool_stats
 
 load_test_dotenv(".env-worker-dev")
 # load_test_dotenv(".env-worker-prod")
@@ -45,3 +47,18 @@ async def test_remove_by_value():
         print(value)
 
     await queue.clear()
+
+
+@pytest.mark.asyncio
+async def test_shared_pool():
+    assert create_app_redis_client(conf) is create_app_redis_client(conf)
+
+    await asyncio.gather(*[queue.push(f"test{i}") for i in range(conf.max_connections * 2)])
+    assert await queue.size() == conf.max_connections * 2
+
+    stats = [s for s in get_redis_pool_stats() if s.db == 0][0]
+    print(stats)
+    assert stats.in_use_cnt == 0
+    assert stats.idle_cnt <= conf.max_connections
+
+    await queue.clear()
@@ -86,6 +86,48 @@ async def test_stream_write():
     os.remove(big_file_path)
 
 
+@pytest.mark.asyncio
+async def test_read_stream_resume():
+    src_key = "/a/test_resume.bin"
+    b = os.urandom(1024 * 1024)
+    await s3.write(src_key, b)
+
+    chunks: list[bytes] = []
+    failed = False
+
+    async def on_chunk(chunk: bytes):
+        nonlocal failed
+        if not failed and len(chunks) == 3:
+            failed = True
+            raise ValueError("Failed to write chunk")
+        chunks.append(chunk)
+
+    async def on_reset():
+        chunks.clear()
+
+    result = await s3.read_stream(key=src_key, on_chunk=on_chunk, on_reset=on_reset)
+    await s3.delete(src_key)
+    assert result.retry_count == 1
+    assert result.resume_count == 1
+    assert result.wasted_bytes == 0
+    assert b"".join(chunks) == b
+
+
+@pytest.mark.asyncio
+async def test_write_file_sync_time():
+    src_key = "/a/test_sync_time.bin"
+    await s3.write(src_key, b"test")
+    file_path = path_join(find_project_root(), "dev", "test_sync_time.bin")
+
+    await s3.write_file(key=src_key, file_path=file_path, sync_time=True)
+    info = await s3.head(src_key)
+    await s3.delete(src_key)
+    mtime = os.stat(file_path).st_mtime
+    os.remove(file_path)
+    assert info is not None
+    assert int(mtime) == int(info.last_modified.timestamp())
+
+
 def print_list(res: S3ListResponse):
     print("--------list--------")
     print(res.key_count)
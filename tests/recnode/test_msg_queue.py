@@ -9,7 +9,7 @@ from pyutils import path_join, find_project_root, dirpath
 from tests.testutils.test_utils_misc import load_test_dotenv
 from vodify.common.task import TaskStatusRepository
 from vodify.env import get_celery_env
-from vodify.recnode import RecnodeMsg, RecnodeMsgQueue
+from vodify.recnode import RecnodeMsg, RecnodeMsgQueue, RecnodeDoneStatus, RecnodePlatformType
 
 load_test_dotenv(".env-worker-dev")
 # load_test_dotenv(".env-worker-prod")
@@ -34,6 +34,38 @@ async def test_clear_queue():
     await queue.clear_queue()
 
 
+@pytest.mark.asyncio
+async def test_take_and_reap():
+    await queue.clear_queue()
+    for i in range(3):
+        await queue.push(
+            RecnodeMsg(
+                status=RecnodeDoneStatus.COMPLETE,
+                platform=RecnodePlatformType.CHZZK,
+                uid="test",
+                videoName=f"v{i}",
+                fsName="local",
+            )
+        )
+
+    consumer_id = "test_consumer"
+    item = await queue.take(consumer_id)
+    assert item is not None and item.msg.video_name == "v0"
+    await queue.ack(consumer_id, item)
+
+    item = await queue.take(consumer_id)
+    assert item is not None and item.msg.video_name == "v1"
+    await queue.release(consumer_id)
+    assert (await queue.get()).video_name == "v1"  # type: ignore
+
+    # Without a lease, the in-flight message is moved back to the queue
+    await queue.take(consumer_id)
+    assert await queue.reap() == 1
+    assert await queue.size() == 2
+
+    await queue.clear_queue()
+
+
 class RecnodeQueueState(BaseModel):
     queue_items: list[RecnodeMsg]
 
@@ -46,3 +78,84 @@ async def publish_by_archive(src_path: str, recnode_queue: RecnodeMsgQueue):
         task_uname = f"{msg.platform.value}:{msg.uid}:{msg.video_name}"
         await task_status_repository.delete(task_uname=task_uname)
         await recnode_queue.push(msg)
+
+
+@pytest.mark.asyncio
+async def test_counts_and_range():
+    await queue.clear_queue()
+    await queue.push_many(
+        [
+            RecnodeMsg(
+                status=RecnodeDoneStatus.COMPLETE,
+                platform=RecnodePlatformType.CHZZK,
+                uid="test",
+                videoName=f"v{i}",
+                fsName="local",
+            )
+            for i in range(5)
+        ]
+    )
+    assert [msg.video_name for msg in await queue.list_range(offset=1, limit=2)] == ["v1", "v2"]
+
+    item = await queue.take("test_consumer")
+    await queue.ack("test_consumer", item)  # type: ignore
+    counts = await queue.get_counts()
+    assert counts.total == 4
+    assert counts.platform == {"chzzk": 4}
+    assert counts.fs_name == {"local": 4}
+
+    await queue.clear_queue()
+
+
+@pytest.mark.asyncio
+async def test_index():
+    await queue.clear_queue()
+    complete = RecnodeMsg(
+        status=RecnodeDoneStatus.COMPLETE, platform=RecnodePlatformType.CHZZK, uid="test", videoName="v0", fsName="local"
+    )
+    canceled = complete.model_copy(update={"status": RecnodeDoneStatus.CANCELED})
+    # Redelivered and canceled messages share the same video
+    await queue.push_many([complete, complete, canceled])
+
+    raws = await queue.find_by_video_name("v0")
+    assert len(raws) == 2
+    assert sorted(await queue.find(RecnodePlatformType.CHZZK.value, "test", "v0")) == sorted(raws)
+    assert len(await queue.list_by_status(RecnodeDoneStatus.CANCELED)) == 1
+
+    item = await queue.take("test_consumer")
+    await queue.ack("test_consumer", item)  # type: ignore
+    assert len(await queue.find_by_video_name("v0")) == 2
+
+    canceled_raw = canceled.model_dump_json(by_alias=True)
+    assert await queue.remove(canceled_raw)
+    assert not await queue.remove(canceled_raw)
+    assert await queue.list_by_status(RecnodeDoneStatus.CANCELED) == []
+    assert len(await queue.list_by_status(RecnodeDoneStatus.COMPLETE)) == 1
+
+    await queue.clear_queue()
+
+
+@pytest.mark.asyncio
+async def test_clear_in_flight_and_rebuild():
+    await queue.clear_queue()
+    await queue.push_many(
+        [
+            RecnodeMsg(
+                status=RecnodeDoneStatus.COMPLETE,
+                platform=RecnodePlatformType.CHZZK,
+                uid="test",
+                videoName=f"v{i}",
+                fsName="local",
+            )
+            for i in range(2)
+        ]
+    )
+    await queue.take("test_consumer")
+    await queue.rebuild_index()
+    assert (await queue.get_counts()).total == 2
+    assert len(await queue.find_by_video_name("v0")) == 1
+
+    # The in-flight message is dropped too, so the reaper has nothing to queue again
+    await queue.clear_queue()
+    assert await queue.reap() == 0
+    assert await queue.size() == 0
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from vodify.recnode import Pipeline, PipelineStage
+
+
+@pytest.mark.asyncio
+async def test_pipeline():
+    done: list[int] = []
+    aborted: list[int] = []
+
+    async def download(item: int):
+        await asyncio.sleep(0.01)
+
+    async def remux(item: int):
+        if item == 2:
+            raise ValueError("remux failed")
+
+    async def publish(item: int):
+        done.append(item)
+
+    async def on_failure(item: int, e: Exception):
+        aborted.append(item)
+
+    pipeline = Pipeline[int](
+        stages=[
+            PipelineStage("download", download, 2),
+            PipelineStage("remux", remux),
+            PipelineStage("publish", publish),
+        ],
+        to_name=str,
+        on_failure=on_failure,
+    )
+    summary = await pipeline.run(list(range(5)))
+
+    assert sorted(done) == [0, 1, 3, 4]
+    assert aborted == [2]
+    assert summary.succeeded == 4
+    assert [(f.target, f.stage) for f in summary.failures] == [("2", "remux")]
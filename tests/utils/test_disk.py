@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from vodify.utils import DiskReservationLedger
+
+FREE_SIZE = 10 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+async def test_disk_reservation(tmp_path):
+    ledger = DiskReservationLedger(str(tmp_path), get_free_size=lambda _: FREE_SIZE)
+    size = int(FREE_SIZE * 0.6)
+
+    assert (await ledger.reserve("a", size)).reserved
+    result = await ledger.reserve("b", size)
+    assert not result.reserved
+    assert result.reserved_by_others == size
+
+    await ledger.update("a", 0)
+    assert (await ledger.reserve("b", size)).reserved
+
+    await ledger.release("a")
+    await ledger.release("b")
+    assert await ledger.reserved_size() == 0
+
+
+@pytest.mark.asyncio
+async def test_disk_reservation_written(tmp_path):
+    ledger = DiskReservationLedger(str(tmp_path), get_free_size=lambda _: FREE_SIZE)
+    size = 4 * 1024 * 1024
+    dir_path = tmp_path / "a"
+    dir_path.mkdir()
+
+    assert (await ledger.reserve("a", size, path=str(dir_path))).reserved
+    (dir_path / "seg.ts").write_bytes(b"0" * 1024 * 1024)
+    # The written part is already missing from the free space
+    result = await ledger.reserve("b", 1)
+    assert result.reserved_by_others == size - 1024 * 1024
+
+    await ledger.release("a")
+    await ledger.release("b")
+
+
+@pytest.mark.asyncio
+async def test_disk_reservation_other_host(tmp_path):
+    ledger = DiskReservationLedger(str(tmp_path), get_free_size=lambda _: FREE_SIZE)
+    assert (await ledger.reserve("a", 1024)).reserved
+
+    # The pid of another container can not be checked, so its reservation is kept
+    ledger_path = tmp_path / ".disk_reservations.json"
+    entries = json.loads(ledger_path.read_text())
+    entries["a"].update(pid=2**22 + 1, host="other")
+    ledger_path.write_text(json.dumps(entries))
+    assert await ledger.reserved_size() == 1024
+
+    entries["a"].update(boot_id="other")
+    ledger_path.write_text(json.dumps(entries))
+    assert await ledger.reserved_size() == 0
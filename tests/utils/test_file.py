@@ -0,0 +1,81 @@
+import errno
+import os
+
+import pytest
+
+from vodify.utils import concat_files, move_files, move_file
+
+
+@pytest.mark.asyncio
+async def test_concat_files(tmp_path):
+    src_paths = []
+    for i in range(5):
+        src_path = str(tmp_path / f"{i}.ts")
+        with open(src_path, "wb") as f:
+            f.write(os.urandom(1000 + i))
+        src_paths.append(src_path)
+    expected = b"".join(open(src_path, "rb").read() for src_path in src_paths)
+
+    dst_path = str(tmp_path / "merged.ts")
+    await concat_files(src_paths, dst_path, remove_src=True)
+
+    with open(dst_path, "rb") as f:
+        assert f.read() == expected
+    assert all(not os.path.exists(src_path) for src_path in src_paths)
+
+
+def _write_files(dir_path, cnt: int) -> list[tuple[str, str]]:
+    os.makedirs(dir_path / "src", exist_ok=True)
+    os.makedirs(dir_path / "dst", exist_ok=True)
+    pairs = []
+    for i in range(cnt):
+        src_path = str(dir_path / "src" / f"{i}.ts")
+        with open(src_path, "wb") as f:
+            f.write(os.urandom(1000 + i))
+        os.utime(src_path, (1_000_000_000, 1_000_000_000 + i))
+        pairs.append((src_path, str(dir_path / "dst" / f"{i}.ts")))
+    return pairs
+
+
+def _raise_exdev(src, dst):
+    raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+
+@pytest.mark.asyncio
+async def test_move_files_rename(tmp_path):
+    pairs = _write_files(tmp_path, 3)
+    expected = [open(src, "rb").read() for src, _ in pairs]
+
+    result = await move_files(pairs)
+
+    assert (result.file_count, result.renamed_count, result.copied_count) == (3, 3, 0)
+    assert [open(dst, "rb").read() for _, dst in pairs] == expected
+    assert all(not os.path.exists(src) for src, _ in pairs)
+
+
+@pytest.mark.asyncio
+async def test_move_files_exdev(tmp_path, monkeypatch):
+    pairs = _write_files(tmp_path, 3)
+    expected = [open(src, "rb").read() for src, _ in pairs]
+    monkeypatch.setattr(os, "rename", _raise_exdev)
+
+    result = await move_files(pairs, copy_concurrency=2)
+
+    assert (result.file_count, result.renamed_count, result.copied_count) == (3, 0, 3)
+    assert [open(dst, "rb").read() for _, dst in pairs] == expected
+    assert all(not os.path.exists(src) for src, _ in pairs)
+    # The copied files keep the source mtime
+    assert [os.stat(dst).st_mtime for _, dst in pairs] == [1_000_000_000 + i for i in range(3)]
+
+
+@pytest.mark.asyncio
+async def test_move_file_exdev(tmp_path, monkeypatch):
+    [(src, dst)] = _write_files(tmp_path, 1)
+    expected = open(src, "rb").read()
+    monkeypatch.setattr(os, "rename", _raise_exdev)
+
+    await move_file(src, dst)
+
+    assert open(dst, "rb").read() == expected
+    assert os.stat(dst).st_mtime == 1_000_000_000
+    assert not os.path.exists(src)
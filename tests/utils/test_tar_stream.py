@@ -0,0 +1,129 @@
+import io
+import os
+import tarfile
+import zlib
+
+import pytest
+from pyutils import path_join
+
+from vodify.utils import TarStreamExtractor, extract_tar_file, read_tar_headers, extract_tar_ranges
+
+CHUNK_SIZE = 8192
+
+
+def create_tar_bytes(seg_cnt: int, with_meta: bool = False) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for i in range(seg_cnt):
+            data = os.urandom(100_000 + i)
+            tar_info = tarfile.TarInfo(f"{i}.ts")
+            tar_info.size = len(data)
+            tar.addfile(tar_info, io.BytesIO(data))
+        if with_meta:
+            tar_info = tarfile.TarInfo("meta.json")
+            tar_info.size = 2
+            tar.addfile(tar_info, io.BytesIO(b"{}"))
+    return buf.getvalue()
+
+
+async def write_chunks(extractor: TarStreamExtractor, data: bytes):
+    for i in range(0, len(data), CHUNK_SIZE):
+        await extractor.write(data[i : i + CHUNK_SIZE])
+
+
+@pytest.mark.asyncio
+async def test_stream_extract(tmp_path):
+    data = create_tar_bytes(5)
+    out_dir_path = str(tmp_path / "out")
+    tee_file_path = str(tmp_path / "0_0_0.tar")
+    os.makedirs(out_dir_path)
+
+    extractor = TarStreamExtractor(out_dir_path=out_dir_path, tee_file_path=tee_file_path, queue_size=4)
+    extractor.start()
+
+    # A retry discards everything written before
+    await write_chunks(extractor, data[: len(data) // 2])
+    await extractor.reset()
+    assert os.listdir(out_dir_path) == []
+
+    await write_chunks(extractor, data)
+    paths = await extractor.close()
+
+    assert sorted(os.listdir(out_dir_path)) == [f"{i}.ts" for i in range(5)]
+    assert sorted(paths) == sorted(path_join(out_dir_path, f"{i}.ts") for i in range(5))
+    with open(tee_file_path, "rb") as f:
+        assert f.read() == data
+
+    extracted_dir_path = str(tmp_path / "extracted")
+    os.makedirs(extracted_dir_path)
+    assert len(await extract_tar_file(tee_file_path, extracted_dir_path)) == 5
+
+
+@pytest.mark.asyncio
+async def test_stream_extract_hash(tmp_path):
+    data = create_tar_bytes(3)
+    hashes: dict[str, int] = {}
+
+    def hash_factory(path: str):
+        hashes[path] = 0
+
+        def update(chunk: memoryview):
+            hashes[path] = zlib.crc32(chunk, hashes[path])
+
+        return update
+
+    extractor = TarStreamExtractor(out_dir_path=str(tmp_path), hash_factory=hash_factory)
+    extractor.start()
+    await write_chunks(extractor, data[: len(data) // 2])
+    await extractor.reset()
+    await write_chunks(extractor, data)
+    paths = await extractor.close()
+
+    assert len(paths) == 3
+    for path in paths:
+        with open(path, "rb") as f:
+            assert hashes[path] == zlib.crc32(f.read())
+
+
+@pytest.mark.asyncio
+async def test_stream_extract_invalid(tmp_path):
+    extractor = TarStreamExtractor(out_dir_path=str(tmp_path))
+    extractor.start()
+    with pytest.raises(tarfile.ReadError):
+        await write_chunks(extractor, b"x" * 100_000)
+        await extractor.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_extract_invalid_ext(tmp_path):
+    # Any member other than a segment fails the extraction, both when streaming and from a file
+    data = create_tar_bytes(2, with_meta=True)
+    extractor = TarStreamExtractor(out_dir_path=str(tmp_path))
+    extractor.start()
+    with pytest.raises(ValueError, match="Invalid file ext"):
+        await write_chunks(extractor, data)
+        await extractor.close()
+
+    tar_path = str(tmp_path / "0_0_0.tar")
+    with open(tar_path, "wb") as f:
+        f.write(data)
+    with pytest.raises(ValueError, match="Invalid file ext"):
+        await extract_tar_file(tar_path, str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_extract_tar_ranges(tmp_path):
+    data = create_tar_bytes(3, with_meta=True)
+    tar_path = str(tmp_path / "0_0_0.tar")
+    with open(tar_path, "wb") as f:
+        f.write(data)
+
+    headers = await read_tar_headers(tar_path)
+    assert [header.name for header in headers] == ["0.ts", "1.ts", "2.ts", "meta.json"]
+
+    targets = [(header, str(tmp_path / header.name)) for header in headers[:3]]
+    await extract_tar_ranges(targets)
+    with tarfile.open(tar_path) as tar:
+        for header, out_file_path in targets:
+            with open(out_file_path, "rb") as f:
+                assert f.read() == tar.extractfile(header.name).read()  # type: ignore
@@ -6,6 +6,7 @@ from .celery_app_run import run
 from .celery_tasks import recnode_transcode
 from .celery_utils import *
 from .celery_redis_broker_client import CeleryRedisBrokerClient
+from .celery_worker_registry import CeleryWorkerRegistry, CeleryWorkerInfo, CeleryWorkerHeartbeatJob
 from .celery_constants import *
 
 targets = [
@@ -17,6 +18,7 @@ targets = [
     # "celery_tasks",  # Commented out for import in celery app
     "celery_utils",
     "celery_worker_deps",
+    "celery_worker_registry",
 ]
 if os.getenv("PY_ENV") != "prod":
     for name in list(sys.modules.keys()):
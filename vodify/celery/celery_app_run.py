@@ -3,13 +3,12 @@ import logging
 from pyutils import log
 
 from .celery_app import app
-from .celery_worker_deps import WorkerDependencyManager
+from ..env import get_worker_env
 
 
 def run():
     log.set_level(logging.DEBUG)
-    deps = WorkerDependencyManager()
-    env = deps.worker_env
+    env = get_worker_env()
     app.worker_main(
         [
             "worker",
@@ -1,6 +1,6 @@
 import base64
 import json
-from typing import Any
+from typing import Any, AsyncGenerator
 
 from pydantic import BaseModel
 
@@ -48,16 +48,41 @@ class CeleryTaskInfo(BaseModel):
         return base64.b64decode(self.body).decode("utf-8")
 
 
+DEFAULT_SCAN_CHUNK_SIZE = 100
+
+
 class CeleryRedisBrokerClient:
-    def __init__(self, conf: RedisConfig):
-        self.__conf = conf
+    def __init__(self, conf: RedisConfig, scan_chunk_size: int = DEFAULT_SCAN_CHUNK_SIZE):
+        self.__redis = create_celery_redis_client(conf)
+        self.__scan_chunk_size = scan_chunk_size
 
-    async def get_received_tasks(self, queue_name: str):
-        tasks = await create_celery_redis_client(self.__conf).lrange(queue_name, 0, -1)  # type: ignore
-        if not isinstance(tasks, list):
-            raise ValueError("Expected list data")
-        return [CeleryTaskInfo(**json.loads(task)) for task in tasks]
+    async def count(self, queue_name: str) -> int:
+        return await self.__redis.llen(queue_name)  # type: ignore
+
+    # Celery pushes to the head and pops from the tail, so the tasks are listed from the tail, in consumption order.
+    # Only the requested window is read and decoded.
+    async def peek(self, queue_name: str, offset: int, limit: int) -> list[CeleryTaskInfo]:
+        return [task async for task in self.iter_received_tasks(queue_name, offset=offset, limit=limit)]
+
+    async def iter_received_tasks(
+        self, queue_name: str, offset: int = 0, limit: int | None = None
+    ) -> AsyncGenerator[CeleryTaskInfo, None]:
+        # Each chunk is a separate `LRANGE`, so tasks may be skipped or repeated if the queue changes meanwhile
+        end = None if limit is None else offset + limit
+        start = offset
+        while end is None or start < end:
+            size = self.__scan_chunk_size if end is None else min(self.__scan_chunk_size, end - start)
+            tasks = await self.__redis.lrange(queue_name, -(start + size), -(start + 1))  # type: ignore
+            if not isinstance(tasks, list):
+                raise ValueError("Expected list data")
+            for task in reversed(tasks):
+                yield CeleryTaskInfo(**json.loads(task))
+            if len(tasks) < size:
+                break
+            start += size
+
+    async def get_received_tasks(self, queue_name: str) -> list[CeleryTaskInfo]:
+        return [task async for task in self.iter_received_tasks(queue_name)]
 
     async def get_received_task_bodies(self, queue_name: str):
-        tasks = await self.get_received_tasks(queue_name=queue_name)
-        return [task.get_parsed_body() for task in tasks]
+        return [task.get_parsed_body() async for task in self.iter_received_tasks(queue_name)]
@@ -63,6 +63,14 @@ class TaskInfo:
         )
 
 
+@dataclass
+class WorkerInspection:
+    worker_names: list[str]
+    running_tasks: list[TaskInfo]
+    prefetched_tasks: list[TaskInfo]
+    inspected_at: float  # epoch seconds
+
+
 @dataclass
 class TaskResult:
     task_id: str
@@ -1,31 +1,117 @@
 import asyncio
+from typing import Any, Coroutine
 
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown
 from pyutils import log, error_dict
 
 from .celery_app import app
 from .celery_worker_deps import WorkerDependencyManager
+from .celery_worker_registry import (
+    CeleryWorkerRegistry,
+    CeleryWorkerInfo,
+    CeleryWorkerHeartbeatJob,
+    DEFAULT_WORKER_HEARTBEAT_INTERVAL_SEC,
+)
+from ..common.job import CronJob
+from ..env import get_celery_env, get_worker_env
 from ..recnode import RecnodeMsg, RecnodeDoneStatus
 
+# Each worker process keeps a single event loop and dependency container across its tasks,
+# so that the clients and connection pools bound to the loop can be reused
+_loop: asyncio.AbstractEventLoop | None = None
+_deps: WorkerDependencyManager | None = None
+
+# The main worker process publishes a heartbeat, which the server reads to find the workers and their queues
+_heartbeat_cron: CronJob | None = None
+_heartbeat_info: CeleryWorkerInfo | None = None
+
+
+@worker_ready.connect
+def start_worker_heartbeat(sender, **_):
+    global _heartbeat_cron, _heartbeat_info
+    celery_env = get_celery_env()
+    worker_env = get_worker_env()
+    _heartbeat_info = CeleryWorkerInfo(
+        name=sender.hostname,
+        queues=worker_env.worker.queues.split(","),
+        concurrency=celery_env.worker_concurrency,
+    )
+    job = CeleryWorkerHeartbeatJob(registry=CeleryWorkerRegistry(celery_env.redis), info=_heartbeat_info)
+    _heartbeat_cron = CronJob(job=job, interval_sec=DEFAULT_WORKER_HEARTBEAT_INTERVAL_SEC, unstoppable=True)
+    _heartbeat_cron.start()
+
+
+@worker_shutdown.connect
+def stop_worker_heartbeat(**_):
+    global _heartbeat_cron, _heartbeat_info
+    if _heartbeat_cron is None or _heartbeat_info is None:
+        return
+    _heartbeat_cron.stop()
+    asyncio.run(CeleryWorkerRegistry(get_celery_env().redis).remove(_heartbeat_info.name))
+    _heartbeat_cron = None
+    _heartbeat_info = None
+
+
+@worker_process_init.connect
+def init_worker_process(**_):
+    _get_loop()
+    _get_deps()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**_):
+    global _loop, _deps
+    if _loop is None:
+        return
+    try:
+        if _deps is not None:
+            _loop.run_until_complete(_deps.close())
+    finally:
+        _loop.close()
+        _loop = None
+        _deps = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def _get_deps() -> WorkerDependencyManager:
+    global _deps
+    if _deps is None:
+        _deps = WorkerDependencyManager()
+    return _deps
+
+
+def _run(coro: Coroutine[Any, Any, Any]):
+    return _get_loop().run_until_complete(coro)
+
 
 @app.task(name="vodify.recnode.transcode")
 def recnode_transcode(dct: dict):
-    asyncio.run(_recnode_transcode(dct))
+    _run(_recnode_transcode(dct))
 
 
 async def _recnode_transcode(dct: dict):
-    deps = WorkerDependencyManager()
+    deps = _get_deps()
     msg = RecnodeMsg(**dct)
+    # Taking this task freed a slot in the broker queue, so the dispatcher can send the next one
+    await deps.recnode_queue.notify()
 
     task_uname = f"{msg.platform.value}:{msg.uid}:{msg.video_name}"
     if msg.status == RecnodeDoneStatus.COMPLETE:
-        exists_result = await deps.task_status_repository.check(task_uname=task_uname)
-        if exists_result is not None:
-            return exists_result
-
-    await deps.task_status_repository.set_pending(task_uname=task_uname)
+        claim_result = await deps.task_status_repository.claim(task_uname=task_uname)
+        if claim_result is not None:
+            return claim_result
+    else:
+        await deps.task_status_repository.set_pending(task_uname=task_uname)
 
+    transcoder = deps.get_recnode_transcoder(msg.fs_name)
     try:
-        transcoder = deps.create_recnode_transcoder(msg.fs_name)
         if msg.status == RecnodeDoneStatus.COMPLETE:
             result = await transcoder.transcode(msg.to_segments_info())
         elif msg.status == RecnodeDoneStatus.CANCELED:
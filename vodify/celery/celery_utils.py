@@ -1,7 +1,9 @@
+import time
+
 from celery import Celery
 from celery.result import AsyncResult
 
-from .celery_task_types import TaskDict, TaskResult, TaskInfo
+from .celery_task_types import TaskDict, TaskResult, TaskInfo, WorkerInspection
 
 
 def find_active_worker_names(app: Celery) -> list[str]:
@@ -31,6 +33,22 @@ def get_prefetched_tasks(app: Celery) -> list[TaskInfo]:
     return get_tasks(task_dict)
 
 
+def inspect_workers(app: Celery, timeout_sec: float = 1) -> WorkerInspection:
+    # Every live worker replies to `active` even without tasks, so its replies stand in for a separate `ping`.
+    # Celery has no built-in command replying with both active and reserved tasks, so this takes two broadcasts.
+    # A custom control command could do it in one, but every worker would have to register it before the server used it
+    inspector = app.control.inspect(timeout=timeout_sec)
+    inspected_at = time.time()
+    running = inspector.active() or {}
+    prefetched = inspector.reserved() or {}
+    return WorkerInspection(
+        worker_names=sorted(set(running.keys()) | set(prefetched.keys())),
+        running_tasks=get_tasks(running),
+        prefetched_tasks=get_tasks(prefetched),
+        inspected_at=inspected_at,
+    )
+
+
 def get_tasks(task_dict: dict) -> list[TaskInfo]:
     result = []
     for worker_name in task_dict.keys():
@@ -2,7 +2,9 @@ from ..common.fs import read_fs_config
 from ..common.task import TaskStatusRepository
 from ..env import get_worker_env, get_celery_env
 from ..external.notifier import create_notifier
-from ..recnode import RecnodeTranscoder, create_recnode_accessor
+from ..external.redis import close_redis_pools
+from ..recnode import RecnodeTranscoder, RecnodeMsgQueue, create_recnode_accessor
+from ..utils import DiskReservationLedger
 
 
 class WorkerDependencyManager:
@@ -10,19 +12,41 @@ class WorkerDependencyManager:
         self.celery_env = get_celery_env()
         self.worker_env = get_worker_env()
         self.task_status_repository = TaskStatusRepository(self.celery_env.redis)
+        self.recnode_queue = RecnodeMsgQueue(self.celery_env.redis)
+        self.disk_ledger = DiskReservationLedger(self.worker_env.tmp_dir_path)
+        self.fs_configs = read_fs_config(self.worker_env.fs_config_path)
+        self.notifier = create_notifier(env=self.worker_env.env, conf=self.worker_env.untf)
+        self.__transcoders: dict[str, RecnodeTranscoder] = {}
+
+    def get_recnode_transcoder(self, src_fs_name: str) -> RecnodeTranscoder:
+        # The transcoder and its accessor are cached by `fs_name`, so the clients are reused across tasks
+        transcoder = self.__transcoders.get(src_fs_name)
+        if transcoder is None:
+            transcoder = self.create_recnode_transcoder(src_fs_name)
+            self.__transcoders[src_fs_name] = transcoder
+        return transcoder
 
     def create_recnode_transcoder(self, src_fs_name: str) -> RecnodeTranscoder:
         env = self.worker_env
-        fs_configs = read_fs_config(env.fs_config_path)
-        notifier = create_notifier(env=env.env, conf=env.untf)
         return RecnodeTranscoder(
-            accessor=create_recnode_accessor(fs_name=src_fs_name, fs_configs=fs_configs, env=env),
-            notifier=notifier,
+            accessor=create_recnode_accessor(fs_name=src_fs_name, fs_configs=self.fs_configs, env=env),
+            notifier=self.notifier,
             out_dir_path=env.recnode.base_dir_path,
             tmp_path=env.tmp_dir_path,
             is_archive=env.recnode.is_archive,
             video_size_limit_gb=env.recnode.video_size_limit_gb,
+            stream_extract=env.recnode.stream_extract,
+            pipe_remux=env.recnode.pipe_remux,
+            ledger=self.disk_ledger,
+            reserve_timeout_sec=env.recnode.reserve_timeout_sec,
         )
 
+    async def close(self):
+        transcoders = list(self.__transcoders.values())
+        self.__transcoders = {}
+        for transcoder in transcoders:
+            await transcoder.close()
+        await close_redis_pools()
+
     def read_env(self):
         return get_worker_env()
@@ -0,0 +1,55 @@
+import json
+import time
+
+from pydantic import BaseModel
+
+from ..common.job import Job
+from ..external.redis import RedisConfig, RedisString, create_app_redis_client
+
+REDIS_CELERY_WORKER_KEY_PREFIX = "vodify:celery:worker"
+CELERY_WORKER_HEARTBEAT_JOB_NAME = "celery_worker_heartbeat_job"
+DEFAULT_WORKER_HEARTBEAT_INTERVAL_SEC = 10
+DEFAULT_WORKER_HEARTBEAT_TTL_SEC = 30
+
+
+class CeleryWorkerInfo(BaseModel):
+    name: str
+    queues: list[str]
+    concurrency: int
+    updated_at: float = 0
+
+
+class CeleryWorkerRegistry:
+    def __init__(self, redis_conf: RedisConfig, ttl_sec: int = DEFAULT_WORKER_HEARTBEAT_TTL_SEC):
+        self.__prefix = REDIS_CELERY_WORKER_KEY_PREFIX
+        self.__str = RedisString(client=create_app_redis_client(redis_conf))
+        self.__ttl_sec = ttl_sec
+
+    async def beat(self, info: CeleryWorkerInfo):
+        info = info.model_copy(update={"updated_at": time.time()})
+        await self.__str.set(key=self.__get_key(info.name), value=info.model_dump_json(), ex=self.__ttl_sec)
+
+    async def remove(self, name: str):
+        await self.__str.delete(key=self.__get_key(name))
+
+    async def list_workers(self) -> list[CeleryWorkerInfo]:
+        # A worker is alive as long as its heartbeat key has not expired
+        workers = []
+        async for keys in self.__str.scan(match=f"{self.__prefix}:*"):
+            for text in await self.__str.mget(keys=keys):
+                if text is not None:
+                    workers.append(CeleryWorkerInfo(**json.loads(text)))
+        return workers
+
+    def __get_key(self, name: str) -> str:
+        return f"{self.__prefix}:{name}"
+
+
+class CeleryWorkerHeartbeatJob(Job):
+    def __init__(self, registry: CeleryWorkerRegistry, info: CeleryWorkerInfo):
+        super().__init__(name=CELERY_WORKER_HEARTBEAT_JOB_NAME)
+        self.__registry = registry
+        self.__info = info
+
+    async def run(self):
+        await self.__registry.beat(self.__info)
@@ -48,10 +48,18 @@ class CronJob:
         asyncio.run(self.__run())
 
     async def __run(self):
-        if self.__unstoppable:
-            await self.__run_unstoppable()
-        else:
-            await self.__run_with_retry()
+        try:
+            if self.__unstoppable:
+                await self.__run_unstoppable()
+            else:
+                await self.__run_with_retry()
+        finally:
+            try:
+                await self.__job.close()
+            except Exception as e:
+                err_info = error_dict(e)
+                err_info["job_name"] = self.__job.name
+                log.error("Failed to close CronJob", err_info)
 
     async def __run_with_retry(self):
         self.status = CronJobStatus.RUNNING
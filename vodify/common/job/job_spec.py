@@ -8,3 +8,6 @@ class Job(ABC):
     @abstractmethod
     async def run(self):
         pass
+
+    async def close(self):  # called in the loop of `run()` once the job is stopped
+        pass
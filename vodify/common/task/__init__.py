@@ -1,7 +1,7 @@
 import os
 import sys
 
-from .task_status_repository import TaskStatusRepository, TaskStatus
+from .task_status_repository import TaskStatusRepository, TaskStatus, TaskStatusEntry
 
 
 targets = [
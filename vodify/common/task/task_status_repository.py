@@ -1,10 +1,13 @@
 from enum import Enum
+from typing import AsyncIterator
 
+from pydantic import BaseModel
 from pyutils import log
 
 from ...external.redis import RedisString, RedisConfig, create_app_redis_client
 
 REDIS_TASK_STATUS_KEY_PREFIX = "vodify:task:status"
+MGET_CHUNK_SIZE = 500
 
 
 class TaskStatus(Enum):
@@ -13,6 +16,11 @@ class TaskStatus(Enum):
     FAILURE = "FAILURE"
 
 
+class TaskStatusEntry(BaseModel):
+    task_uname: str
+    status: TaskStatus
+
+
 class TaskStatusRepository:
     def __init__(
         self,
@@ -39,38 +47,42 @@ class TaskStatusRepository:
             log.debug(f"Retry failed task", {"task_uname": task_uname})
             return None
 
-    async def set_pending(self, task_uname: str):
-        if await self.exists(task_uname=task_uname):
-            raise ValueError(f"Task {task_uname} already exists")
-        await self.__str.set(
+    async def claim(self, task_uname: str) -> dict | None:
+        # Marks the task as pending in a single atomic step, unless it is already pending or completed.
+        # Returns None if claimed, so only one of the workers receiving the same message runs the task
+        ok, prev = await self.__str.compare_and_set(
             key=self.__get_key(task_uname=task_uname),
             value=TaskStatus.PENDING.value,
+            expected=[None, TaskStatus.FAILURE.value],
             ex=self.__start_ex_sec,
         )
+        if ok:
+            if prev == TaskStatus.FAILURE.value:
+                log.debug("Retry failed task", {"task_uname": task_uname})
+            return None
 
-    async def set_success(self, task_uname: str):
-        exists = await self.get(task_uname=task_uname)
-        if exists is None:
-            raise ValueError(f"Task {task_uname} does not exist")
-        if exists != TaskStatus.PENDING:
-            raise ValueError(f"Task {task_uname} is not pending")
-        await self.__str.set(
+        if prev == TaskStatus.PENDING.value:
+            message = "Task already pending"
+        else:
+            message = "Task already completed"
+        log.debug(message, {"task_uname": task_uname})
+        return {"message": message, "task_uname": task_uname}
+
+    async def set_pending(self, task_uname: str):
+        ok = await self.__str.set(
             key=self.__get_key(task_uname=task_uname),
-            value=TaskStatus.SUCCESS.value,
-            ex=self.__done_ex_sec,
+            value=TaskStatus.PENDING.value,
+            nx=True,
+            ex=self.__start_ex_sec,
         )
+        if not ok:
+            raise ValueError(f"Task {task_uname} already exists")
+
+    async def set_success(self, task_uname: str):
+        await self.__set_done(task_uname=task_uname, status=TaskStatus.SUCCESS)
 
     async def set_failure(self, task_uname: str):
-        exists = await self.get(task_uname=task_uname)
-        if exists is None:
-            raise ValueError(f"Task {task_uname} does not exist")
-        if exists != TaskStatus.PENDING:
-            raise ValueError(f"Task {task_uname} is not pending")
-        await self.__str.set(
-            key=self.__get_key(task_uname=task_uname),
-            value=TaskStatus.FAILURE.value,
-            ex=self.__done_ex_sec,
-        )
+        await self.__set_done(task_uname=task_uname, status=TaskStatus.FAILURE)
 
     async def get(self, task_uname: str) -> TaskStatus | None:
         text = await self.__str.get(key=self.__get_key(task_uname=task_uname))
@@ -79,11 +91,46 @@ class TaskStatusRepository:
         else:
             return TaskStatus(text)
 
+    async def get_many(self, task_unames: list[str]) -> dict[str, TaskStatus | None]:
+        result: dict[str, TaskStatus | None] = {}
+        for i in range(0, len(task_unames), MGET_CHUNK_SIZE):
+            chunk = task_unames[i : i + MGET_CHUNK_SIZE]
+            texts = await self.__str.mget(keys=[self.__get_key(task_uname=name) for name in chunk])
+            for name, text in zip(chunk, texts):
+                result[name] = TaskStatus(text) if text is not None else None
+        return result
+
+    async def list_by_status(self, prefix: str = "", status: TaskStatus | None = None) -> AsyncIterator[TaskStatusEntry]:
+        # `prefix` filters the task names, e.g. "chzzk:<uid>"
+        match = f"{self.__get_key(task_uname=prefix)}*"
+        async for keys in self.__str.scan(match=match):
+            texts = await self.__str.mget(keys=keys)
+            for key, text in zip(keys, texts):
+                # The key may have expired between SCAN and MGET
+                if text is None:
+                    continue
+                entry = TaskStatusEntry(task_uname=key[len(self.__prefix) + 1 :], status=TaskStatus(text))
+                if status is None or entry.status == status:
+                    yield entry
+
     async def exists(self, task_uname: str) -> bool:
         return await self.__str.exists(key=self.__get_key(task_uname=task_uname))
 
     async def delete(self, task_uname: str):
         await self.__str.delete(key=self.__get_key(task_uname=task_uname))
 
+    async def __set_done(self, task_uname: str, status: TaskStatus):
+        ok, prev = await self.__str.compare_and_set(
+            key=self.__get_key(task_uname=task_uname),
+            value=status.value,
+            expected=[TaskStatus.PENDING.value],
+            ex=self.__done_ex_sec,
+        )
+        if ok:
+            return
+        if prev is None:
+            raise ValueError(f"Task {task_uname} does not exist")
+        raise ValueError(f"Task {task_uname} is not pending")
+
     def __get_key(self, task_uname: str) -> str:
         return f"{self.__prefix}:{task_uname}"
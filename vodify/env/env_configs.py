@@ -5,6 +5,9 @@ from pydantic import BaseModel, conint, constr
 from ..external.notifier import UntfConfig
 from ..external.redis import RedisConfig
 
+DEFAULT_REDIS_MAX_CONNECTIONS = 20
+DEFAULT_REDIS_HEALTH_CHECK_INTERVAL_SEC = 30
+
 
 class AmqpConfig(BaseModel):
     host: constr(min_length=1)
@@ -23,10 +26,19 @@ def read_amqp_config():
 
 
 def read_redis_config():
+    max_connections = os.getenv("REDIS_MAX_CONNECTIONS") or None
+    if max_connections is None:
+        max_connections = DEFAULT_REDIS_MAX_CONNECTIONS
+    health_check_interval_sec = os.getenv("REDIS_HEALTH_CHECK_INTERVAL_SEC") or None
+    if health_check_interval_sec is None:
+        health_check_interval_sec = DEFAULT_REDIS_HEALTH_CHECK_INTERVAL_SEC
+
     return RedisConfig(
         host=os.getenv("REDIS_HOST"),
         port=os.getenv("REDIS_PORT"),  # type: ignore
         password=os.getenv("REDIS_PASSWORD"),
+        max_connections=max_connections,  # type: ignore
+        health_check_interval_sec=health_check_interval_sec,  # type: ignore
     )
 
 
@@ -1,9 +1,12 @@
 import os
 
-from pydantic import BaseModel, conint, constr
+from pydantic import BaseModel, confloat, conint, constr
 
 from ..external.sqs import SQSConfig
 
+DEFAULT_SQS_POLLER_CNT = 4
+DEFAULT_CELERY_INSPECT_INTERVAL_SEC = 5
+
 
 class ServerConfig(BaseModel):
     port: conint(ge=1)
@@ -13,6 +16,8 @@ class ServerEnv(BaseModel):
     env: constr(min_length=1)
     server: ServerConfig
     sqs: SQSConfig
+    sqs_poller_cnt: conint(ge=1)
+    celery_inspect_interval_sec: confloat(gt=0)
 
 
 def get_server_env() -> ServerEnv:
@@ -28,8 +33,18 @@ def get_server_env() -> ServerEnv:
         queue_url=os.getenv("SQS_QUEUE_URL"),  # type: ignore
     )
 
+    sqs_poller_cnt = os.getenv("SQS_POLLER_COUNT") or None
+    if sqs_poller_cnt is None:
+        sqs_poller_cnt = DEFAULT_SQS_POLLER_CNT
+
+    celery_inspect_interval_sec = os.getenv("CELERY_INSPECT_INTERVAL_SEC") or None
+    if celery_inspect_interval_sec is None:
+        celery_inspect_interval_sec = DEFAULT_CELERY_INSPECT_INTERVAL_SEC
+
     return ServerEnv(
         env=env,
         server=server_config,
         sqs=sqs,
+        sqs_poller_cnt=sqs_poller_cnt,  # type: ignore
+        celery_inspect_interval_sec=celery_inspect_interval_sec,  # type: ignore
     )
@@ -1,11 +1,15 @@
 import os
 
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, constr, conint
 
 from .env_configs import read_untf_env
 from ..external.notifier import UntfConfig
 from ..utils import ProxyConfig
 
+DEFAULT_RECNODE_DOWNLOAD_CONCURRENCY = 1
+DEFAULT_NETWORK_POOL_SIZE = 10
+DEFAULT_RECNODE_RESERVE_TIMEOUT_SEC = 1800
+
 
 class WorkerConfig(BaseModel):
     name: constr(min_length=1)
@@ -27,6 +31,10 @@ class RecnodeConfig(BaseModel):
     is_archive: bool
     video_size_limit_gb: int
     delete_batch_size: int
+    stream_extract: bool
+    pipe_remux: bool
+    download_concurrency: conint(ge=1)
+    reserve_timeout_sec: float
 
 
 class WorkerEnv(BaseModel):
@@ -37,6 +45,7 @@ class WorkerEnv(BaseModel):
     network_mbit: float
     network_buf_size: int
     network_retry_limit: int
+    network_pool_size: conint(ge=1)
     min_read_timeout_sec: float
     read_timeout_threshold: float
     worker: WorkerConfig
@@ -51,14 +60,29 @@ def get_worker_env() -> WorkerEnv:
         env = "dev"
 
     worker_config = WorkerConfig(name=os.getenv("WORKER_NAME"), queues=os.getenv("WORKER_QUEUES"))
+    download_concurrency = os.getenv("RECNODE_DOWNLOAD_CONCURRENCY") or None
+    if download_concurrency is None:
+        download_concurrency = DEFAULT_RECNODE_DOWNLOAD_CONCURRENCY
+    reserve_timeout_sec = os.getenv("RECNODE_RESERVE_TIMEOUT_SEC") or None
+    if reserve_timeout_sec is None:
+        reserve_timeout_sec = DEFAULT_RECNODE_RESERVE_TIMEOUT_SEC
+
     recnode_config = RecnodeConfig(
         base_dir_path=os.getenv("RECNODE_BASE_DIR_PATH"),
         is_archive=os.getenv("RECNODE_IS_ARCHIVE") == "true",
         video_size_limit_gb=os.getenv("RECNODE_VIDEO_SIZE_LIMIT_GB"),  # type: ignore
         delete_batch_size=os.getenv("RECNODE_DELETE_BATCH_SIZE"),  # type: ignore
+        stream_extract=os.getenv("RECNODE_STREAM_EXTRACT") == "true",
+        pipe_remux=os.getenv("RECNODE_PIPE_REMUX") == "true",
+        download_concurrency=download_concurrency,  # type: ignore
+        reserve_timeout_sec=reserve_timeout_sec,  # type: ignore
     )
     proxy_enabled = os.getenv("PROXY_ENABLED") == "true"
 
+    network_pool_size = os.getenv("NETWORK_POOL_SIZE") or None
+    if network_pool_size is None:
+        network_pool_size = DEFAULT_NETWORK_POOL_SIZE
+
     return WorkerEnv(
         env=env,
         worker=worker_config,
@@ -68,6 +92,7 @@ def get_worker_env() -> WorkerEnv:
         network_mbit=os.getenv("NETWORK_MBIT"),  # type: ignore
         network_buf_size=os.getenv("NETWORK_BUF_SIZE"),  # type: ignore
         network_retry_limit=os.getenv("NETWORK_RETRY_LIMIT"),  # type: ignore
+        network_pool_size=network_pool_size,  # type: ignore
         min_read_timeout_sec=os.getenv("MIN_READ_TIMEOUT_SEC"),  # type: ignore
         read_timeout_threshold=os.getenv("READ_TIMEOUT_THRESHOLD"),  # type: ignore
         recnode=recnode_config,
@@ -3,11 +3,13 @@ import sys
 
 from .redis_queue import RedisQueue
 from .redis_string import RedisString
-from .redis_types import RedisConfig
+from .redis_pool import RedisPool, RedisPoolRegistry, get_redis_pool_stats, close_redis_pools
+from .redis_types import RedisConfig, RedisPoolStats
 from .redis_utils import create_app_redis_client, create_celery_redis_client
 
 targets = [
     "redis_errors",
+    "redis_pool",
     "redis_queue",
     "redis_string",
     "redis_types",
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import threading
+
+from redis.asyncio import Redis, BlockingConnectionPool, ConnectionPool
+from redis.exceptions import ConnectionError
+
+from .redis_types import RedisConfig, RedisPoolStats
+
+DEFAULT_REDIS_POOL_TIMEOUT_SEC = 20
+
+
+class RedisPool(ConnectionPool):
+    def __init__(self, conf: RedisConfig, db: int, timeout_sec: float = DEFAULT_REDIS_POOL_TIMEOUT_SEC):
+        super().__init__(
+            max_connections=conf.max_connections,
+            host=conf.host,
+            port=conf.port,
+            password=conf.password,
+            db=db,
+            decode_responses=True,
+            health_check_interval=conf.health_check_interval_sec,
+        )
+        self.host = conf.host
+        self.port = conf.port
+        self.db = db
+        self.__timeout_sec = timeout_sec
+
+        # asyncio connections can't cross event loops, and the server runs its cron jobs on their own loops,
+        # so the connections are pooled per loop, each pool bounded by `max_connections`
+        self.__pools: dict[asyncio.AbstractEventLoop, BlockingConnectionPool] = {}
+        self.__lock = threading.Lock()
+        self.__acquired_cnt = 0
+        self.__timeout_cnt = 0
+        # A forked child must not reuse the parent's sockets, nor a lock held by another thread of the parent
+        os.register_at_fork(after_in_child=self.__reset)
+
+    async def get_connection(self, command_name, *keys, **options):
+        pool = self.__get_loop_pool()
+        try:
+            connection = await pool.get_connection(command_name, *keys, **options)
+        except ConnectionError as e:
+            if isinstance(e.__cause__, asyncio.TimeoutError):
+                with self.__lock:
+                    self.__timeout_cnt += 1
+            raise
+        with self.__lock:
+            self.__acquired_cnt += 1
+        return connection
+
+    async def release(self, connection):
+        await self.__get_loop_pool().release(connection)
+
+    async def disconnect(self, inuse_connections: bool = True):
+        current = asyncio.get_running_loop()
+        with self.__lock:
+            pools = list(self.__pools.items())
+            self.__pools = {}
+        for loop, pool in pools:
+            if loop is current:
+                await pool.disconnect(inuse_connections)
+            elif loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(pool.disconnect(inuse_connections), loop)
+                await asyncio.wrap_future(future)
+            # The sockets of a closed loop are released with the pool
+
+    def stats(self) -> RedisPoolStats:
+        with self.__lock:
+            pools = list(self.__pools.values())
+            acquired_cnt = self.__acquired_cnt
+            timeout_cnt = self.__timeout_cnt
+        return RedisPoolStats(
+            host=self.host,
+            port=self.port,
+            db=self.db,
+            max_connections=self.max_connections,
+            loop_cnt=len(pools),
+            in_use_cnt=sum(len(pool._in_use_connections) for pool in pools),
+            idle_cnt=sum(len(pool._available_connections) for pool in pools),
+            acquired_cnt=acquired_cnt,
+            timeout_cnt=timeout_cnt,
+        )
+
+    def __reset(self):
+        self.__pools = {}
+        self.__lock = threading.Lock()
+
+    def __get_loop_pool(self) -> BlockingConnectionPool:
+        loop = asyncio.get_running_loop()
+        with self.__lock:
+            pool = self.__pools.get(loop)
+            if pool is None:
+                for closed in [lp for lp in self.__pools if lp.is_closed()]:
+                    del self.__pools[closed]
+                pool = BlockingConnectionPool(
+                    max_connections=self.max_connections,
+                    timeout=self.__timeout_sec,  # type: ignore
+                    **self.connection_kwargs,
+                )
+                self.__pools[loop] = pool
+            return pool
+
+
+class RedisPoolRegistry:
+    def __init__(self):
+        self.__clients: dict[tuple[str, int, int], Redis] = {}
+        self.__pools: dict[tuple[str, int, int], RedisPool] = {}
+        self.__lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.__reset)
+
+    def get_client(self, conf: RedisConfig, db: int) -> Redis:
+        key = (conf.host, conf.port, db)
+        with self.__lock:
+            client = self.__clients.get(key)
+            if client is None:
+                pool = RedisPool(conf, db)
+                client = Redis(connection_pool=pool)
+                self.__pools[key] = pool
+                self.__clients[key] = client
+            return client
+
+    def stats(self) -> list[RedisPoolStats]:
+        with self.__lock:
+            pools = list(self.__pools.values())
+        return [pool.stats() for pool in pools]
+
+    def __reset(self):
+        self.__lock = threading.Lock()
+
+    async def close(self):
+        with self.__lock:
+            pools = list(self.__pools.values())
+            self.__pools = {}
+            self.__clients = {}
+        for pool in pools:
+            await pool.disconnect()
+
+
+# Process-wide registry, so every Redis user in a process shares the pools of the same (host, port, db)
+redis_pool_registry = RedisPoolRegistry()
+
+
+def get_redis_pool_stats() -> list[RedisPoolStats]:
+    return redis_pool_registry.stats()
+
+
+async def close_redis_pools():
+    await redis_pool_registry.close()
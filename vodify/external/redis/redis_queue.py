@@ -11,9 +11,37 @@ class RedisQueue:
     async def push(self, value: str) -> int:  # return size
         return await self.__redis.lpush(self.__key, value)  # type: ignore
 
+    async def push_many(self, values: list[str]) -> int:  # return size, the first value is popped first
+        return await self.__redis.lpush(self.__key, *values)  # type: ignore
+
+    async def push_capped(self, value: str, max_size: int) -> int:  # return size, only the newest items are kept
+        async with self.__redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self.__key, value)
+            pipe.ltrim(self.__key, 0, max_size - 1)
+            size, _ = await pipe.execute()
+        return min(size, max_size)
+
     async def pop(self) -> str | None:
         return await self.__redis.rpop(self.__key)  # type: ignore
 
+    async def bpop(self, timeout_sec: float) -> str | None:  # return None on timeout
+        result = await self.__redis.brpop([self.__key], timeout=timeout_sec)  # type: ignore
+        if result is None:
+            return None
+        return result[1]
+
+    # Moves an item to another list atomically: the tail (the next one to pop) to the head (like `push()`) by default
+    async def move(
+        self,
+        dst_key: str,
+        src_side: str = "RIGHT",
+        dst_side: str = "LEFT",
+        timeout_sec: float | None = None,  # block until an item is available if set
+    ) -> str | None:
+        if timeout_sec is None:
+            return await self.__redis.lmove(self.__key, dst_key, src_side, dst_side)  # type: ignore
+        return await self.__redis.blmove(self.__key, dst_key, timeout_sec, src_side, dst_side)  # type: ignore
+
     async def get(self):
         return await self.__redis.lindex(self.__key, -1)  # type: ignore
 
@@ -23,6 +51,11 @@ class RedisQueue:
     async def list_items(self) -> list[str]:
         return await self.__redis.lrange(self.__key, 0, -1)  # type: ignore
 
+    async def list_range(self, offset: int, limit: int) -> list[str]:  # from the tail, in pop order
+        items = await self.__redis.lrange(self.__key, -(offset + limit), -(offset + 1))  # type: ignore
+        items.reverse()
+        return items
+
     # Using index may cause concurrency issues
     # Prefer using remove_by_value() if possible
     async def remove_by_idx(self, idx: int):
@@ -1,11 +1,34 @@
+from typing import AsyncIterator
+
 from redis.asyncio import Redis
 
 from .redis_errors import RedisError
 
+# Sets the key only if its current value is one of the expected values, and returns the previous value
+# ARGV: value, ex (0 for no expiration), "1" if a missing key is expected, expected values...
+COMPARE_AND_SET_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+local matched = current == false and ARGV[3] == '1'
+for i = 4, #ARGV do
+    if current == ARGV[i] then
+        matched = true
+    end
+end
+if matched then
+    if tonumber(ARGV[2]) > 0 then
+        redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    else
+        redis.call('SET', KEYS[1], ARGV[1])
+    end
+end
+return current
+"""
+
 
 class RedisString:
     def __init__(self, client: Redis):
         self.__redis = client
+        self.__compare_and_set = client.register_script(COMPARE_AND_SET_SCRIPT)
 
     async def set(
         self,
@@ -23,6 +46,23 @@ class RedisString:
             raise RedisError("Expected boolean data")
         return ok
 
+    async def compare_and_set(
+        self,
+        key: str,
+        value: str,
+        expected: list[str | None],  # None matches a missing key
+        ex: int | None = None,
+    ) -> tuple[bool, str | None]:  # return (True if set, previous value)
+        allow_missing = None in expected
+        expected_values = [v for v in expected if v is not None]
+        args = [value, ex or 0, "1" if allow_missing else "0", *expected_values]
+        prev = await self.__compare_and_set(keys=[key], args=args)
+        if prev is not None and not isinstance(prev, str):
+            raise RedisError("Expected string data")
+        if prev is None:
+            return allow_missing, prev
+        return prev in expected_values, prev
+
     async def get(self, key: str) -> str | None:
         return await self.__redis.get(key)
 
@@ -32,6 +72,15 @@ class RedisString:
             raise RedisError("Expected list data")
         return results
 
+    async def scan(self, match: str, count: int = 1000) -> AsyncIterator[list[str]]:  # yield keys per batch
+        cursor = 0
+        while True:
+            cursor, keys = await self.__redis.scan(cursor=cursor, match=match, count=count)
+            if len(keys) > 0:
+                yield keys
+            if cursor == 0:
+                break
+
     async def delete(self, key: str) -> int:  # return True if deleted
         return await self.__redis.delete(key)
 
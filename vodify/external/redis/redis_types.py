@@ -5,3 +5,17 @@ class RedisConfig(BaseModel):
     host: constr(min_length=1)
     port: conint(ge=1)
     password: constr(min_length=1)
+    max_connections: conint(ge=1)
+    health_check_interval_sec: conint(ge=0)
+
+
+class RedisPoolStats(BaseModel):
+    host: str
+    port: int
+    db: int
+    max_connections: int
+    loop_cnt: int
+    in_use_cnt: int
+    idle_cnt: int
+    acquired_cnt: int
+    timeout_cnt: int
@@ -1,23 +1,15 @@
 from redis.asyncio import Redis
 
+from .redis_pool import redis_pool_registry
 from .redis_types import RedisConfig
 
+APP_REDIS_DB = 0
+CELERY_REDIS_DB = 1
+
 
 def create_app_redis_client(conf: RedisConfig) -> Redis:
-    return Redis(
-        host=conf.host,
-        port=conf.port,
-        password=conf.password,
-        db=0,
-        decode_responses=True,
-    )
+    return redis_pool_registry.get_client(conf, db=APP_REDIS_DB)
 
 
 def create_celery_redis_client(conf: RedisConfig) -> Redis:
-    return Redis(
-        host=conf.host,
-        port=conf.port,
-        password=conf.password,
-        db=1,
-        decode_responses=True,
-    )
+    return redis_pool_registry.get_client(conf, db=CELERY_REDIS_DB)
@@ -1,8 +1,8 @@
 import os
 import sys
 
-from .s3_client import S3AsyncClient
-from .s3_types import S3Config, S3ListResponse
+from .s3_client import S3AsyncClient, WriteFileResult, DEFAULT_MAX_POOL_CONNECTIONS
+from .s3_types import S3Config, S3ListResponse, S3ListContentObject
 from .s3_utils import create_client
 
 targets = [
@@ -1,23 +1,32 @@
 import asyncio
-from typing import Any, List
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Any, List, Callable, Awaitable
 
 import aiofiles
 import aiohttp
 from aiofiles import os as aios
+from aiolimiter import AsyncLimiter
 from botocore.exceptions import ClientError
 from pydantic import BaseModel
 from pyutils import log
+from types_aiobotocore_s3.client import S3Client
 from types_aiobotocore_s3.type_defs import DeleteTypeDef
 
 from .s3_types import S3Config, S3ListResponse, S3ObjectInfoResponse
 from .s3_utils import create_client, _parse_get_object_res_headers, _retry_error_attr, _retry_error_attr2
 from ...utils import utime, nio_limiter, ProxyConfig
 
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_TIMEOUT_SEC = 30
+
 
 class WriteFileResult(BaseModel):
     retry_count: int
+    resume_count: int = 0
     wasted_bytes: int
     small_chunk_count: int
+    last_modified: datetime | None = None
 
 
 class S3AsyncClient:
@@ -30,6 +39,8 @@ class S3AsyncClient:
         min_read_timeout_sec: float,
         read_timeout_threshold: float,
         proxy_conf: ProxyConfig | None = None,
+        max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+        keepalive_timeout_sec: float = DEFAULT_KEEPALIVE_TIMEOUT_SEC,
     ):
         self.__conf = conf
         self.__bucket_name = conf.bucket_name
@@ -41,18 +52,44 @@ class S3AsyncClient:
         self.__proxy_conf = proxy_conf
         self.__small_chunk_count_ratio = 0.9
         self.__presigned_url_expires_in = 3600
+        self.__max_pool_connections = max_pool_connections
+        self.__keepalive_timeout_sec = keepalive_timeout_sec
+
+        # The clients are created lazily and bound to the event loop in which they are created
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__exit_stack = AsyncExitStack()
+        self.__client_lock = asyncio.Lock()
+        self.__client: S3Client | None = None
+        self.__http_session: aiohttp.ClientSession | None = None
+
+        # All downloads of this client share a single `network_mbit` budget
+        self.__limiter: AsyncLimiter | None = None
+        self.__active_read_cnt = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        exit_stack = self.__exit_stack
+        self.__exit_stack = AsyncExitStack()
+        self.__client = None
+        self.__http_session = None
+        await exit_stack.aclose()
 
     async def head(self, key: str) -> S3ObjectInfoResponse | None:
-        async with create_client(self.__conf) as client:
-            try:
-                s3_res = await client.head_object(Bucket=self.__bucket_name, Key=key)
-                return S3ObjectInfoResponse.new(s3_res, key)
-            except ClientError as e:
-                res: Any = e.response
-                if res["Error"]["Code"] == "404":
-                    return None
-                else:
-                    raise e
+        client = await self.__get_client()
+        try:
+            s3_res = await client.head_object(Bucket=self.__bucket_name, Key=key)
+            return S3ObjectInfoResponse.new(s3_res, key)
+        except ClientError as e:
+            res: Any = e.response
+            if res["Error"]["Code"] == "404":
+                return None
+            else:
+                raise e
 
     async def list(
         self,
@@ -61,17 +98,17 @@ class S3AsyncClient:
         next_token: str | None = None,
         max_keys: int | None = None,
     ) -> S3ListResponse:
-        async with create_client(self.__conf) as client:
-            kwargs = {"Bucket": self.__bucket_name, "Prefix": prefix}
-            if delimiter is not None:
-                kwargs["Delimiter"] = delimiter
-            if next_token is not None:
-                kwargs["ContinuationToken"] = next_token
-            if max_keys is not None:
-                kwargs["MaxKeys"] = max_keys
-
-            s3_res = await client.list_objects_v2(**kwargs)
-            return S3ListResponse.new(s3_res)
+        client = await self.__get_client()
+        kwargs = {"Bucket": self.__bucket_name, "Prefix": prefix}
+        if delimiter is not None:
+            kwargs["Delimiter"] = delimiter
+        if next_token is not None:
+            kwargs["ContinuationToken"] = next_token
+        if max_keys is not None:
+            kwargs["MaxKeys"] = max_keys
+
+        s3_res = await client.list_objects_v2(**kwargs)
+        return S3ListResponse.new(s3_res)
 
     async def list_all_objects(self, prefix: str, delimiter: str | None = None):
         next_token = None
@@ -85,92 +122,198 @@ class S3AsyncClient:
             next_token = res.next_continuation_token
 
     async def write(self, key: str, data: bytes):
-        async with create_client(self.__conf) as client:
-            await client.put_object(Bucket=self.__bucket_name, Key=key, Body=data)
+        client = await self.__get_client()
+        await client.put_object(Bucket=self.__bucket_name, Key=key, Body=data)
 
     async def read(self, key: str) -> bytes:
-        async with create_client(self.__conf) as client:
-            res = await client.get_object(Bucket=self.__bucket_name, Key=key)
-            async with res["Body"] as body:
-                return await body.read()
+        client = await self.__get_client()
+        res = await client.get_object(Bucket=self.__bucket_name, Key=key)
+        async with res["Body"] as body:
+            return await body.read()
 
     async def generate_presigned_url(self, key: str) -> str:
-        async with create_client(self.__conf) as client:
-            return await client.generate_presigned_url(
-                "get_object",
-                Params={"Bucket": self.__bucket_name, "Key": key},
-                ExpiresIn=self.__presigned_url_expires_in,
-                HttpMethod="GET",
-            )
-
-    async def write_file(self, key: str, file_path: str, sync_time: bool = False):
+        client = await self.__get_client()
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.__bucket_name, "Key": key},
+            ExpiresIn=self.__presigned_url_expires_in,
+            HttpMethod="GET",
+        )
+
+    async def write_file(self, key: str, file_path: str, sync_time: bool = False) -> WriteFileResult:
+        try:
+            async with aiofiles.open(file_path, "wb") as file:
+
+                async def reset():
+                    await file.seek(0)
+                    await file.truncate()
+
+                result = await self.read_stream(key=key, on_chunk=file.write, on_reset=reset)
+        except (Exception, asyncio.CancelledError):
+            if await aios.path.exists(file_path):
+                await aios.remove(file_path)
+            raise
+
+        if sync_time and result.last_modified is not None:
+            times = (result.last_modified.timestamp(), result.last_modified.timestamp())
+            await utime(file_path, times)
+        return result
+
+    async def read_stream(
+        self,
+        key: str,
+        on_chunk: Callable[[bytes], Awaitable[Any]],
+        on_reset: Callable[[], Awaitable[Any]],
+    ) -> WriteFileResult:
+        # A retry resumes the download with a range request if possible,
+        # otherwise `on_reset` is called so that the consumer can discard the chunks already received
         url = await self.generate_presigned_url(key)
+        self.__active_read_cnt += 1
+        try:
+            return await self.__read_stream(key, url, on_chunk, on_reset)
+        finally:
+            self.__active_read_cnt -= 1
 
+    async def __read_stream(
+        self,
+        key: str,
+        url: str,
+        on_chunk: Callable[[bytes], Awaitable[Any]],
+        on_reset: Callable[[], Awaitable[Any]],
+    ) -> WriteFileResult:
         retry_cnt_total = 0
+        resume_cnt = 0
         wasted_sum = 0
-        write_sum = 0
+        received = 0  # bytes passed to `on_chunk`
+        object_size: int | None = None
+        etag: str | None = None
         small_chunk_cnt = 0
+        last_modified = None
         for retry_cnt in range(self.__retry_limit + 1):
             try:
+                if object_size is not None and received == object_size:
+                    # The whole body is already received, e.g. the connection is reset on the final read,
+                    # and a range from the end would be answered with 416
+                    break
                 loop = asyncio.get_event_loop()
                 start = loop.time()
-                write_sum = 0
-                small_chunk_cnt = 0
-                limiter = nio_limiter(self.__network_mbit, self.__network_buf_size)
-                connector = None
-                if self.__proxy_conf is not None:
-                    connector = self.__proxy_conf.proxy_connector()
-                async with aiohttp.ClientSession(connector=connector) as session:
-                    async with session.get(url) as res:
-                        if res.status >= 400:
-                            raise ValueError(f"Failed to download: status={res.status}, key={key}")
-                        content_length, last_modified = _parse_get_object_res_headers(res)
-
-                        expected_duration = content_length / (self.__network_mbit * 1024 * 1024 / 8)
-                        read_timeout_sec = expected_duration * self.__read_timeout_threshold
-                        if read_timeout_sec < self.__min_read_timeout_sec:
-                            read_timeout_sec = self.__min_read_timeout_sec
-
-                        async with aiofiles.open(file_path, "wb") as file:
-                            while True:
-                                async with limiter:
-                                    chunk = await res.content.read(self.__network_buf_size)
-                                    if not chunk:
-                                        break
-
-                                    size = len(chunk)
-                                    write_sum += size
-                                    if size < self.__network_buf_size * self.__small_chunk_count_ratio:
-                                        small_chunk_cnt += 1
-
-                                    duration = loop.time() - start
-                                    if duration > read_timeout_sec:
-                                        attr = f"duration={duration}, size={write_sum}, key={key}"
-                                        raise TimeoutError(f"Read timeout exceeded: {attr}")
-
-                                    await file.write(chunk)
-                        if sync_time:
-                            times = (last_modified.timestamp(), last_modified.timestamp())
-                            await utime(file_path, times)
+                headers = {}
+                if received > 0 and etag is not None:
+                    # Resume from the last received byte, only if the object has not changed
+                    headers = {"Range": f"bytes={received}-", "If-Match": etag}
+                limiter = self.__get_limiter()
+                session = await self.__get_http_session()
+                async with session.get(url, headers=headers) as res:
+                    if res.status == 412:
+                        etag = None
+                        raise ValueError(f"Object changed while downloading: key={key}")
+                    if res.status >= 400:
+                        raise ValueError(f"Failed to download: status={res.status}, key={key}")
+                    content_length, last_modified = _parse_get_object_res_headers(res)
+
+                    if res.status == 206:
+                        resume_cnt += 1
+                    else:
+                        if received > 0:
+                            # The range is not applied, so the object is downloaded again from the beginning
+                            await on_reset()
+                            wasted_sum += received
+                            received = 0
+                            small_chunk_cnt = 0
+                        object_size = content_length
+                        etag = res.headers.get("ETag")
+
+                    # The bandwidth is shared with the other downloads in progress
+                    bytes_per_sec = self.__network_mbit * 1024 * 1024 / 8 / max(self.__active_read_cnt, 1)
+                    expected_duration = content_length / bytes_per_sec
+                    read_timeout_sec = expected_duration * self.__read_timeout_threshold
+                    if read_timeout_sec < self.__min_read_timeout_sec:
+                        read_timeout_sec = self.__min_read_timeout_sec
+
+                    while True:
+                        async with limiter:
+                            chunk = await res.content.read(self.__network_buf_size)
+                            if not chunk:
+                                break
+
+                            duration = loop.time() - start
+                            if duration > read_timeout_sec:
+                                attr = f"duration={duration}, size={received}, key={key}"
+                                raise TimeoutError(f"Read timeout exceeded: {attr}")
+
+                            # Counted only once written, so that the retry resumes from the first lost byte
+                            await on_chunk(chunk)
+                            size = len(chunk)
+                            received += size
+                            if size < self.__network_buf_size * self.__small_chunk_count_ratio:
+                                small_chunk_cnt += 1
+
+                if object_size is not None and received < object_size:
+                    raise ValueError(f"Incomplete object body: size={received}/{object_size}, key={key}")
                 break
             except Exception as e:
-                if await aios.path.exists(file_path):
-                    await aios.remove(file_path)
-
                 if retry_cnt == self.__retry_limit:
                     log.error(f"Read object retry limit exceeded", _retry_error_attr(e, retry_cnt, key))
                     raise
 
                 retry_cnt_total += 1
-                wasted_sum += write_sum
 
-        return WriteFileResult(retry_count=retry_cnt_total, wasted_bytes=wasted_sum, small_chunk_count=small_chunk_cnt)
+        return WriteFileResult(
+            retry_count=retry_cnt_total,
+            resume_count=resume_cnt,
+            wasted_bytes=wasted_sum,
+            small_chunk_count=small_chunk_cnt,
+            last_modified=last_modified,
+        )
+
+    def __check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self.__loop is loop:
+            return
+        # The previous loop is gone, so its clients can not be closed anymore
+        self.__loop = loop
+        self.__exit_stack = AsyncExitStack()
+        self.__client_lock = asyncio.Lock()
+        self.__client = None
+        self.__http_session = None
+        self.__limiter = None
+
+    async def __get_client(self) -> S3Client:
+        self.__check_loop()
+        async with self.__client_lock:
+            if self.__client is None:
+                client = create_client(
+                    self.__conf,
+                    max_pool_connections=self.__max_pool_connections,
+                    keepalive_timeout_sec=self.__keepalive_timeout_sec,
+                )
+                self.__client = await self.__exit_stack.enter_async_context(client)
+            return self.__client
+
+    async def __get_http_session(self) -> aiohttp.ClientSession:
+        self.__check_loop()
+        async with self.__client_lock:
+            if self.__http_session is None:
+                kwargs = {"limit": self.__max_pool_connections, "keepalive_timeout": self.__keepalive_timeout_sec}
+                if self.__proxy_conf is not None:
+                    connector = self.__proxy_conf.proxy_connector(**kwargs)
+                else:
+                    connector = aiohttp.TCPConnector(**kwargs)
+                session = aiohttp.ClientSession(connector=connector)
+                self.__http_session = await self.__exit_stack.enter_async_context(session)
+            return self.__http_session
+
+    def __get_limiter(self) -> AsyncLimiter:
+        self.__check_loop()
+        if self.__limiter is None:
+            self.__limiter = nio_limiter(self.__network_mbit, self.__network_buf_size)
+        return self.__limiter
 
     async def delete(self, key: str):
         for retry_cnt in range(self.__retry_limit + 1):
             try:
-                async with create_client(self.__conf) as client:
-                    await client.delete_object(Bucket=self.__bucket_name, Key=key)
+                client = await self.__get_client()
+                await client.delete_object(Bucket=self.__bucket_name, Key=key)
                 break
             except Exception as e:
                 if retry_cnt == self.__retry_limit:
@@ -181,9 +324,9 @@ class S3AsyncClient:
     async def delete_batch(self, keys: List[str]):
         for retry_cnt in range(self.__retry_limit + 1):
             try:
-                async with create_client(self.__conf) as client:
-                    req: DeleteTypeDef = {"Objects": [{"Key": key} for key in keys]}
-                    await client.delete_objects(Bucket=self.__bucket_name, Delete=req)
+                client = await self.__get_client()
+                req: DeleteTypeDef = {"Objects": [{"Key": key} for key in keys]}
+                await client.delete_objects(Bucket=self.__bucket_name, Delete=req)
                 break
             except Exception as e:
                 if retry_cnt == self.__retry_limit:
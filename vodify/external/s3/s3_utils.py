@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any
 
 from aiobotocore.config import AioConfig
@@ -10,14 +10,23 @@ from types_aiobotocore_s3.client import S3Client
 from .s3_types import S3Config
 
 
-def create_client(conf: S3Config) -> S3Client:
+def create_client(
+    conf: S3Config,
+    max_pool_connections: int | None = None,
+    keepalive_timeout_sec: float | None = None,
+) -> S3Client:
+    config_kwargs: dict[str, Any] = {"signature_version": "s3v4"}
+    if max_pool_connections is not None:
+        config_kwargs["max_pool_connections"] = max_pool_connections
+    if keepalive_timeout_sec is not None:
+        config_kwargs["connector_args"] = {"keepalive_timeout": keepalive_timeout_sec}
     client = get_session().create_client(
         "s3",
         endpoint_url=conf.endpoint_url,
         aws_access_key_id=conf.access_key,
         aws_secret_access_key=conf.secret_key,
         verify=conf.verify,
-        config=AioConfig(signature_version="s3v4"),
+        config=AioConfig(**config_kwargs),
     )
     return client  # type: ignore
 
@@ -42,5 +51,6 @@ def _parse_get_object_res_headers(res: ClientResponse):
     if not isinstance(last_modified_str, str) or not isinstance(content_length_str, str):
         raise ValueError(f"Invalid headers")
     content_length = int(content_length_str)
-    last_modified = datetime.strptime(last_modified_str, "%a, %d %b %Y %H:%M:%S GMT")
+    # HTTP dates are always GMT, a naive datetime would be taken as local time by timestamp()
+    last_modified = datetime.strptime(last_modified_str, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc)
     return content_length, last_modified
@@ -1,7 +1,7 @@
 import os
 import sys
 
-from .sqs_client import SQSAsyncClient, SQSConfig
+from .sqs_client import SQSAsyncClient, SQSConfig, SQSMessage
 
 targets = [
     "sqs_client",
@@ -1,3 +1,7 @@
+import asyncio
+from contextlib import AsyncExitStack
+
+from aiobotocore.config import AioConfig
 from aiobotocore.session import get_session
 from pydantic import BaseModel, constr
 from types_aiobotocore_sqs.client import SQSClient
@@ -17,50 +21,98 @@ class SQSMessage(BaseModel):
     handle: str
 
 
+DEFAULT_SQS_MAX_POOL_CONNECTIONS = 10
+
+
 class SQSAsyncClient:
-    def __init__(self, conf: SQSConfig):
+    def __init__(self, conf: SQSConfig, max_pool_connections: int = DEFAULT_SQS_MAX_POOL_CONNECTIONS):
         self.__conf = conf
+        self.__max_pool_connections = max_pool_connections
+
+        # The client is created lazily and bound to the event loop in which it is created,
+        # so that the connections are reused across the long polls
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__exit_stack = AsyncExitStack()
+        self.__client_lock = asyncio.Lock()
+        self.__client: SQSClient | None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        exit_stack = self.__exit_stack
+        self.__exit_stack = AsyncExitStack()
+        self.__client = None
+        await exit_stack.aclose()
 
     async def send(self, body: str):
-        async with create_client(self.__conf) as client:
-            await client.send_message(QueueUrl=self.__conf.queue_url, MessageBody=body)
+        client = await self.__get_client()
+        await client.send_message(QueueUrl=self.__conf.queue_url, MessageBody=body)
 
     async def receive(self, wait_time_sec: int = 20, max_num: int = 10) -> list[SQSMessage]:
-        async with create_client(self.__conf) as client:
-            response = await client.receive_message(
-                QueueUrl=self.__conf.queue_url,
-                WaitTimeSeconds=wait_time_sec,
-                MaxNumberOfMessages=max_num,
-            )
-            messages: list[MessageTypeDef] = response.get("Messages", [])
-            result: list[SQSMessage] = []
-            for msg in messages:
-                msg_id = msg.get("MessageId")
-                body = msg.get("Body")
-                handle = msg.get("ReceiptHandle")
-                if not msg_id or not body or not handle:
-                    raise ValueError(f"Received message with missing fields: {msg}")
-                result.append(SQSMessage(id=msg_id, body=body, handle=handle))
-            return result
+        client = await self.__get_client()
+        response = await client.receive_message(
+            QueueUrl=self.__conf.queue_url,
+            WaitTimeSeconds=wait_time_sec,
+            MaxNumberOfMessages=max_num,
+        )
+        messages: list[MessageTypeDef] = response.get("Messages", [])
+        result: list[SQSMessage] = []
+        for msg in messages:
+            msg_id = msg.get("MessageId")
+            body = msg.get("Body")
+            handle = msg.get("ReceiptHandle")
+            if not msg_id or not body or not handle:
+                raise ValueError(f"Received message with missing fields: {msg}")
+            result.append(SQSMessage(id=msg_id, body=body, handle=handle))
+        return result
 
     async def delete(self, messages: list[SQSMessage]):
         if len(messages) == 0:
             return
-        async with create_client(self.__conf) as client:
-            if len(messages) == 1:
-                await client.delete_message(QueueUrl=self.__conf.queue_url, ReceiptHandle=messages[0].handle)
-            else:
-                entries: list[DeleteMessageBatchRequestEntryTypeDef] = []
-                for msg in messages:
-                    entries.append({"Id": msg.id, "ReceiptHandle": msg.handle})
-                await client.delete_message_batch(QueueUrl=self.__conf.queue_url, Entries=entries)
+        client = await self.__get_client()
+        if len(messages) == 1:
+            await client.delete_message(QueueUrl=self.__conf.queue_url, ReceiptHandle=messages[0].handle)
+        else:
+            entries: list[DeleteMessageBatchRequestEntryTypeDef] = []
+            for msg in messages:
+                entries.append({"Id": msg.id, "ReceiptHandle": msg.handle})
+            response = await client.delete_message_batch(QueueUrl=self.__conf.queue_url, Entries=entries)
+            failed = response.get("Failed", [])
+            if len(failed) > 0:
+                raise ValueError(f"Failed to delete {len(failed)} messages: {failed}")
+
+    def __check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self.__loop is loop:
+            return
+        # The previous loop is gone, so its client can not be closed anymore
+        self.__loop = loop
+        self.__exit_stack = AsyncExitStack()
+        self.__client_lock = asyncio.Lock()
+        self.__client = None
+
+    async def __get_client(self) -> SQSClient:
+        self.__check_loop()
+        async with self.__client_lock:
+            if self.__client is None:
+                client = create_client(self.__conf, max_pool_connections=self.__max_pool_connections)
+                self.__client = await self.__exit_stack.enter_async_context(client)
+            return self.__client
 
 
-def create_client(conf: SQSConfig) -> SQSClient:
+def create_client(conf: SQSConfig, max_pool_connections: int | None = None) -> SQSClient:
+    config_kwargs = {}
+    if max_pool_connections is not None:
+        config_kwargs["max_pool_connections"] = max_pool_connections
     client = get_session().create_client(
         "sqs",
         region_name=conf.region_name,
         aws_access_key_id=conf.access_key,
         aws_secret_access_key=conf.secret_key,
+        config=AioConfig(**config_kwargs),
     )
     return client  # type: ignore
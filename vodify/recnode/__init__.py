@@ -5,10 +5,17 @@ from .accessor.segment_accessor_local import LocalSegmentAccessor
 from .accessor.segment_accessor_s3 import S3SegmentAccessor
 from .accessor.segment_accessor_utils import create_recnode_accessor
 from .archiver.recnode_archive_executor import RecnodeArchiveExecutor
-from .archiver.recnode_archiver import RecnodeArchiver, ArchiveTarget
-from .common.recnode_msg_queue import RecnodeMsgQueue
+from .archiver.recnode_archiver import RecnodeArchiver, ArchiveTarget, ArchivePipelineConfig
+from .archiver.recnode_pipeline import Pipeline, PipelineStage, PipelineSummary
+from .common.recnode_msg_queue import RecnodeMsgQueue, RecnodeQueuedMsg, RecnodeMsgCounts
 from .schema.recnode_constrants import RECNODE_INCOMPLETE_DIR_NAME
-from .schema.recnode_types import RecnodeMsg, RecnodeDoneStatus, RecnodePlatformType, RecnodeSegmentsInfo
+from .schema.recnode_types import (
+    RecnodeMsg,
+    RecnodeDoneStatus,
+    RecnodePlatformType,
+    RecnodeSegmentsInfo,
+    RecnodeSegmentSource,
+)
 from .transcoder.recnode_transcoder import RecnodeTranscoder, RecnodeDoneTaskResult
 
 targets = [
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 
-from ..schema.recnode_types import RecnodeSegmentsInfo
+from ..schema.recnode_types import RecnodeSegmentsInfo, RecnodeSegmentSource
 from ...common.fs import FsType
+from ...utils import HashFactory
 
 
 class SegmentAccessor(ABC):
@@ -9,7 +10,7 @@ class SegmentAccessor(ABC):
         self.fs_type = fs_type
 
     @abstractmethod
-    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[str]:
+    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[RecnodeSegmentSource]:
         pass
 
     @abstractmethod
@@ -20,6 +21,16 @@ class SegmentAccessor(ABC):
     async def copy(self, paths: list[str], dest_dir_path: str):
         pass
 
+    @abstractmethod
+    async def extract(
+        self,
+        paths: list[str],
+        out_dir_path: str,
+        tee_dir_path: str | None = None,
+        hash_factory: HashFactory | None = None,
+    ) -> list[str]:
+        pass
+
     @abstractmethod
     async def clear_by_info(self, info: RecnodeSegmentsInfo):
         pass
@@ -27,3 +38,6 @@ class SegmentAccessor(ABC):
     @abstractmethod
     async def clear_by_paths(self, paths: list[str]):
         pass
+
+    async def close(self):
+        pass
@@ -4,9 +4,9 @@ from aiofiles import os as aios
 from pyutils import path_join
 
 from .segment_accessor import SegmentAccessor
-from ..schema.recnode_types import RecnodeSegmentsInfo
+from ..schema.recnode_types import RecnodeSegmentsInfo, RecnodeSegmentSource
 from ...common.fs import FsType
-from ...utils import copy_file, rmtree
+from ...utils import copy_file, rmtree, ensure_dir, extract_tar_file, stem, HashFactory
 
 
 class LocalSegmentAccessor(SegmentAccessor):
@@ -14,9 +14,13 @@ class LocalSegmentAccessor(SegmentAccessor):
         super().__init__(FsType.LOCAL)
         self.src_incomplete_dir_path = local_incomplete_dir_path
 
-    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[str]:
+    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[RecnodeSegmentSource]:
         dir_path = path_join(self.src_incomplete_dir_path, info.platform_name, info.channel_id, info.video_name)
-        return [path_join(dir_path, file_name) for file_name in await aios.listdir(dir_path)]
+        sources = []
+        for file_name in await aios.listdir(dir_path):
+            file_path = path_join(dir_path, file_name)
+            sources.append(RecnodeSegmentSource(path=file_path, size=await aios.path.getsize(file_path)))
+        return sources
 
     async def get_size_sum(self, info: RecnodeSegmentsInfo) -> int:
         dir_path = path_join(self.src_incomplete_dir_path, info.platform_name, info.channel_id, info.video_name)
@@ -37,6 +41,23 @@ class LocalSegmentAccessor(SegmentAccessor):
             out_file_path = path_join(dest_dir_path, Path(src_file_path).name)
             await copy_file(src=src_file_path, dst=out_file_path)
 
+    async def extract(
+        self,
+        paths: list[str],
+        out_dir_path: str,
+        tee_dir_path: str | None = None,
+        hash_factory: HashFactory | None = None,
+    ) -> list[str]:
+        seg_paths = []
+        for src_file_path in paths:
+            if not await aios.path.isfile(src_file_path):
+                raise ValueError(f"Source path {src_file_path} is not a file.")
+            if tee_dir_path is not None:
+                await copy_file(src=src_file_path, dst=path_join(tee_dir_path, Path(src_file_path).name))
+            extracted_dir_path = await ensure_dir(path_join(out_dir_path, stem(src_file_path)))
+            seg_paths.extend(await extract_tar_file(src_file_path, extracted_dir_path, hash_factory=hash_factory))
+        return seg_paths
+
     async def clear_by_info(self, info: RecnodeSegmentsInfo):
         platform_dir_path = path_join(self.src_incomplete_dir_path, info.platform_name)
         channel_dir_path = path_join(platform_dir_path, info.channel_id)
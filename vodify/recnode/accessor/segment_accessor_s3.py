@@ -1,62 +1,129 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
 import pyutils
-from pyutils import path_join, filename, avg, log
+from pyutils import path_join, filename, avg, log, error_dict
 
 from .segment_accessor import SegmentAccessor
 from ..schema.recnode_constrants import RECNODE_INCOMPLETE_DIR_NAME
-from ..schema.recnode_types import RecnodeSegmentsInfo
+from ..schema.recnode_types import RecnodeSegmentsInfo, RecnodeSegmentSource
 from ...common.fs import FsType
-from ...external.s3 import S3AsyncClient
+from ...external.s3 import S3AsyncClient, WriteFileResult
+from ...utils import TarStreamExtractor, HashFactory, ensure_dir, stem, utime
+
+T = TypeVar("T")
 
 
 class S3SegmentAccessor(SegmentAccessor):
-    def __init__(self, s3_client: S3AsyncClient, delete_batch_size: int):
+    def __init__(self, s3_client: S3AsyncClient, delete_batch_size: int, download_concurrency: int = 1):
         super().__init__(FsType.S3)
         self.__s3 = s3_client
         self.__delete_batch_size = delete_batch_size
+        self.__download_concurrency = download_concurrency
 
-    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[str]:
-        return await self.__get_keys(info)
+    async def get_paths(self, info: RecnodeSegmentsInfo) -> list[RecnodeSegmentSource]:
+        return await self.__get_objects(info)
 
     async def get_size_sum(self, info: RecnodeSegmentsInfo) -> int:
-        keys = await self.__get_keys(info)
-        size_sum = 0
-        for key in keys:
-            head = await self.__s3.head(key)
-            if head is not None:
-                size_sum += head.content_length
-        return size_sum
+        return sum(obj.size for obj in await self.__get_objects(info))
 
     async def copy(self, paths: list[str], dest_dir_path: str):
-        retry_cnt = 0
-        wasted_bytes = 0
-        small_chunk_counts = []
-
-        for key in paths:
+        async def download(key: str):
             file_path = path_join(dest_dir_path, filename(key))
-            ret = await self.__s3.write_file(key=key, file_path=file_path, sync_time=True)
-            small_chunk_counts.append(ret.small_chunk_count)
-            wasted_bytes += ret.wasted_bytes
-            retry_cnt += ret.retry_count
-
-        attr = {
-            "retry_count": retry_cnt,
-            "wasted_bytes_mb": wasted_bytes / 1024 / 1024,
-            "small_chunk_count_avg": avg(small_chunk_counts),
-            "small_chunk_count_max": max(small_chunk_counts) if small_chunk_counts else 0,
-        }
-        log.debug("Download objects from S3", attr)
-
-    async def __get_keys(self, info: RecnodeSegmentsInfo):
+            return await self.__s3.write_file(key=key, file_path=file_path, sync_time=True)
+
+        results = await self.__run_concurrently(paths, download)
+        log.debug("Download objects from S3", _download_stats(results, self.__download_concurrency))
+
+    async def extract(
+        self,
+        paths: list[str],
+        out_dir_path: str,
+        tee_dir_path: str | None = None,
+        hash_factory: HashFactory | None = None,
+    ) -> list[str]:
+        async def extract(key: str):
+            return await self.__extract_object(key, out_dir_path, tee_dir_path, hash_factory)
+
+        results = []
+        seg_paths = []
+        for ret, extracted_paths in await self.__run_concurrently(paths, extract):
+            results.append(ret)
+            seg_paths.extend(extracted_paths)
+        log.debug("Stream objects from S3", _download_stats(results, self.__download_concurrency))
+        return seg_paths
+
+    async def __run_concurrently(self, keys: list[str], fn: Callable[[str], Awaitable[T]]) -> list[T]:
+        semaphore = asyncio.Semaphore(self.__download_concurrency)
+
+        async def run(key: str) -> T:
+            async with semaphore:
+                try:
+                    return await fn(key)
+                except Exception as e:
+                    # Only the first failure is raised, so every one of them is logged here
+                    attr = error_dict(e)
+                    attr["key"] = key
+                    log.error("Failed to process S3 object", attr)
+                    raise
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(run(key)) for key in keys]
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        return [task.result() for task in tasks]
+
+    async def __extract_object(
+        self, key: str, out_dir_path: str, tee_dir_path: str | None, hash_factory: HashFactory | None
+    ):
+        tee_file_path = None
+        if tee_dir_path is not None:
+            tee_file_path = path_join(tee_dir_path, filename(key))
+        extractor = TarStreamExtractor(
+            out_dir_path=await ensure_dir(path_join(out_dir_path, stem(key))),
+            tee_file_path=tee_file_path,
+            hash_factory=hash_factory,
+        )
+        extractor.start()
+        try:
+            ret = await self.__s3.read_stream(key=key, on_chunk=extractor.write, on_reset=extractor.reset)
+            seg_paths = await extractor.close()
+        except (Exception, asyncio.CancelledError):
+            await extractor.abort()
+            raise
+
+        if tee_file_path is not None and ret.last_modified is not None:
+            await utime(tee_file_path, (ret.last_modified.timestamp(), ret.last_modified.timestamp()))
+        return ret, seg_paths
+
+    async def __get_objects(self, info: RecnodeSegmentsInfo) -> list[RecnodeSegmentSource]:
         chunks_path = path_join(RECNODE_INCOMPLETE_DIR_NAME, info.platform_name, info.channel_id, info.video_name)
-        keys = []
+        objects = []
         async for obj in self.__s3.list_all_objects(prefix=chunks_path):
-            keys.append(obj.key)
-        return keys
+            objects.append(RecnodeSegmentSource(path=obj.key, size=obj.size))
+        return objects
 
     async def clear_by_info(self, info: RecnodeSegmentsInfo):
-        keys = await self.__get_keys(info)
-        await self.clear_by_paths(keys)
+        objects = await self.__get_objects(info)
+        await self.clear_by_paths([obj.path for obj in objects])
 
     async def clear_by_paths(self, paths: list[str]):
         for keys in pyutils.sublist(paths, self.__delete_batch_size):
             await self.__s3.delete_batch(keys)
+
+    async def close(self):
+        await self.__s3.close()
+
+
+def _download_stats(results: list[WriteFileResult], concurrency: int) -> dict:
+    small_chunk_counts = [ret.small_chunk_count for ret in results]
+    return {
+        "object_count": len(results),
+        "concurrency": concurrency,
+        "retry_count": sum(ret.retry_count for ret in results),
+        "resume_count": sum(ret.resume_count for ret in results),
+        "wasted_bytes_mb": sum(ret.wasted_bytes for ret in results) / 1024 / 1024,
+        "small_chunk_count_avg": avg(small_chunk_counts),
+        "small_chunk_count_max": max(small_chunk_counts) if small_chunk_counts else 0,
+    }
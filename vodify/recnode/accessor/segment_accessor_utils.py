@@ -36,7 +36,12 @@ def create_recnode_accessor(
             min_read_timeout_sec=env.min_read_timeout_sec,
             read_timeout_threshold=env.read_timeout_threshold,
             proxy_conf=env.proxy,
+            max_pool_connections=max(env.network_pool_size, env.recnode.download_concurrency),
+        )
+        return S3SegmentAccessor(
+            s3_client=s3_client,
+            delete_batch_size=env.recnode.delete_batch_size,
+            download_concurrency=env.recnode.download_concurrency,
         )
-        return S3SegmentAccessor(s3_client=s3_client, delete_batch_size=env.recnode.delete_batch_size)
     else:
         raise ValueError(f"Unknown fs_name: {fs_name}")
@@ -4,10 +4,10 @@ from pathlib import Path
 import yaml
 from pydantic import BaseModel
 
-from .recnode_archiver import ArchiveTarget, RecnodeArchiver
+from .recnode_archiver import ArchiveTarget, ArchivePipelineConfig, RecnodeArchiver
 from ...env import BatchEnv
 from ...external.notifier import create_notifier
-from ...external.s3 import S3AsyncClient, S3Config
+from ...external.s3 import S3AsyncClient, S3Config, DEFAULT_MAX_POOL_CONNECTIONS
 
 
 class ArchiveMode(Enum):
@@ -27,7 +27,12 @@ class ArchiveConfig(BaseModel):
     network_mbit: float
     network_buf_size: int
     network_retry_limit: int
+    network_pool_size: int = DEFAULT_MAX_POOL_CONNECTIONS
     video_size_limit_gb: int
+    stream_extract: bool = False
+    pipe_remux: bool = False
+    download_concurrency: int = 1
+    pipeline: ArchivePipelineConfig = ArchivePipelineConfig()
     targets: list[ArchiveTarget]
 
 
@@ -46,29 +51,36 @@ class RecnodeArchiveExecutor:
             raise ValueError("archive_config_path is required")
         self.conf = read_archive_config(conf_path)
         self.notifier = create_notifier(env=env.env, conf=env.untf)
+        self.s3_client = S3AsyncClient(
+            conf=self.conf.s3_config,
+            network_mbit=self.conf.network_mbit,
+            network_buf_size=self.conf.network_buf_size,
+            retry_limit=self.conf.network_retry_limit,
+            min_read_timeout_sec=self.conf.min_read_timeout_sec,
+            read_timeout_threshold=self.conf.read_timeout_threshold,
+            max_pool_connections=max(self.conf.network_pool_size, self.conf.download_concurrency),
+        )
         self.archiver = RecnodeArchiver(
-            s3_client=S3AsyncClient(
-                conf=self.conf.s3_config,
-                network_mbit=self.conf.network_mbit,
-                network_buf_size=self.conf.network_buf_size,
-                retry_limit=self.conf.network_retry_limit,
-                min_read_timeout_sec=self.conf.min_read_timeout_sec,
-                read_timeout_threshold=self.conf.read_timeout_threshold,
-            ),
+            s3_client=self.s3_client,
             tmp_dir_path=self.conf.tmp_dir_path,
             out_dir_path=self.conf.out_dir_path,
             is_archive=self.conf.archive,
             video_size_limit_gb=self.conf.video_size_limit_gb,
+            stream_extract=self.conf.stream_extract,
+            pipe_remux=self.conf.pipe_remux,
+            download_concurrency=self.conf.download_concurrency,
+            pipeline_conf=self.conf.pipeline,
             notifier=self.notifier,
         )
         self.targets = self.conf.targets
 
     async def run(self):
-        if self.conf.mode == ArchiveMode.DOWNLOAD:
-            await self.archiver.download(self.targets)
-        elif self.conf.mode == ArchiveMode.TRANSCODE_LOCAL:
-            await self.archiver.transcode_by_local()
-        elif self.conf.mode == ArchiveMode.TRANSCODE_S3:
-            await self.archiver.transcode_by_s3(self.targets)
-        else:
-            raise ValueError(f"Unknown command: {self.conf.mode}")
+        async with self.s3_client:
+            if self.conf.mode == ArchiveMode.DOWNLOAD:
+                await self.archiver.download(self.targets)
+            elif self.conf.mode == ArchiveMode.TRANSCODE_LOCAL:
+                await self.archiver.transcode_by_local()
+            elif self.conf.mode == ArchiveMode.TRANSCODE_S3:
+                await self.archiver.transcode_by_s3(self.targets)
+            else:
+                raise ValueError(f"Unknown command: {self.conf.mode}")
@@ -1,16 +1,29 @@
 import asyncio
 
 from aiofiles import os as aios
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 from pyutils import path_join, filename, cur_duration, log
 
+from .recnode_download import (
+    DownloadManifest,
+    DownloadManifestEntry,
+    DownloadProgress,
+    MANIFEST_DIR_NAME,
+    read_manifest,
+    write_manifest,
+    is_downloaded,
+)
+from .recnode_pipeline import Pipeline, PipelineStage, PipelineSummary
+from ..accessor.segment_accessor import SegmentAccessor
 from ..accessor.segment_accessor_local import LocalSegmentAccessor
 from ..accessor.segment_accessor_s3 import S3SegmentAccessor
 from ..schema.recnode_constrants import RECNODE_INCOMPLETE_DIR_NAME
 from ..schema.recnode_types import RecnodeSegmentsInfo
+from ..transcoder.recnode_data import RecnodeTranscodeJob
 from ..transcoder.recnode_transcoder import RecnodeTranscoder
 from ...external.notifier import Notifier
 from ...external.s3 import S3AsyncClient
+from ...utils import DiskReservationLedger
 
 
 class ArchiveTarget(BaseModel):
@@ -19,6 +32,15 @@ class ArchiveTarget(BaseModel):
     video_name: str
 
 
+class ArchivePipelineConfig(BaseModel):
+    # Number of videos processed at the same time in each stage
+    download: conint(ge=1) = 1
+    extract: conint(ge=1) = 1
+    remux: conint(ge=1) = 1
+    publish: conint(ge=1) = 1
+    queue_size: conint(ge=1) = 1
+
+
 class RecnodeArchiver:
     def __init__(
         self,
@@ -28,6 +50,10 @@ class RecnodeArchiver:
         is_archive: bool,
         video_size_limit_gb: int,
         notifier: Notifier,
+        stream_extract: bool = False,
+        pipe_remux: bool = False,
+        download_concurrency: int = 1,
+        pipeline_conf: ArchivePipelineConfig | None = None,
     ):
         self.s3_client = s3_client
         self.notifier = notifier
@@ -36,80 +62,147 @@ class RecnodeArchiver:
         self.incomplete_dir_path = path_join(out_dir_path, RECNODE_INCOMPLETE_DIR_NAME)
         self.is_archive = is_archive
         self.video_size_limit_gb = video_size_limit_gb
-
-    async def transcode_by_s3(self, targets: list[ArchiveTarget]):
-        trans = RecnodeTranscoder(
-            accessor=S3SegmentAccessor(s3_client=self.s3_client, delete_batch_size=100),
-            notifier=self.notifier,
-            out_dir_path=path_join(self.out_dir_path, "complete"),
-            tmp_path=self.tmp_dir_path,
-            is_archive=self.is_archive,
-            video_size_limit_gb=self.video_size_limit_gb,
+        self.stream_extract = stream_extract
+        self.pipe_remux = pipe_remux
+        self.download_concurrency = download_concurrency
+        self.pipeline_conf = pipeline_conf or ArchivePipelineConfig()
+
+    async def transcode_by_s3(self, targets: list[ArchiveTarget]) -> PipelineSummary:
+        trans = self.__create_transcoder(
+            S3SegmentAccessor(
+                s3_client=self.s3_client,
+                delete_batch_size=100,
+                download_concurrency=self.download_concurrency,
+            )
         )
-
+        infos = []
         for target in targets:
-            start_time = asyncio.get_event_loop().time()
-            info = RecnodeSegmentsInfo(
-                platform_name=target.platform,
-                channel_id=target.uid,
-                video_name=target.video_name,
+            infos.append(
+                RecnodeSegmentsInfo(
+                    platform_name=target.platform,
+                    channel_id=target.uid,
+                    video_name=target.video_name,
+                )
             )
-            await trans.transcode(info)
-            log.info(f"End transcode video", {"elapsed_time": round(cur_duration(start_time), 3)})
-        log.info("All transcoding is done")
+        summary = await self.__run_pipeline(trans, infos)
+        log.info("All transcoding is done", _summary_attr(summary))
+        return summary
 
-    async def transcode_by_local(self):
-        trans = RecnodeTranscoder(
-            accessor=LocalSegmentAccessor(local_incomplete_dir_path=self.incomplete_dir_path),
-            notifier=self.notifier,
-            out_dir_path=path_join(self.out_dir_path, "complete"),
-            tmp_path=self.tmp_dir_path,
-            is_archive=self.is_archive,
-            video_size_limit_gb=self.video_size_limit_gb,
-        )
+    async def transcode_by_local(self) -> PipelineSummary:
+        trans = self.__create_transcoder(LocalSegmentAccessor(local_incomplete_dir_path=self.incomplete_dir_path))
+        infos = []
         for platform_name in await aios.listdir(self.incomplete_dir_path):
             platform_dir_path = await checked_dir_path(self.incomplete_dir_path, platform_name)
             for channel_id in await aios.listdir(platform_dir_path):
                 channel_dir_path = await checked_dir_path(platform_dir_path, channel_id)
                 for video_name in await aios.listdir(channel_dir_path):
                     await checked_dir_path(channel_dir_path, video_name)
-                    info = RecnodeSegmentsInfo(
-                        platform_name=platform_name,
-                        channel_id=channel_id,
-                        video_name=video_name,
+                    infos.append(
+                        RecnodeSegmentsInfo(
+                            platform_name=platform_name,
+                            channel_id=channel_id,
+                            video_name=video_name,
+                        )
                     )
-                    await trans.transcode(info)
-                    log.info(f"End transcode video", {video_name: video_name})
+        summary = await self.__run_pipeline(trans, infos)
 
         message = "All transcoding is done"
-        log.info(message)
-        await self.notifier.notify(message)
+        log.info(message, _summary_attr(summary))
+        await self.notifier.notify(f"{message}: succeeded={summary.succeeded}/{summary.total}")
+        return summary
+
+    def __create_transcoder(self, accessor: SegmentAccessor) -> RecnodeTranscoder:
+        return RecnodeTranscoder(
+            accessor=accessor,
+            notifier=self.notifier,
+            out_dir_path=path_join(self.out_dir_path, "complete"),
+            tmp_path=self.tmp_dir_path,
+            is_archive=self.is_archive,
+            video_size_limit_gb=self.video_size_limit_gb,
+            stream_extract=self.stream_extract,
+            pipe_remux=self.pipe_remux,
+            # The videos in the pipeline share the tmp directory
+            ledger=DiskReservationLedger(self.tmp_dir_path),
+        )
+
+    async def __run_pipeline(self, trans: RecnodeTranscoder, infos: list[RecnodeSegmentsInfo]) -> PipelineSummary:
+        conf = self.pipeline_conf
+        pipeline = Pipeline[RecnodeTranscodeJob](
+            stages=[
+                PipelineStage("download", trans.download, conf.download),
+                PipelineStage("extract", trans.extract, conf.extract),
+                PipelineStage("remux", trans.remux, conf.remux),
+                PipelineStage("publish", trans.publish, conf.publish),
+            ],
+            to_name=lambda job: f"{job.info.platform_name}:{job.info.channel_id}:{job.info.video_name}",
+            on_failure=trans.abort,
+            queue_size=conf.queue_size,
+        )
+        return await pipeline.run([trans.create_job(info) for info in infos])
 
     async def download(self, targets: list[ArchiveTarget]):
         start_time = asyncio.get_event_loop().time()
-
         for target in targets:
-            cnt = 0
-            keys: list[str] = []
-            prefix = path_join("incomplete", target.platform, target.uid, target.video_name)
-            async for obj in self.s3_client.list_all_objects(prefix=prefix):
-                keys.append(obj.key)
-
-            out_dir_path = path_join(self.out_dir_path, target.platform, target.uid, target.video_name)
-            await aios.makedirs(out_dir_path, exist_ok=True)
-            for key in keys:
-                file_path = path_join(out_dir_path, filename(key))
-                await self.s3_client.write_file(key=key, file_path=file_path, sync_time=True)
-                if cnt % 100 == 0:
-                    log.info(f"Archived {cnt} files")
-                cnt += 1
-            log.info(f"Archived {len(keys)} files")
-
+            await self.__download_target(target)
         log.info(f"Elapsed time: {cur_duration(start_time):.3f} sec")
 
+    async def __download_target(self, target: ArchiveTarget):
+        # Files that are already downloaded are skipped, so a failed batch can be resumed
+        prefix = path_join("incomplete", target.platform, target.uid, target.video_name)
+        objects = [obj async for obj in self.s3_client.list_all_objects(prefix=prefix)]
+        manifest = DownloadManifest.new(prefix, objects)
+        manifest_path = path_join(
+            self.out_dir_path, MANIFEST_DIR_NAME, target.platform, target.uid, f"{target.video_name}.json"
+        )
+        prev_manifest = await read_manifest(manifest_path)
+
+        out_dir_path = path_join(self.out_dir_path, target.platform, target.uid, target.video_name)
+        await aios.makedirs(out_dir_path, exist_ok=True)
+        progress = DownloadProgress(prefix, len(objects), sum(obj.size for obj in objects))
+        pending: list[DownloadManifestEntry] = []
+        for entry in manifest.entries.values():
+            prev_entry = prev_manifest.entries.get(entry.key) if prev_manifest is not None else None
+            file_path = path_join(out_dir_path, filename(entry.key))
+            if await asyncio.to_thread(is_downloaded, file_path, entry, prev_entry):
+                entry.done = True
+                progress.skip(entry.size)
+            else:
+                pending.append(entry)
+        await write_manifest(manifest_path, manifest)
+
+        semaphore = asyncio.Semaphore(self.download_concurrency)
+
+        async def download(entry: DownloadManifestEntry):
+            async with semaphore:
+                file_path = path_join(out_dir_path, filename(entry.key))
+                await self.s3_client.write_file(key=entry.key, file_path=file_path, sync_time=True)
+                entry.done = True
+                progress.add(entry.size)
+
+        report_task = asyncio.create_task(progress.report_forever())
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for entry in pending:
+                    tg.create_task(download(entry))
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        finally:
+            report_task.cancel()
+            await write_manifest(manifest_path, manifest)
+        progress.report("Archived files")
+
 
 async def checked_dir_path(base_dir_path: str, new_path: str) -> str:
     return_dir_path = path_join(base_dir_path, new_path)
     if not await aios.path.isdir(return_dir_path):
         raise ValueError(f"Invalid directory: {return_dir_path}")
     return return_dir_path
+
+
+def _summary_attr(summary: PipelineSummary) -> dict:
+    return {
+        "total": summary.total,
+        "succeeded": summary.succeeded,
+        "failed": [f"{failure.target}({failure.stage})" for failure in summary.failures],
+        "duration": summary.duration,
+    }
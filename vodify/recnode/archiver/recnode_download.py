@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone
+
+from aiofiles import os as aios
+from pydantic import BaseModel
+from pyutils import log, cur_duration
+
+from ...external.s3 import S3ListContentObject
+from ...utils import write_file
+
+MANIFEST_DIR_NAME = "_manifests"
+PROGRESS_INTERVAL_SEC = 10
+
+
+class DownloadManifestEntry(BaseModel):
+    key: str
+    size: int
+    etag: str
+    last_modified: datetime
+    done: bool = False
+
+
+class DownloadManifest(BaseModel):
+    prefix: str
+    entries: dict[str, DownloadManifestEntry]
+
+    @staticmethod
+    def new(prefix: str, objects: list[S3ListContentObject]) -> "DownloadManifest":
+        entries = {}
+        for obj in objects:
+            entries[obj.key] = DownloadManifestEntry(
+                key=obj.key,
+                size=obj.size,
+                etag=obj.etag,
+                last_modified=obj.last_modified,
+            )
+        return DownloadManifest(prefix=prefix, entries=entries)
+
+
+async def read_manifest(manifest_path: str) -> DownloadManifest | None:
+    if not await aios.path.exists(manifest_path):
+        return None
+    text = await asyncio.to_thread(_read_text, manifest_path)
+    try:
+        return DownloadManifest(**json.loads(text))
+    except ValueError:
+        log.warn("Invalid download manifest", {"path": manifest_path})
+        return None
+
+
+async def write_manifest(manifest_path: str, manifest: DownloadManifest):
+    await write_file(manifest_path, manifest.model_dump_json())
+
+
+def is_downloaded(file_path: str, entry: DownloadManifestEntry, prev_entry: DownloadManifestEntry | None) -> bool:
+    if prev_entry is not None and prev_entry.etag != entry.etag:
+        return False
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return False
+    if stat.st_size != entry.size:
+        return False
+    # A download recorded as done is complete, otherwise the mtime synced at the end of the download is checked
+    if prev_entry is not None and prev_entry.done:
+        return True
+    last_modified = entry.last_modified
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return int(stat.st_mtime) == int(last_modified.timestamp())
+
+
+def _read_text(file_path: str) -> str:
+    with open(file_path, "r") as f:
+        return f.read()
+
+
+class DownloadProgress:
+    def __init__(self, name: str, total_cnt: int, total_bytes: int):
+        self.__name = name
+        self.__total_cnt = total_cnt
+        self.__total_bytes = total_bytes
+        self.__start = asyncio.get_event_loop().time()
+        self.__done_cnt = 0
+        self.__done_bytes = 0
+        self.__skipped_bytes = 0
+
+    def skip(self, size: int):
+        self.__done_cnt += 1
+        self.__skipped_bytes += size
+
+    def add(self, size: int):
+        self.__done_cnt += 1
+        self.__done_bytes += size
+
+    async def report_forever(self, interval_sec: float = PROGRESS_INTERVAL_SEC):
+        while True:
+            await asyncio.sleep(interval_sec)
+            self.report("Download progress")
+
+    def report(self, msg: str):
+        duration = cur_duration(self.__start)
+        done_mb = (self.__done_bytes + self.__skipped_bytes) / 1024 / 1024
+        attr = {
+            "target": self.__name,
+            "files": f"{self.__done_cnt}/{self.__total_cnt}",
+            "mb": f"{round(done_mb, 1)}/{round(self.__total_bytes / 1024 / 1024, 1)}",
+            "skipped_mb": round(self.__skipped_bytes / 1024 / 1024, 1),
+            "mb_per_sec": round(self.__done_bytes / 1024 / 1024 / duration, 2) if duration > 0 else 0,
+            "duration": round(duration, 2),
+        }
+        log.info(msg, attr)
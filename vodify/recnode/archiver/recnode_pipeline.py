@@ -0,0 +1,108 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from pydantic import BaseModel
+from pyutils import log, error_dict, cur_duration
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class PipelineFailure(BaseModel):
+    target: str
+    stage: str
+    error: dict
+
+
+class PipelineSummary(BaseModel):
+    total: int
+    succeeded: int
+    failures: list[PipelineFailure]
+    duration: float
+
+
+class PipelineStage(Generic[T]):
+    def __init__(self, name: str, fn: Callable[[T], Awaitable[object]], concurrency: int = 1):
+        if concurrency < 1:
+            raise ValueError(f"Invalid stage concurrency: {name}={concurrency}")
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+
+
+# Runs items through the stages, so that each stage works on a different item at the same time.
+# The queues between the stages are bounded, so a fast stage can not run far ahead of a slow one
+class Pipeline(Generic[T]):
+    def __init__(
+        self,
+        stages: list[PipelineStage[T]],
+        to_name: Callable[[T], str],
+        on_failure: Callable[[T, Exception], Awaitable[object]] | None = None,
+        queue_size: int = 1,
+    ):
+        if len(stages) == 0:
+            raise ValueError("Pipeline stages are empty")
+        self.__stages = stages
+        self.__to_name = to_name
+        self.__on_failure = on_failure
+        self.__queue_size = queue_size
+
+    async def run(self, items: list[T]) -> PipelineSummary:
+        start = asyncio.get_event_loop().time()
+        queues: list[asyncio.Queue] = [asyncio.Queue(maxsize=self.__queue_size) for _ in self.__stages]
+        failures: list[PipelineFailure] = []
+        succeeded = 0
+
+        async def feed():
+            for item in items:
+                await queues[0].put(item)
+            for _ in range(self.__stages[0].concurrency):
+                await queues[0].put(_DONE)
+
+        async def work(idx: int):
+            nonlocal succeeded
+            stage = self.__stages[idx]
+            while True:
+                item = await queues[idx].get()
+                if item is _DONE:
+                    return
+                try:
+                    await stage.fn(item)
+                except Exception as e:
+                    # A failed item is dropped, and the others keep going
+                    failures.append(PipelineFailure(target=self.__to_name(item), stage=stage.name, error=error_dict(e)))
+                    await self.__handle_failure(item, e)
+                    continue
+                if idx + 1 < len(self.__stages):
+                    await queues[idx + 1].put(item)
+                else:
+                    succeeded += 1
+
+        async def run_stage(idx: int):
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(self.__stages[idx].concurrency):
+                    tg.create_task(work(idx))
+            if idx + 1 < len(self.__stages):
+                for _ in range(self.__stages[idx + 1].concurrency):
+                    await queues[idx + 1].put(_DONE)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(feed())
+            for i in range(len(self.__stages)):
+                tg.create_task(run_stage(i))
+
+        return PipelineSummary(
+            total=len(items),
+            succeeded=succeeded,
+            failures=failures,
+            duration=round(cur_duration(start), 2),
+        )
+
+    async def __handle_failure(self, item: T, e: Exception):
+        if self.__on_failure is None:
+            return
+        try:
+            await self.__on_failure(item, e)
+        except Exception as ex:
+            log.error("Failed to handle pipeline failure", error_dict(ex))
@@ -1,27 +1,196 @@
 import json
 
-from ..schema.recnode_types import RecnodeMsg
-from ...external.redis import RedisConfig, RedisQueue, create_app_redis_client
+from pydantic import BaseModel
+from redis.exceptions import WatchError
+
+from ..schema.recnode_types import RecnodeMsg, RecnodeDoneStatus
+from ...external.redis import RedisConfig, RedisQueue, RedisString, create_app_redis_client
 
 REDIS_RECNODE_MSG_LIST_KEY = "vodify:recnode:msg"
+REDIS_RECNODE_MSG_SIGNAL_KEY = "vodify:recnode:msg:signal"
+REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX = "vodify:recnode:msg:processing"
+REDIS_RECNODE_MSG_CONSUMER_KEY_PREFIX = "vodify:recnode:msg:consumer"
+REDIS_RECNODE_MSG_COUNTS_KEY = "vodify:recnode:msg:counts"
+REDIS_RECNODE_MSG_INDEX_KEY_PREFIX = "vodify:recnode:msg:index"
+DEFAULT_CONSUMER_LEASE_SEC = 60
+
+# Removes every copy of a value from a list, and only if it was there, decrements its counters and index entries.
+# An index entry is dropped once no copy of the value is left.
+# KEYS: list, counts hash, index hashes... / ARGV: value, index hash count, counter fields...
+REMOVE_AND_UNINDEX_SCRIPT = """
+local removed = redis.call('LREM', KEYS[1], 0, ARGV[1])
+if removed == 0 then
+    return 0
+end
+for i = 3, #ARGV do
+    local cnt = tonumber(redis.call('HGET', KEYS[2], ARGV[i]) or '0')
+    redis.call('HSET', KEYS[2], ARGV[i], math.max(cnt - removed, 0))
+end
+for i = 3, 2 + tonumber(ARGV[2]) do
+    if redis.call('HINCRBY', KEYS[i], ARGV[1], -removed) <= 0 then
+        redis.call('HDEL', KEYS[i], ARGV[1])
+    end
+end
+return removed
+"""
+
+
+class RecnodeQueuedMsg(BaseModel):
+    msg: RecnodeMsg
+    raw: str  # kept to ack the exact value in the processing list
+
+
+class RecnodeMsgCounts(BaseModel):
+    total: int
+    platform: dict[str, int]
+    fs_name: dict[str, int]
+    status: dict[str, int]
 
 
 class RecnodeMsgQueue:
-    def __init__(self, conf: RedisConfig):
+    def __init__(self, conf: RedisConfig, consumer_lease_sec: int = DEFAULT_CONSUMER_LEASE_SEC):
         self.__key = REDIS_RECNODE_MSG_LIST_KEY
-        self.redis_queue = RedisQueue(redis=create_app_redis_client(conf), key=self.__key)
+        self.__counts_key = REDIS_RECNODE_MSG_COUNTS_KEY
+        self.__conf = conf
+        self.__consumer_lease_sec = consumer_lease_sec
+        self.__redis = create_app_redis_client(conf)
+        self.__remove_and_unindex = self.__redis.register_script(REMOVE_AND_UNINDEX_SCRIPT)
+        self.redis_queue = RedisQueue(redis=self.__redis, key=self.__key)
+        self.__str = RedisString(client=create_app_redis_client(conf))
+        # Wakes up the dispatcher waiting in `wait()`, so that it does not have to poll for free slots
+        self.__signal = RedisQueue(redis=create_app_redis_client(conf), key=REDIS_RECNODE_MSG_SIGNAL_KEY)
 
+    # The counters and the indexes are kept in the same transaction as the list,
+    # and cover the messages until they are acked or removed
     async def push(self, value: RecnodeMsg):
-        await self.redis_queue.push(value.model_dump_json(by_alias=True))
+        await self.push_many([value])
 
-    async def get(self) -> RecnodeMsg | None:
-        txt = await self.redis_queue.get()
-        if txt is None:
+    async def push_many(self, values: list[RecnodeMsg]):
+        if len(values) == 0:
+            return
+        raws = [value.model_dump_json(by_alias=True) for value in values]
+        async with self.__redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self.__key, *raws)
+            for value, raw in zip(values, raws):
+                for field in _count_fields(value):
+                    pipe.hincrby(self.__counts_key, field, 1)
+                for index_key in _get_index_keys(value):
+                    pipe.hincrby(index_key, raw, 1)
+            await pipe.execute()
+
+    async def remove(self, raw: str) -> bool:  # return True if removed
+        return await self.__remove_raw(self.__key, raw)
+
+    # The indexes map to the distinct serialized messages, including the ones taken by a consumer but not acked yet
+    async def find(self, platform: str, uid: str, video_name: str) -> list[str]:
+        return await self.__get_indexed(_get_task_index_key(f"{platform}:{uid}:{video_name}"))
+
+    async def find_by_video_name(self, video_name: str) -> list[str]:
+        return await self.__get_indexed(_get_video_index_key(video_name))
+
+    async def list_by_status(self, status: RecnodeDoneStatus) -> list[str]:
+        return await self.__get_indexed(_get_status_index_key(status))
+
+    async def get_counts(self) -> RecnodeMsgCounts:
+        await self.__check_index()
+        counts: dict[str, str] = await self.__redis.hgetall(self.__counts_key)  # type: ignore
+
+        result = RecnodeMsgCounts(total=0, platform={}, fs_name={}, status={})
+        for field, cnt in counts.items():
+            if field == "total":
+                result.total = int(cnt)
+                continue
+            kind, name = field.split(":", 1)
+            if int(cnt) > 0:
+                getattr(result, kind)[name] = int(cnt)
+        return result
+
+    async def rebuild_index(self):
+        # Counts and indexes the queued and in-flight messages again, for a queue filled before they existed.
+        # Every push, take and ack touches a watched list or the counters, so the rebuild is retried if one runs meanwhile.
+        async with self.__redis.pipeline(transaction=True) as pipe:
+            while True:
+                processing_keys = await self.__list_processing_keys()
+                await pipe.watch(self.__key, self.__counts_key, *processing_keys)
+                try:
+                    # A take before the WATCH may have added a consumer list that is not watched yet
+                    match = f"{REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX}:*"
+                    if {key async for key in pipe.scan_iter(match=match)} != set(processing_keys):
+                        await pipe.reset()
+                        continue
+                    raws: list[str] = []
+                    for key in [self.__key, *processing_keys]:
+                        raws.extend(await pipe.lrange(key, 0, -1))  # type: ignore
+                    old_keys = [key async for key in pipe.scan_iter(match=f"{REDIS_RECNODE_MSG_INDEX_KEY_PREFIX}:*")]
+
+                    counts: dict[str, int] = {}
+                    indexes: dict[str, dict[str, int]] = {}
+                    for raw in raws:
+                        msg = RecnodeMsg(**json.loads(raw))
+                        for field in _count_fields(msg):
+                            counts[field] = counts.get(field, 0) + 1
+                        for index_key in _get_index_keys(msg):
+                            index = indexes.setdefault(index_key, {})
+                            index[raw] = index.get(raw, 0) + 1
+
+                    pipe.multi()
+                    pipe.delete(self.__counts_key, *old_keys)
+                    if len(counts) > 0:
+                        pipe.hset(self.__counts_key, mapping=counts)  # type: ignore
+                    for key, mapping in indexes.items():
+                        pipe.hset(key, mapping=mapping)  # type: ignore
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    async def notify(self):
+        # A single pending signal is enough to wake up the dispatcher, so the list never grows while it is busy
+        await self.__signal.push_capped("1", max_size=1)
+
+    async def wait(self, timeout_sec: float) -> bool:  # return False on timeout
+        signal = await self.__signal.bpop(timeout_sec=timeout_sec)
+        # Pending signals are merged into this one, as the caller reads the latest state anyway
+        await self.__signal.clear()
+        return signal is not None
+
+    # A consumer takes a message into its own processing list, and acks it once handled.
+    # If the consumer dies before that, `reap()` moves the message back to the queue, so it is delivered at least once.
+    async def take(self, consumer_id: str, timeout_sec: float | None = None) -> RecnodeQueuedMsg | None:
+        raw = await self.redis_queue.move(self.__get_processing_key(consumer_id), timeout_sec=timeout_sec)
+        if raw is None:
             return None
-        return RecnodeMsg(**json.loads(txt))
+        return RecnodeQueuedMsg(msg=RecnodeMsg(**json.loads(raw)), raw=raw)
+
+    async def ack(self, consumer_id: str, item: RecnodeQueuedMsg):
+        await self.__remove_raw(self.__get_processing_key(consumer_id), item.raw)
+
+    async def release(self, consumer_id: str):
+        # Puts the last taken message back to the tail, so it is the next one again
+        await self.__get_processing_queue(consumer_id).move(self.__key, src_side="LEFT", dst_side="RIGHT")
+
+    async def keep_alive(self, consumer_id: str):
+        await self.__str.set(key=self.__get_consumer_key(consumer_id), value="1", ex=self.__consumer_lease_sec)
 
-    async def pop(self) -> RecnodeMsg | None:
-        txt = await self.redis_queue.pop()
+    async def recover(self, consumer_id: str) -> int:  # return requeued count
+        # The newest in-flight message is moved first, so the oldest one ends up at the tail
+        processing = self.__get_processing_queue(consumer_id)
+        cnt = 0
+        while await processing.move(self.__key, src_side="LEFT", dst_side="RIGHT") is not None:
+            cnt += 1
+        return cnt
+
+    async def reap(self) -> int:  # return requeued count
+        cnt = 0
+        async for keys in self.__str.scan(match=f"{REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX}:*"):
+            for key in keys:
+                consumer_id = key[len(REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX) + 1 :]
+                if not await self.__str.exists(key=self.__get_consumer_key(consumer_id)):
+                    cnt += await self.recover(consumer_id)
+        return cnt
+
+    async def get(self) -> RecnodeMsg | None:
+        txt = await self.redis_queue.get()
         if txt is None:
             return None
         return RecnodeMsg(**json.loads(txt))
@@ -30,6 +199,10 @@ class RecnodeMsgQueue:
         messages = await self.redis_queue.list_items()
         return [RecnodeMsg(**json.loads(msg)) for msg in messages]
 
+    async def list_range(self, offset: int, limit: int) -> list[RecnodeMsg]:  # in dispatch order
+        messages = await self.redis_queue.list_range(offset=offset, limit=limit)
+        return [RecnodeMsg(**json.loads(msg)) for msg in messages]
+
     async def size(self) -> int:
         return await self.redis_queue.size()
 
@@ -37,4 +210,72 @@ class RecnodeMsgQueue:
         return await self.redis_queue.empty()
 
     async def clear_queue(self):
-        await self.redis_queue.clear()
+        # The in-flight messages are dropped as well, otherwise the reaper would queue them again without their counts
+        processing_keys = await self.__list_processing_keys()
+        index_keys = await self.__list_index_keys()
+        async with self.__redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.__key, self.__counts_key, *processing_keys, *index_keys)
+            await pipe.execute()
+
+    async def __remove_raw(self, key: str, raw: str) -> bool:
+        msg = RecnodeMsg(**json.loads(raw))
+        index_keys = _get_index_keys(msg)
+        keys = [key, self.__counts_key, *index_keys]
+        args = [raw, len(index_keys), *_count_fields(msg)]
+        removed = await self.__remove_and_unindex(keys=keys, args=args)
+        return removed > 0  # type: ignore
+
+    async def __get_indexed(self, index_key: str) -> list[str]:
+        await self.__check_index()
+        return await self.__redis.hkeys(index_key)  # type: ignore
+
+    async def __check_index(self):
+        # The counters always have the "total" field once a message is pushed
+        if not await self.__redis.exists(self.__counts_key) and await self.size() > 0:
+            await self.rebuild_index()
+
+    async def __list_index_keys(self) -> list[str]:
+        return await self.__list_keys(f"{REDIS_RECNODE_MSG_INDEX_KEY_PREFIX}:*")
+
+    async def __list_processing_keys(self) -> list[str]:
+        return await self.__list_keys(f"{REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX}:*")
+
+    async def __list_keys(self, match: str) -> list[str]:
+        result: list[str] = []
+        async for keys in self.__str.scan(match=match):
+            result.extend(keys)
+        return result
+
+    def __get_processing_queue(self, consumer_id: str) -> RedisQueue:
+        return RedisQueue(redis=create_app_redis_client(self.__conf), key=self.__get_processing_key(consumer_id))
+
+    def __get_processing_key(self, consumer_id: str) -> str:
+        return f"{REDIS_RECNODE_MSG_PROCESSING_KEY_PREFIX}:{consumer_id}"
+
+    def __get_consumer_key(self, consumer_id: str) -> str:
+        return f"{REDIS_RECNODE_MSG_CONSUMER_KEY_PREFIX}:{consumer_id}"
+
+
+def _count_fields(msg: RecnodeMsg) -> list[str]:
+    return ["total", f"platform:{msg.platform.value}", f"fs_name:{msg.fs_name}", f"status:{msg.status.value}"]
+
+
+# Each index is a hash from the serialized messages to their number of copies in the queue and the processing lists
+def _get_index_keys(msg: RecnodeMsg) -> list[str]:
+    return [
+        _get_task_index_key(f"{msg.platform.value}:{msg.uid}:{msg.video_name}"),
+        _get_video_index_key(msg.video_name),
+        _get_status_index_key(msg.status),
+    ]
+
+
+def _get_task_index_key(task_key: str) -> str:
+    return f"{REDIS_RECNODE_MSG_INDEX_KEY_PREFIX}:key:{task_key}"
+
+
+def _get_video_index_key(video_name: str) -> str:
+    return f"{REDIS_RECNODE_MSG_INDEX_KEY_PREFIX}:video:{video_name}"
+
+
+def _get_status_index_key(status: RecnodeDoneStatus) -> str:
+    return f"{REDIS_RECNODE_MSG_INDEX_KEY_PREFIX}:status:{status.value}"
@@ -30,6 +30,11 @@ class RecnodeSegmentsInfo(BaseModel):
         return result
 
 
+class RecnodeSegmentSource(BaseModel):
+    path: str
+    size: int
+
+
 class RecnodeMsg(BaseModel):
     status: RecnodeDoneStatus
     platform: RecnodePlatformType
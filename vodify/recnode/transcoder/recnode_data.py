@@ -1,6 +1,12 @@
 from enum import Enum
 from typing import TypedDict
 
+from pydantic import BaseModel
+
+from .utils_preprocess_segments import InspectResult
+from .utils_segment_hash import SegmentFingerprint
+from ..schema.recnode_types import RecnodeSegmentsInfo
+
 
 class RecnodeDoneTaskStatus(Enum):
     SUCCESS = "SUCCESS"
@@ -10,3 +16,24 @@ class RecnodeDoneTaskStatus(Enum):
 class RecnodeDoneTaskResult(TypedDict):
     status: str
     message: str
+
+
+class RecnodeTranscodeJob(BaseModel):
+    info: RecnodeSegmentsInfo
+    start: float
+    base_dir_path: str
+    seg_dir_path: str
+    out_tmp_archive_dir_path: str
+    archive_tars: bool
+    archive_source: bool = False
+
+    source_paths: list[str] = []
+    source_size: int = 0
+    tars_dir_path: str | None = None  # None if the segments are extracted while downloading
+    extracted_seg_paths: list[str] = []
+    extracted_seg_fps: dict[str, SegmentFingerprint] = {}
+    mismatch_seg_infos: list[dict] = []
+    sorted_segment_paths: list[str] = []
+    inspect_result: InspectResult | None = None
+    merged_ts_path: str | None = None
+    tmp_mp4_path: str | None = None
@@ -1,25 +1,46 @@
 import asyncio
-import subprocess
 from pathlib import Path
 
-import aiofiles
 from aiofiles import os as aios
-from pyutils import log, path_join, error_dict, cur_duration, run_process
-
-from .recnode_data import RecnodeDoneTaskResult, RecnodeDoneTaskStatus
-from .utils_preprocess_segments import _get_deduplicated_seg_paths, _get_sorted_segment_paths, _check_missing_segments
-from .utils_preprocess_tars import _validate_tar_files, _extract_tar_files
-from .utils_estimate_size import _get_video_size_by_cnt
+from pyutils import log, path_join, error_dict, cur_duration
+
+from .recnode_data import RecnodeDoneTaskResult, RecnodeDoneTaskStatus, RecnodeTranscodeJob
+from .utils_preprocess_segments import (
+    _get_deduplicated_seg_paths,
+    _get_deduplicated_seg_members,
+    _get_sorted_segment_paths,
+    _check_missing_segments,
+)
+from .utils_preprocess_tars import _validate_tar_files, _validate_tar_paths, _read_seg_manifest, _extract_seg_members
+from .utils_estimate_size import _get_video_size, _check_free_space, _get_required_space
 from .utils_postprocess import clear_dir
+from .utils_remux import _remux_video, _remux_segments
+from .utils_segment_hash import _FingerprintCollector
 from ..accessor.segment_accessor import SegmentAccessor
 from ..schema.recnode_types import RecnodeSegmentsInfo
 from ...external.notifier import Notifier
-from ...utils import write_yaml_file, ensure_dir, move_directory_not_recur, move_file, rmtree
+from ...utils import (
+    write_yaml_file,
+    ensure_dir,
+    move_directory_not_recur,
+    move_file,
+    move_files,
+    is_same_device,
+    rmtree,
+    concat_files,
+    TarMemberHeader,
+    DiskReservationLedger,
+    DiskReservationResult,
+    HashFactory,
+)
 
 TAR_DIR_NAME = "tars"
 EXTRACTED_DIR_NAME = "extracted"
 SEGMENTS_DIR_NAME = "segments"
 
+DEFAULT_RESERVE_TIMEOUT_SEC = 1800
+RESERVE_POLL_INTERVAL_SEC = 10
+
 
 class RecnodeTranscoder:
     def __init__(
@@ -30,6 +51,10 @@ class RecnodeTranscoder:
         tmp_path: str,
         is_archive: bool,
         video_size_limit_gb: int,
+        stream_extract: bool = False,
+        pipe_remux: bool = False,
+        ledger: DiskReservationLedger | None = None,
+        reserve_timeout_sec: float = DEFAULT_RESERVE_TIMEOUT_SEC,
     ):
         self.__accessor = accessor
         self.__notifier = notifier
@@ -38,129 +63,235 @@ class RecnodeTranscoder:
         self.__out_dir_path = out_dir_path
         self.__is_archive = is_archive
         self.__video_size_limit_gb = video_size_limit_gb
+        self.__stream_extract = stream_extract
+        self.__pipe_remux = pipe_remux
+        self.__ledger = ledger
+        self.__reserve_timeout_sec = reserve_timeout_sec
+
+        # If the tmp and out directories are on different devices,
+        # the mp4 file is written to the out tmp directory directly, so that moving it is only a rename
+        self.__mp4_to_out_tmp = not is_same_device(tmp_path, out_dir_path)
+
+    async def close(self):
+        await self.__accessor.close()
 
     async def clear(self, info: RecnodeSegmentsInfo) -> RecnodeDoneTaskResult:
         await self.__accessor.clear_by_info(info)
         return _get_success_result("Clear success")
 
     async def transcode(self, info: RecnodeSegmentsInfo) -> RecnodeDoneTaskResult:
+        job = self.create_job(info)
         try:
-            return await self.__transcode(info)
+            await self.download(job)
+            await self.extract(job)
+            await self.remux(job)
+            return await self.publish(job)
         except Exception as e:
-            attr = info.to_dict()
-            for k, v in error_dict(e).items():
-                attr[k] = v
-            log.error("Failed to Transcode", attr)
-            await rmtree(path_join(self.__tmp_path, info.platform_name, info.channel_id, info.video_name))
+            await self.abort(job, e)
             raise e
 
-    async def __transcode(self, info: RecnodeSegmentsInfo) -> RecnodeDoneTaskResult:
-        # Initialize local variables
-        transcoding_start = asyncio.get_event_loop().time()
+    # The stages below are called in order, and can be pipelined over multiple jobs
 
+    def create_job(self, info: RecnodeSegmentsInfo) -> RecnodeTranscodeJob:
         pf = info.platform_name
         ch_id = info.channel_id
         vid = info.video_name
+        base_dir_path = path_join(self.__tmp_path, pf, ch_id, vid)
+        return RecnodeTranscodeJob(
+            info=info,
+            start=asyncio.get_event_loop().time(),
+            base_dir_path=base_dir_path,
+            seg_dir_path=path_join(base_dir_path, SEGMENTS_DIR_NAME),
+            out_tmp_archive_dir_path=path_join(self.__out_tmp_dir_path, pf, ch_id, vid, TAR_DIR_NAME),
+            archive_tars=self.__is_archive or info.should_archive,
+        )
 
-        archive_source = False
-        archive_tars = self.__is_archive
-        if info.should_archive:
-            archive_tars = True
+    async def download(self, job: RecnodeTranscodeJob):
+        info = job.info
+        job.start = asyncio.get_event_loop().time()
 
         # Get source paths
-        source_paths = await self.__accessor.get_paths(info)
+        sources = await self.__accessor.get_paths(info)
+        job.source_paths = [src.path for src in sources]
+        job.source_size = sum(src.size for src in sources)
 
-        # Check video size
-        await self.__check_video_size(info=info, source_paths=source_paths)
+        # Check video size, and Check free space before downloading
+        await self.__check_video_size(info=info, source_sizes=[src.size for src in sources])
+        await self.__check_free_space(info=info, source_size=job.source_size, base_dir_path=job.base_dir_path)
 
         # Start transcoding
         log.info("Start Transcoding", info.to_dict())
-        base_dir_path = path_join(self.__tmp_path, pf, ch_id, vid)
+        if self.__stream_extract:
+            # Extract segments while downloading, without staging tar files in the tmp directory
+            # If the tars may be archived, they are teed to the out tmp directory in the same pass
+            tee_dir_path = None
+            if job.archive_tars or info.conditionally_archive:
+                tee_dir_path = await ensure_dir(job.out_tmp_archive_dir_path)
+            extracted_dir_path = await ensure_dir(path_join(job.base_dir_path, EXTRACTED_DIR_NAME))
+            fp_collector = _FingerprintCollector()
+            job.extracted_seg_paths = await self.__extract_direct(
+                info=info,
+                extracted_dir_path=extracted_dir_path,
+                tee_dir_path=tee_dir_path,
+                source_paths=job.source_paths,
+                hash_factory=fp_collector.new_hash,
+            )
+            job.extracted_seg_fps = fp_collector.results()
+        else:
+            # Copy segments from remote storage
+            tars_dir_path = await self.__copy_direct(
+                info=info, base_dir_path=job.base_dir_path, source_paths=job.source_paths
+            )
+            await _validate_tar_files(tars_dir_path)
+            job.tars_dir_path = tars_dir_path
+
+    async def extract(self, job: RecnodeTranscodeJob):
+        info = job.info
+        pf = info.platform_name
+        ch_id = info.channel_id
+        vid = info.video_name
 
-        # Copy segments from remote storage
-        tars_dir_path = await self.__copy_direct(info=info, base_dir_path=base_dir_path, source_paths=source_paths)
-        await _validate_tar_files(tars_dir_path)
+        seg_dir_path = job.seg_dir_path
+        if job.tars_dir_path is None:
+            # Get deduplicated segment paths, and Check mismatched segments
+            extracted_dir_path = path_join(job.base_dir_path, EXTRACTED_DIR_NAME)
+            dd_seg_paths, mismatch_seg_infos, resolved_seg_infos = _get_deduplicated_seg_paths(
+                job.extracted_seg_paths, job.extracted_seg_fps
+            )
+
+            # Move segment files to `segments` directory
+            await ensure_dir(seg_dir_path)
+            pairs = [(seg_path, path_join(seg_dir_path, Path(seg_path).name)) for seg_path in dd_seg_paths]
+            move_result = await move_files(pairs)
+            log.debug("Move segment files", info.to_dict(move_result.model_dump()))
+
+            # Remove duplicated segment files
+            await rmtree(extracted_dir_path)
+        else:
+            # Deduplicate segments by the tar headers, and Check mismatched segments
+            seg_members = await _read_seg_manifest(job.tars_dir_path)
+            dd_seg_members, mismatch_seg_infos, resolved_seg_infos = await _get_deduplicated_seg_members(seg_members)
 
-        # Extract tar files
-        extracted_dir_path = await ensure_dir(path_join(base_dir_path, EXTRACTED_DIR_NAME))
-        extracted_seg_paths = await _extract_tar_files(src_dir_path=tars_dir_path, out_dir_path=extracted_dir_path)
+            # Extract only the deduplicated segments to `segments` directory
+            await ensure_dir(seg_dir_path)
+            await self.__extract_members(info=info, seg_members=dd_seg_members, seg_dir_path=seg_dir_path)
 
-        # Get deduplicated segment paths, and Check mismatched segments
-        dd_seg_paths, mismatch_seg_infos = await _get_deduplicated_seg_paths(extracted_seg_paths)
+        if len(resolved_seg_infos) > 0:
+            log.warn("Segment conflicts resolved by content", info.to_dict({"count": len(resolved_seg_infos)}))
+        job.mismatch_seg_infos = mismatch_seg_infos
         if len(mismatch_seg_infos) > 0:
-            head = "Segment size mismatch"
+            head = "Segment content mismatch"
             log.error(head, info.to_dict())
             msg = f"{head}: platform={pf}, channel_id={ch_id}, video_name={vid}"
             await self.__notifier.notify(msg)
-            archive_source = True
-            archive_tars = True
-
-        # Move segment files to `segments` directory
-        seg_dir_path = await ensure_dir(path_join(base_dir_path, SEGMENTS_DIR_NAME))
-        for seg_path in dd_seg_paths:
-            await move_file(src=seg_path, dst=path_join(seg_dir_path, Path(seg_path).name))
-
-        # Remove duplicated segment files
-        await rmtree(extracted_dir_path)
+            job.archive_source = True
+            job.archive_tars = True
 
         # Get sorted segment paths
         sorted_segment_paths = await _get_sorted_segment_paths(segments_path=seg_dir_path)
         if len(sorted_segment_paths) == 0:
             raise ValueError(f"Source path {seg_dir_path} is empty.")
+        job.sorted_segment_paths = sorted_segment_paths
 
         # Check for missing segments
-        inspect_result = _check_missing_segments(segment_paths=sorted_segment_paths)
-        if len(inspect_result.missing_segments) > 0 and info.conditionally_archive:
-            archive_tars = True
+        job.inspect_result = _check_missing_segments(segment_paths=sorted_segment_paths)
+        if len(job.inspect_result.missing_segments) > 0 and info.conditionally_archive:
+            job.archive_tars = True
 
         # Remove tar files
-        out_tmp_archive_dir_path = path_join(self.__out_tmp_dir_path, pf, ch_id, vid, TAR_DIR_NAME)
-        if archive_tars:
-            duration = await move_directory_not_recur(tars_dir_path, out_tmp_archive_dir_path)
-            attr = info.to_dict({"duration": round(duration, 2)})
-            log.debug("Move archive tar files to out tmp directory", attr)
+        if job.tars_dir_path is None:
+            # Tars that were not teed are kept in the source storage by `archive_source`
+            if not job.archive_tars and Path(job.out_tmp_archive_dir_path).exists():
+                await rmtree(job.out_tmp_archive_dir_path)
+        elif job.archive_tars:
+            move_result = await move_directory_not_recur(job.tars_dir_path, job.out_tmp_archive_dir_path)
+            log.debug("Move archive tar files to out tmp directory", info.to_dict(move_result.model_dump()))
+        else:
+            await rmtree(job.tars_dir_path)
+
+        if not self.__pipe_remux:
+            # Merge segments
+            merge_start = asyncio.get_event_loop().time()
+            merged_tmp_ts_path = path_join(job.base_dir_path, f"{vid}.ts")
+            await concat_files(sorted_segment_paths, merged_tmp_ts_path, remove_src=True)
+            await aios.rmdir(seg_dir_path)
+            job.merged_ts_path = merged_tmp_ts_path
+            log.debug("Merge segments", info.to_dict({"duration": round(cur_duration(merge_start), 2)}))
+
+    async def remux(self, job: RecnodeTranscodeJob):
+        info = job.info
+        tmp_mp4_path = path_join(job.base_dir_path, f"{info.video_name}.mp4")
+        if self.__mp4_to_out_tmp:
+            tmp_mp4_path = self.__get_out_tmp_mp4_path(info)
+            await ensure_dir(path_join(self.__out_tmp_dir_path, info.platform_name, info.channel_id, info.video_name))
+        if job.merged_ts_path is None:
+            # Remux segments to mp4 directly, without the merged ts file
+            await _remux_segments(job.sorted_segment_paths, tmp_mp4_path, info)
+            await aios.rmdir(job.seg_dir_path)
         else:
-            await rmtree(tars_dir_path)
-
-        # Merge segments
-        merged_tmp_ts_path = path_join(base_dir_path, f"{vid}.ts")
-        async with aiofiles.open(merged_tmp_ts_path, "wb") as merged_file:
-            for seg_file_path in sorted_segment_paths:
-                async with aiofiles.open(seg_file_path, "rb") as seg_file:
-                    await merged_file.write(await seg_file.read())
-                await aios.remove(seg_file_path)
-        await aios.rmdir(seg_dir_path)
-
-        # Remux video from ts to mp4
-        tmp_mp4_path = path_join(base_dir_path, f"{vid}.mp4")
-        await _remux_video(merged_tmp_ts_path, tmp_mp4_path, info)
-        await aios.remove(merged_tmp_ts_path)
+            # Remux video from ts to mp4
+            await _remux_video(job.merged_ts_path, tmp_mp4_path, info)
+            await aios.remove(job.merged_ts_path)
+        job.tmp_mp4_path = tmp_mp4_path
+
+        # Only the mp4 file remains in the tmp directory
+        if self.__ledger is not None:
+            await self.__ledger.update(_reservation_key(info), 0 if self.__mp4_to_out_tmp else job.source_size)
+
+    async def publish(self, job: RecnodeTranscodeJob) -> RecnodeDoneTaskResult:
+        info = job.info
+        pf = info.platform_name
+        ch_id = info.channel_id
+        vid = info.video_name
+        if job.tmp_mp4_path is None or job.inspect_result is None:
+            raise ValueError("Job is not remuxed yet")
 
         # Move result files
-        await self.__move_mp4(info=info, tmp_mp4_path=tmp_mp4_path)
+        await self.__move_mp4(info=info, tmp_mp4_path=job.tmp_mp4_path)
         comp_chan_dir_path = path_join(self.__out_dir_path, pf, ch_id)
-        await write_yaml_file(inspect_result.to_out_dict(), path_join(comp_chan_dir_path, f"{vid}.yaml"))
-        if len(mismatch_seg_infos) > 0:
-            await write_yaml_file(mismatch_seg_infos, path_join(comp_chan_dir_path, f"{vid}_missmatch.yaml"))
+        await write_yaml_file(job.inspect_result.to_out_dict(), path_join(comp_chan_dir_path, f"{vid}.yaml"))
+        if len(job.mismatch_seg_infos) > 0:
+            await write_yaml_file(job.mismatch_seg_infos, path_join(comp_chan_dir_path, f"{vid}_missmatch.yaml"))
+        out_tmp_archive_dir_path = job.out_tmp_archive_dir_path
         if Path(out_tmp_archive_dir_path).exists():
             comp_vid_dir_path = await ensure_dir(path_join(self.__out_dir_path, pf, ch_id, vid))
             await move_directory_not_recur(out_tmp_archive_dir_path, comp_vid_dir_path)
 
         # Clear temporary directories
-        await rmtree(base_dir_path)
+        await rmtree(job.base_dir_path)
         await clear_dir(self.__tmp_path, info, delete_platform=True, delete_self=False)
         await clear_dir(out_tmp_archive_dir_path, info, delete_platform=True, delete_self=True)
         await clear_dir(self.__out_tmp_dir_path, info, delete_platform=True, delete_self=False)
 
         # Delete source tar files if not archive
-        if not archive_source:
-            await self.__accessor.clear_by_paths(source_paths)
+        if not job.archive_source:
+            await self.__accessor.clear_by_paths(job.source_paths)
+        if self.__ledger is not None:
+            await self.__ledger.release(_reservation_key(info))
 
         # Close
         result_msg = "Complete Transcoding"
-        log.info(result_msg, info.to_dict({"duration": round(cur_duration(transcoding_start), 2)}))
+        log.info(result_msg, info.to_dict({"duration": round(cur_duration(job.start), 2)}))
         return _get_success_result(f"{result_msg}: platform={pf}, channel_id={ch_id}, video_name={vid}")
 
+    async def abort(self, job: RecnodeTranscodeJob, e: Exception):
+        info = job.info
+        try:
+            attr = info.to_dict()
+            for k, v in error_dict(e).items():
+                attr[k] = v
+            log.error("Failed to Transcode", attr)
+            if Path(job.base_dir_path).exists():
+                await rmtree(job.base_dir_path)
+            if self.__stream_extract and Path(job.out_tmp_archive_dir_path).exists():
+                await rmtree(job.out_tmp_archive_dir_path)
+            out_tmp_mp4_path = self.__get_out_tmp_mp4_path(info)
+            if self.__mp4_to_out_tmp and Path(out_tmp_mp4_path).exists():
+                await aios.remove(out_tmp_mp4_path)
+        finally:
+            if self.__ledger is not None:
+                await self.__ledger.release(_reservation_key(info))
+
     async def __copy_direct(self, info: RecnodeSegmentsInfo, base_dir_path: str, source_paths: list[str]) -> str:
         start = asyncio.get_event_loop().time()
         tars_dir_path = await ensure_dir(path_join(base_dir_path, TAR_DIR_NAME))
@@ -168,6 +299,25 @@ class RecnodeTranscoder:
         log.debug("Download segments", info.to_dict({"duration": round(cur_duration(start), 2)}))
         return tars_dir_path
 
+    async def __extract_direct(
+        self,
+        info: RecnodeSegmentsInfo,
+        extracted_dir_path: str,
+        tee_dir_path: str | None,
+        source_paths: list[str],
+        hash_factory: HashFactory,
+    ) -> list[str]:
+        start = asyncio.get_event_loop().time()
+        _validate_tar_paths(source_paths)
+        seg_paths = await self.__accessor.extract(source_paths, extracted_dir_path, tee_dir_path, hash_factory)
+        log.debug("Download and extract segments", info.to_dict({"duration": round(cur_duration(start), 2)}))
+        return seg_paths
+
+    async def __extract_members(self, info: RecnodeSegmentsInfo, seg_members: list[TarMemberHeader], seg_dir_path: str):
+        start = asyncio.get_event_loop().time()
+        await _extract_seg_members(seg_members, seg_dir_path)
+        log.debug("Extract segments", info.to_dict({"duration": round(cur_duration(start), 2)}))
+
     async def __copy_pass_by_out_dir(self, info: RecnodeSegmentsInfo, base_dir_path: str, src_paths: list[str]) -> str:
         dl_start = asyncio.get_event_loop().time()
         out_tmp_tars_dir_path = await ensure_dir(
@@ -197,9 +347,10 @@ class RecnodeTranscoder:
 
         start = asyncio.get_event_loop().time()
         # write 도중인 파일이 complete directory에 들어가면 안되기 때문에 먼저 incomplete directory로 이동
-        out_tmp_vid_dir_path = await ensure_dir(path_join(self.__out_tmp_dir_path, pf, ch_id, vid))
-        out_tmp_mp4_path = path_join(out_tmp_vid_dir_path, f"{vid}.mp4")
-        await move_file(src=tmp_mp4_path, dst=out_tmp_mp4_path)
+        out_tmp_mp4_path = self.__get_out_tmp_mp4_path(info)
+        if tmp_mp4_path != out_tmp_mp4_path:
+            await ensure_dir(path_join(self.__out_tmp_dir_path, pf, ch_id, vid))
+            await move_file(src=tmp_mp4_path, dst=out_tmp_mp4_path)
 
         # incomplete directory에 있는 파일을 complete directory로 이동
         complete_chan_dir_path = await ensure_dir(path_join(self.__out_dir_path, pf, ch_id))
@@ -207,8 +358,12 @@ class RecnodeTranscoder:
         await move_file(src=out_tmp_mp4_path, dst=complete_mp4_path)
         log.debug("Move mp4", info.to_dict({"duration": round(cur_duration(start), 2)}))
 
-    async def __check_video_size(self, info: RecnodeSegmentsInfo, source_paths: list[str]):
-        too_large, video_size_gb = _get_video_size_by_cnt(self.__video_size_limit_gb, source_paths)
+    def __get_out_tmp_mp4_path(self, info: RecnodeSegmentsInfo) -> str:
+        vid_dir_path = path_join(self.__out_tmp_dir_path, info.platform_name, info.channel_id, info.video_name)
+        return path_join(vid_dir_path, f"{info.video_name}.mp4")
+
+    async def __check_video_size(self, info: RecnodeSegmentsInfo, source_sizes: list[int]):
+        too_large, video_size_gb = _get_video_size(self.__video_size_limit_gb, source_sizes)
         info.video_size_gb = video_size_gb
         if too_large:
             head = "Video size is too large"
@@ -218,12 +373,37 @@ class RecnodeTranscoder:
             await self.__notifier.notify(message)
             raise ValueError(message)
 
+    async def __check_free_space(self, info: RecnodeSegmentsInfo, source_size: int, base_dir_path: str):
+        await ensure_dir(self.__tmp_path)
+        if self.__ledger is not None:
+            result = await self.__reserve_space(info, _get_required_space(source_size), base_dir_path)
+            not_enough = not result.reserved
+            required_gb = round(result.required / 1024 / 1024 / 1024, 2)
+            free_gb = round(result.available / 1024 / 1024 / 1024, 2)
+        else:
+            not_enough, required_gb, free_gb = await _check_free_space(self.__tmp_path, source_size)
+        if not_enough:
+            head = "Not enough free space"
+            log.error(head, info.to_dict({"required_gb": required_gb, "free_gb": free_gb}))
 
-async def _remux_video(src_path: str, out_path: str, info: RecnodeSegmentsInfo):
-    start = asyncio.get_event_loop().time()
-    command = ["ffmpeg", "-i", src_path, "-c", "copy", out_path]
-    await run_process(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    log.debug("Remux from ts to mp4", info.to_dict({"duration": round(cur_duration(start), 2)}))
+            message = f"{head}: platform={info.platform_name}, channel_id={info.channel_id}, video_name={info.video_name}, required={required_gb}GB, free={free_gb}GB"
+            await self.__notifier.notify(message)
+            raise ValueError(message)
+
+    async def __reserve_space(self, info: RecnodeSegmentsInfo, required: int, path: str) -> DiskReservationResult:
+        if self.__ledger is None:
+            raise ValueError("ledger is None")
+        start = asyncio.get_event_loop().time()
+        while True:
+            result = await self.__ledger.reserve(_reservation_key(info), required, path=path)
+            if result.reserved:
+                return result
+            # Waiting is useless if the space is not held by the other tasks
+            if result.reserved_by_others == 0 or cur_duration(start) > self.__reserve_timeout_sec:
+                return result
+            attr = info.to_dict({"required": result.required, "available": result.available})
+            log.info("Wait for disk space reserved by other tasks", attr)
+            await asyncio.sleep(RESERVE_POLL_INTERVAL_SEC)
 
 
 def _get_success_result(message: str) -> RecnodeDoneTaskResult:
@@ -231,3 +411,7 @@ def _get_success_result(message: str) -> RecnodeDoneTaskResult:
         "status": RecnodeDoneTaskStatus.SUCCESS.value,
         "message": message,
     }
+
+
+def _reservation_key(info: RecnodeSegmentsInfo) -> str:
+    return f"{info.platform_name}:{info.channel_id}:{info.video_name}"
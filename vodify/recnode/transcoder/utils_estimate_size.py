@@ -1,12 +1,17 @@
+import asyncio
+import shutil
+
 from ...utils import stem
 
 TAR_SIZE_MB = 18
 SEG_SIZE_MB = 2
 
+# Tars and extracted segments, or segments and the remuxed mp4, coexist at the peak
+REQUIRED_SPACE_RATIO = 2.0
 
-def _get_video_size_by_cnt(size_limit_gb: int, paths: list[str]) -> tuple[bool, float]:
-    tars_size_sum_mb = len(paths) * TAR_SIZE_MB
-    tars_size_sum_b = tars_size_sum_mb * 1024 * 1024
+
+def _get_video_size(size_limit_gb: int, sizes: list[int]) -> tuple[bool, float]:
+    tars_size_sum_b = sum(sizes)
     tars_size_sum_gb = round(tars_size_sum_b / 1024 / 1024 / 1024, 2)
     is_too_large = tars_size_sum_b > (size_limit_gb * 1024 * 1024 * 1024)
     return is_too_large, tars_size_sum_gb
@@ -26,3 +31,15 @@ def _get_video_size_by_name(size_limit_gb: int, paths: list[str]) -> tuple[bool,
     tars_size_sum_gb = round(tars_size_sum_b / 1024 / 1024 / 1024, 2)
     is_too_large = tars_size_sum_b > (size_limit_gb * 1024 * 1024 * 1024)
     return is_too_large, tars_size_sum_gb
+
+
+def _get_required_space(source_size: int) -> int:
+    return int(source_size * REQUIRED_SPACE_RATIO)
+
+
+async def _check_free_space(dir_path: str, source_size: int) -> tuple[bool, float, float]:
+    free_b = (await asyncio.to_thread(shutil.disk_usage, dir_path)).free
+    required_b = _get_required_space(source_size)
+    required_gb = round(required_b / 1024 / 1024 / 1024, 2)
+    free_gb = round(free_b / 1024 / 1024 / 1024, 2)
+    return required_b > free_b, required_gb, free_gb
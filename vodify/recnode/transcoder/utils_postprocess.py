@@ -1,3 +1,4 @@
+import errno
 from pathlib import Path
 
 from aiofiles import os as aios
@@ -15,13 +16,20 @@ async def clear_dir(
     platform_dir_path = path_join(base_dir_path, info.platform_name)
     channel_dir_path = path_join(platform_dir_path, info.channel_id)
     video_dir_path = path_join(channel_dir_path, info.video_name)
-    if Path(video_dir_path).exists() and len(await aios.listdir(video_dir_path)) == 0:
-        await aios.rmdir(video_dir_path)
-    if Path(channel_dir_path).exists() and len(await aios.listdir(channel_dir_path)) == 0:
-        await aios.rmdir(channel_dir_path)
+    await _remove_if_empty(video_dir_path)
+    await _remove_if_empty(channel_dir_path)
     if delete_platform:
-        if Path(platform_dir_path).exists() and len(await aios.listdir(platform_dir_path)) == 0:
-            await aios.rmdir(platform_dir_path)
+        await _remove_if_empty(platform_dir_path)
         if delete_self:
-            if Path(base_dir_path).exists() and len(await aios.listdir(base_dir_path)) == 0:
-                await aios.rmdir(base_dir_path)
+            await _remove_if_empty(base_dir_path)
+
+
+async def _remove_if_empty(dir_path: str):
+    if not Path(dir_path).exists() or len(await aios.listdir(dir_path)) > 0:
+        return
+    try:
+        await aios.rmdir(dir_path)
+    except OSError as e:
+        # Another transcoding may create or remove the directory concurrently
+        if e.errno not in (errno.ENOTEMPTY, errno.EEXIST, errno.ENOENT):
+            raise
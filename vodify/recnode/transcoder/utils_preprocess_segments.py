@@ -1,23 +1,62 @@
+from typing import Callable, Iterator, TypeVar
+
 from aiofiles import os as aios
 from pydantic import BaseModel, Field
 from pyutils import path_join
 
-from ...utils import stem
+from .utils_segment_hash import (
+    SegmentFingerprint,
+    _fingerprint_seg_members,
+    _resolve_seg_candidates,
+)
+from ...utils import stem, TarMemberHeader
+
+T = TypeVar("T")
+
+
+def _get_deduplicated_seg_paths(extract_seg_paths: list[str], seg_fps: dict[str, SegmentFingerprint]):
+    # The fingerprints are taken while extracting, so the duplicates are not read again
+    groups = _group_by_seg_num(extract_seg_paths, lambda path: path)
+    dup_paths = [path for paths in groups.values() if len(paths) > 1 for path in paths]
+    fps = [seg_fps[path] for path in dup_paths]
+    return _select_seg_candidates(groups, iter(fps), lambda path: path)
+
 
+async def _get_deduplicated_seg_members(seg_members: list[TarMemberHeader]):
+    groups = _group_by_seg_num(seg_members, lambda member: member.name)
+    dup_members = [member for members in groups.values() if len(members) > 1 for member in members]
+    fps = await _fingerprint_seg_members(dup_members)
+    return _select_seg_candidates(groups, iter(fps), lambda member: path_join(member.tar_path, member.name))
 
-async def _get_deduplicated_seg_paths(extract_seg_paths: list[str]):
-    seg_map: dict[int, str] = {}
+
+def _group_by_seg_num(candidates: list[T], to_name: Callable[[T], str]) -> dict[int, list[T]]:
+    groups: dict[int, list[T]] = {}
+    for candidate in candidates:
+        groups.setdefault(int(stem(to_name(candidate))), []).append(candidate)
+    return groups
+
+
+def _select_seg_candidates(groups: dict[int, list[T]], fps: Iterator[SegmentFingerprint], to_path: Callable[[T], str]):
+    selected: list[T] = []
     mismatch_seg_infos = []
-    for seg_path in extract_seg_paths:
-        seg_num = int(stem(seg_path))
-        if seg_num not in seg_map:
-            seg_map[seg_num] = seg_path
+    resolved_seg_infos = []
+    for candidates in groups.values():
+        if len(candidates) == 1:
+            selected.append(candidates[0])
+            continue
+
+        cand_fps = [next(fps) for _ in candidates]
+        idx = _resolve_seg_candidates(cand_fps)
+        if idx is None:
+            selected.append(candidates[0])
+            for candidate, fp in zip(candidates[1:], cand_fps[1:]):
+                if fp != cand_fps[0]:
+                    mismatch_seg_infos.append({"path1": to_path(candidates[0]), "path2": to_path(candidate)})
         else:
-            prev_size = (await aios.stat(seg_map[seg_num])).st_size
-            cur_size = (await aios.stat(seg_path)).st_size
-            if prev_size != cur_size:
-                mismatch_seg_infos.append({"path1": seg_map[seg_num], "path2": seg_path})
-    return list(seg_map.values()), mismatch_seg_infos
+            selected.append(candidates[idx])
+            if idx != 0 or len(set(fp.hash for fp in cand_fps)) > 1:
+                resolved_seg_infos.append({"path": to_path(candidates[idx]), "candidates": [to_path(c) for c in candidates]})
+    return selected, mismatch_seg_infos, resolved_seg_infos
 
 
 async def _get_sorted_segment_paths(segments_path: str) -> list[str]:
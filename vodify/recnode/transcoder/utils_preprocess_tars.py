@@ -3,7 +3,7 @@ from pathlib import Path
 from aiofiles import os as aios
 from pyutils import path_join
 
-from ...utils import ensure_dir, listdir_recur, open_tar, stem
+from ...utils import TarMemberHeader, read_tar_headers, extract_tar_ranges
 
 
 async def _validate_tar_files(tars_dir_path: str):
@@ -17,15 +17,25 @@ async def _validate_tar_files(tars_dir_path: str):
             raise ValueError(f"Invalid file ext: {path_join(tars_dir_path, tar_name)}")
 
 
-async def _extract_tar_files(src_dir_path: str, out_dir_path: str) -> list[str]:
-    for tar_filename in await aios.listdir(src_dir_path):
-        extracted_dir_path = await ensure_dir(path_join(out_dir_path, stem(tar_filename)))
-        await open_tar(path_join(src_dir_path, tar_filename), extracted_dir_path)
+def _validate_tar_paths(tar_paths: list[str]):
+    if len(tar_paths) == 0:
+        raise ValueError("Source tar paths are empty.")
+    for tar_path in tar_paths:
+        if not tar_path.endswith(".tar"):
+            raise ValueError(f"Invalid file ext: {tar_path}")
 
-    extracted_seg_paths = []
-    for file_path in await listdir_recur(out_dir_path):
-        if not file_path.endswith(".ts"):
-            raise ValueError(f"Invalid file ext: {file_path}")
-        extracted_seg_paths.append(file_path)
 
-    return extracted_seg_paths
+async def _read_seg_manifest(tars_dir_path: str) -> list[TarMemberHeader]:
+    headers = []
+    for tar_filename in sorted(await aios.listdir(tars_dir_path)):
+        for header in await read_tar_headers(path_join(tars_dir_path, tar_filename)):
+            if not header.name.endswith(".ts"):
+                raise ValueError(f"Invalid file ext: {path_join(header.tar_path, header.name)}")
+            headers.append(header)
+    return headers
+
+
+async def _extract_seg_members(seg_members: list[TarMemberHeader], seg_dir_path: str) -> list[str]:
+    targets = [(header, path_join(seg_dir_path, Path(header.name).name)) for header in seg_members]
+    await extract_tar_ranges(targets)
+    return [out_file_path for _, out_file_path in targets]
@@ -0,0 +1,58 @@
+import asyncio
+import subprocess
+
+import aiofiles
+from aiofiles import os as aios
+from pyutils import log, cur_duration, run_process
+
+from ..schema.recnode_types import RecnodeSegmentsInfo
+
+REMUX_PIPE_BUF_SIZE = 1024 * 1024  # 1MB
+
+
+async def _remux_video(src_path: str, out_path: str, info: RecnodeSegmentsInfo):
+    start = asyncio.get_event_loop().time()
+    command = ["ffmpeg", "-i", src_path, "-c", "copy", out_path]
+    await run_process(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log.debug("Remux from ts to mp4", info.to_dict({"duration": round(cur_duration(start), 2)}))
+
+
+async def _remux_segments(seg_paths: list[str], out_path: str, info: RecnodeSegmentsInfo):
+    # Segments are streamed into ffmpeg in order and removed as soon as they are consumed
+    start = asyncio.get_event_loop().time()
+    # stdin carries the segments, so an overwrite prompt must never be asked, and a leftover output of a failed run is replaced
+    command = ["ffmpeg", "-y", "-f", "mpegts", "-i", "pipe:0", "-c", "copy", out_path]
+    proc = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if proc.stdin is None or proc.stderr is None:
+        raise ValueError("Failed to open ffmpeg pipes")
+    stderr_task = asyncio.create_task(proc.stderr.read())
+
+    try:
+        for seg_path in seg_paths:
+            async with aiofiles.open(seg_path, "rb") as seg_file:
+                while True:
+                    chunk = await seg_file.read(REMUX_PIPE_BUF_SIZE)
+                    if not chunk:
+                        break
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+            await aios.remove(seg_path)
+        proc.stdin.close()
+        await proc.stdin.wait_closed()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # ffmpeg exited early, the cause is reported by its exit code
+    except BaseException:
+        proc.kill()
+        await proc.wait()
+        raise
+
+    stderr = await stderr_task
+    return_code = await proc.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, command, stderr=stderr)
+    log.debug("Remux segments from pipe to mp4", info.to_dict({"duration": round(cur_duration(start), 2)}))
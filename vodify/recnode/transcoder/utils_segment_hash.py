@@ -0,0 +1,94 @@
+import asyncio
+import zlib
+from typing import Callable
+
+from pydantic import BaseModel
+
+from ...utils import TarMemberHeader
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+HASH_BUF_SIZE = TS_PACKET_SIZE * 4096
+
+
+class SegmentFingerprint(BaseModel):
+    size: int
+    hash: int
+    intact: bool  # every MPEG-TS packet starts with a sync byte
+
+
+class _Fingerprinter:
+    def __init__(self):
+        self.__hash = 0
+        self.__size = 0
+        self.__intact = True
+
+    def update(self, chunk: memoryview):
+        self.__hash = zlib.crc32(chunk, self.__hash)
+        if self.__intact:
+            # Sync bytes of the packets that start in this chunk
+            first = (-self.__size) % TS_PACKET_SIZE
+            sync_bytes = bytes(chunk[first::TS_PACKET_SIZE])
+            if sync_bytes.count(TS_SYNC_BYTE) != len(sync_bytes):
+                self.__intact = False
+        self.__size += len(chunk)
+
+    def result(self) -> SegmentFingerprint:
+        intact = self.__intact and self.__size > 0 and self.__size % TS_PACKET_SIZE == 0
+        return SegmentFingerprint(size=self.__size, hash=self.__hash, intact=intact)
+
+
+# Fingerprints the segments while they are extracted, as the hash factory of the extraction
+class _FingerprintCollector:
+    def __init__(self):
+        self.__fps: dict[str, _Fingerprinter] = {}
+
+    def new_hash(self, file_path: str) -> Callable[[memoryview], None]:
+        # A member extracted again after a reset replaces its previous fingerprint
+        fp = _Fingerprinter()
+        self.__fps[file_path] = fp
+        return fp.update
+
+    def results(self) -> dict[str, SegmentFingerprint]:
+        return {file_path: fp.result() for file_path, fp in self.__fps.items()}
+
+
+def _fingerprint_range(file_path: str, offset: int, size: int | None, buf: bytearray) -> SegmentFingerprint:
+    fp = _Fingerprinter()
+    view = memoryview(buf)
+    with open(file_path, "rb", buffering=0) as f:
+        f.seek(offset)
+        remaining = size
+        while remaining is None or remaining > 0:
+            read_size = len(buf) if remaining is None else min(remaining, len(buf))
+            n = f.readinto(view[:read_size]) or 0
+            if n == 0:
+                break
+            fp.update(view[:n])
+            if remaining is not None:
+                remaining -= n
+    return fp.result()
+
+
+def _fingerprint_members(headers: list[TarMemberHeader]) -> list[SegmentFingerprint]:
+    buf = bytearray(HASH_BUF_SIZE)
+    return [_fingerprint_range(header.tar_path, header.offset, header.size, buf) for header in headers]
+
+
+async def _fingerprint_seg_members(headers: list[TarMemberHeader]) -> list[SegmentFingerprint]:
+    # Reads the member data directly from the tar, so duplicates are never written to disk
+    return await asyncio.to_thread(_fingerprint_members, headers)
+
+
+def _resolve_seg_candidates(fps: list[SegmentFingerprint]) -> int | None:
+    # Returns the index of the copy to keep, or None if the copies can not be resolved
+    if _is_same_content(fps):
+        return 0
+    intact_idxes = [i for i, fp in enumerate(fps) if fp.intact]
+    if len(intact_idxes) > 0 and _is_same_content([fps[i] for i in intact_idxes]):
+        return intact_idxes[0]
+    return None
+
+
+def _is_same_content(fps: list[SegmentFingerprint]) -> bool:
+    return all(fp.size == fps[0].size and fp.hash == fps[0].hash for fp in fps)
@@ -2,9 +2,11 @@ import os
 import sys
 
 from .celery_controller import CeleryController
+from .celery_inspect_job import CeleryInspectJob
 
 targets = [
     "celery_controller",
+    "celery_inspect_job",
 ]
 if os.getenv("PY_ENV") != "prod":
     for name in list(sys.modules.keys()):
@@ -1,20 +1,20 @@
+import asyncio
 import json
+import time
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 
-from ...celery import (
-    app,
-    CeleryRedisBrokerClient,
-    shutdown_workers,
-    find_active_worker_names,
-    get_running_tasks,
-    get_prefetched_tasks,
-)
+from .celery_inspect_job import CeleryInspectJob
+from ...celery import app, CeleryRedisBrokerClient, WorkerInspection, shutdown_workers
+
+
+MAX_QUEUED_TASKS_PAGE_SIZE = 1000
 
 
 class CeleryController:
-    def __init__(self, celery_redis: CeleryRedisBrokerClient):
+    def __init__(self, celery_redis: CeleryRedisBrokerClient, inspect_job: CeleryInspectJob):
         self.redis_broker = celery_redis
+        self.__inspect_job = inspect_job
         self.router = APIRouter(prefix="/api/celery")
         self.router.add_api_route("/shutdown", self.shutdown, methods=["POST"])
         self.router.add_api_route("/workers", self.get_workers, methods=["GET"])
@@ -27,25 +27,56 @@ class CeleryController:
         shutdown_workers(app)
         return "ok"
 
-    def get_workers(self):
-        return find_active_worker_names(app)
+    # The inspections are served from the snapshot refreshed by the inspect job, and `fresh` broadcasts right away
+    async def get_workers(self, fresh: bool = False):
+        snapshot = await self.__get_snapshot(fresh)
+        return {"age_sec": _get_age_sec(snapshot), "workers": snapshot.worker_names}
 
-    def get_running_tasks(self):
-        return get_running_tasks(app)
+    async def get_running_tasks(self, fresh: bool = False):
+        snapshot = await self.__get_snapshot(fresh)
+        return {"age_sec": _get_age_sec(snapshot), "tasks": snapshot.running_tasks}
 
-    def get_prefetched_tasks(self):
-        return get_prefetched_tasks(app)
+    async def get_prefetched_tasks(self, fresh: bool = False):
+        snapshot = await self.__get_snapshot(fresh)
+        return {"age_sec": _get_age_sec(snapshot), "tasks": snapshot.prefetched_tasks}
 
-    async def get_queue_tasks_bodies(self, queue_name: str):
-        bodies = await self.redis_broker.get_received_task_bodies(queue_name=queue_name)
+    async def get_queue_tasks_bodies(
+        self,
+        queue_name: str,
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=0, le=MAX_QUEUED_TASKS_PAGE_SIZE),
+    ):
         return {
-            "count": len(bodies),
-            "bodies": bodies,
+            "count": await self.redis_broker.count(queue_name),
+            "offset": offset,
+            "limit": limit,
+            "bodies": await self.__get_bodies(queue_name, offset, limit),
         }
 
-    async def get_queue_tasks_args(self, queue_name: str):
-        bodies = await self.redis_broker.get_received_task_bodies(queue_name=queue_name)
+    async def get_queue_tasks_args(
+        self,
+        queue_name: str,
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=0, le=MAX_QUEUED_TASKS_PAGE_SIZE),
+    ):
+        bodies = await self.__get_bodies(queue_name, offset, limit)
         return {
-            "count": len(bodies),
+            "count": await self.redis_broker.count(queue_name),
+            "offset": offset,
+            "limit": limit,
             "args": [json.dumps(body["args"]) for body in bodies],
         }
+
+    async def __get_snapshot(self, fresh: bool) -> WorkerInspection:
+        snapshot = self.__inspect_job.snapshot
+        if fresh or snapshot is None:
+            snapshot = await asyncio.to_thread(self.__inspect_job.refresh)
+        return snapshot
+
+    async def __get_bodies(self, queue_name: str, offset: int, limit: int) -> list[dict]:
+        tasks = self.redis_broker.iter_received_tasks(queue_name, offset=offset, limit=limit)
+        return [task.get_parsed_body() async for task in tasks]
+
+
+def _get_age_sec(snapshot: WorkerInspection) -> float:
+    return round(max(time.time() - snapshot.inspected_at, 0), 3)
@@ -0,0 +1,25 @@
+from celery import Celery
+
+from ...celery import WorkerInspection, inspect_workers
+from ...common.job import Job
+
+CELERY_INSPECT_JOB_NAME = "celery_inspect_job"
+DEFAULT_INSPECT_TIMEOUT_SEC = 1
+
+
+class CeleryInspectJob(Job):
+    def __init__(self, app: Celery, timeout_sec: float = DEFAULT_INSPECT_TIMEOUT_SEC):
+        super().__init__(name=CELERY_INSPECT_JOB_NAME)
+        self.__app = app
+        self.timeout_sec = timeout_sec
+        self.snapshot: WorkerInspection | None = None
+
+    async def run(self):
+        # The cron job has its own thread, so the blocking broadcast does not hold up the server loop
+        self.refresh()
+
+    def refresh(self) -> WorkerInspection:
+        # The snapshot is replaced as a whole, so readers on other threads never see a partial one
+        snapshot = inspect_workers(self.__app, timeout_sec=self.timeout_sec)
+        self.snapshot = snapshot
+        return snapshot
@@ -1,23 +1,49 @@
 import json
+import time
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
+from pydantic import BaseModel, conlist
 
 from .recnode_task_registrar import RecnodeTaskRegistrar
 from ...common.job import CronJob
-from ...external.redis import RedisConfig
+from ...common.task import TaskStatusRepository, TaskStatus
 from ...recnode import RecnodeMsg, RecnodeDoneStatus, RecnodeMsgQueue
 
 
+MAX_TASK_STATUS_QUERY_SIZE = 10000
+MAX_TASK_STATUS_PAGE_SIZE = 1000
+MAX_STATS_PAGE_SIZE = 1000
+DEFAULT_STATS_CACHE_TTL_SEC = 2
+
+
+class RecnodeTaskStatusQuery(BaseModel):
+    task_unames: conlist(str, max_length=MAX_TASK_STATUS_QUERY_SIZE)
+
+
 class RecnodeController:
-    def __init__(self, redis_conf: RedisConfig, cron: CronJob, registrar: RecnodeTaskRegistrar):
-        self.__queue = RecnodeMsgQueue(redis_conf)
+    def __init__(
+        self,
+        queue: RecnodeMsgQueue,
+        cron: CronJob,
+        registrar: RecnodeTaskRegistrar,
+        task_status_repository: TaskStatusRepository,
+        stats_cache_ttl_sec: float = DEFAULT_STATS_CACHE_TTL_SEC,
+    ):
+        self.__queue = queue
         self.__cron = cron
         self.__registrar = registrar
+        self.__task_status_repository = task_status_repository
+
+        # Monitoring scrapes the stats repeatedly, so a snapshot is reused for a short while per page
+        self.__stats_cache_ttl_sec = stats_cache_ttl_sec
+        self.__stats_cache: dict[tuple[int, int], tuple[float, dict]] = {}
 
         self.router = APIRouter(prefix="/api/recnode")
         self.router.add_api_route("/health", self.health, methods=["GET"])
         self.router.add_api_route("/stats", self.get_stats, methods=["GET"])
         self.router.add_api_route("/tasks", self.push_task, methods=["POST"])
+        self.router.add_api_route("/tasks/status", self.get_task_statuses, methods=["POST"])
+        self.router.add_api_route("/tasks/status", self.list_task_statuses, methods=["GET"])
         self.router.add_api_route("/listening/start", self.start_listening, methods=["POST"])
         self.router.add_api_route("/listening/stop", self.stop_listening, methods=["POST"])
         self.router.add_api_route("/command/cancel-extract", self.extract_cancel_requests, methods=["POST"])
@@ -28,13 +54,46 @@ class RecnodeController:
     def health(self):
         return {"status": "UP"}
 
-    async def get_stats(self):
-        items = await self.__queue.list_items()
-        items.reverse()
+    async def get_stats(
+        self,
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=0, le=MAX_STATS_PAGE_SIZE),
+    ):
+        now = time.monotonic()
+        cached = self.__stats_cache.get((offset, limit))
+        if cached is not None and cached[0] > now:
+            stats = cached[1]
+        else:
+            stats = {
+                "queue_size": await self.__queue.size(),
+                "counts": await self.__queue.get_counts(),
+                "offset": offset,
+                "limit": limit,
+                "queue_items": await self.__queue.list_range(offset=offset, limit=limit) if limit > 0 else [],
+            }
+            self.__stats_cache = {k: v for k, v in self.__stats_cache.items() if v[0] > now}
+            self.__stats_cache[(offset, limit)] = (now + self.__stats_cache_ttl_sec, stats)
+        return {"listening": self.__cron.is_running(), **stats}
+
+    async def get_task_statuses(self, query: RecnodeTaskStatusQuery):
+        statuses = await self.__task_status_repository.get_many(query.task_unames)
+        return {name: status.value if status is not None else None for name, status in statuses.items()}
+
+    async def list_task_statuses(
+        self,
+        state: TaskStatus | None = None,
+        prefix: str = "",
+        offset: int = Query(default=0, ge=0),
+        limit: int = Query(default=100, ge=1, le=MAX_TASK_STATUS_PAGE_SIZE),
+    ):
+        # SCAN returns the keys in no particular order, so they are sorted to keep the pages stable
+        entries = [entry async for entry in self.__task_status_repository.list_by_status(prefix=prefix, status=state)]
+        entries.sort(key=lambda entry: entry.task_uname)
         return {
-            "listening": self.__cron.is_running(),
-            "queue_size": await self.__queue.size(),
-            "queue_items": items,
+            "total": len(entries),
+            "offset": offset,
+            "limit": limit,
+            "items": entries[offset : offset + limit],
         }
 
     def start_listening(self):
@@ -52,21 +111,21 @@ class RecnodeController:
         return "ok"
 
     async def extract_cancel_requests(self):
-        for value in await self.__queue.redis_queue.list_items():
+        # Only the CANCELED partition of the index is read, and a message already taken by the dispatcher is skipped
+        for value in await self.__queue.list_by_status(RecnodeDoneStatus.CANCELED):
             msg = RecnodeMsg(**json.loads(value))
-            if msg.status == RecnodeDoneStatus.CANCELED:
-                queue_name = self.__registrar.resolve_queue(msg)
-                await self.__queue.redis_queue.remove_by_value(value)
+            queue_name = self.__registrar.resolve_queue(msg)
+            if await self.__queue.remove(value):
                 self.__registrar.register(msg, queue_name)
         return "ok"
 
     async def convert_to_cancel_by_video_name(self, video_name: str):
-        for value in await self.__queue.redis_queue.list_items():
-            msg = RecnodeMsg(**json.loads(value))
-            if msg.video_name == video_name:
-                new_msg = msg.model_copy()
-                new_msg.status = RecnodeDoneStatus.CANCELED
-                queue_name = self.__registrar.resolve_queue(new_msg)
-                await self.__queue.redis_queue.remove_by_value(value)
+        for value in await self.__queue.find_by_video_name(video_name):
+            new_msg = RecnodeMsg(**json.loads(value))
+            if new_msg.status == RecnodeDoneStatus.CANCELED:
+                continue  # the index is unordered, so an entry converted before may come first
+            new_msg.status = RecnodeDoneStatus.CANCELED
+            queue_name = self.__registrar.resolve_queue(new_msg)
+            if await self.__queue.remove(value):
                 self.__registrar.register(new_msg, queue_name)
                 return new_msg
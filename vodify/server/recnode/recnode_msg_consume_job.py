@@ -1,35 +1,96 @@
+import asyncio
 import json
 
+from pyutils import log, error_dict
+
 from .recnode_task_registrar import RecnodeTaskRegistrar
 from ...common.job import Job
-from ...external.redis import RedisConfig
-from ...external.sqs import SQSAsyncClient
+from ...external.sqs import SQSAsyncClient, SQSMessage
 from ...recnode import RecnodeMsg, RecnodeMsgQueue, RecnodeDoneStatus
 
 RECNODE_MSG_CONSUME_JOB_NAME = "recnode_msg_consume_job"
+DEFAULT_POLLER_CNT = 4
+DEFAULT_ERROR_BACKOFF_SEC = 5
+DEFAULT_SUPERVISE_INTERVAL_SEC = 1
 
 
 class RecnodeMsgConsumeJob(Job):
     def __init__(
         self,
-        redis_conf: RedisConfig,
+        queue: RecnodeMsgQueue,
         sqs: SQSAsyncClient,
         registrar: RecnodeTaskRegistrar,
+        poller_cnt: int = DEFAULT_POLLER_CNT,
+        error_backoff_sec: float = DEFAULT_ERROR_BACKOFF_SEC,
+        supervise_interval_sec: float = DEFAULT_SUPERVISE_INTERVAL_SEC,
     ):
         super().__init__(name=RECNODE_MSG_CONSUME_JOB_NAME)
         self.__sqs = sqs
-        self.__queue = RecnodeMsgQueue(redis_conf)
+        self.__queue = queue
         self.__registrar = registrar
+        self.__poller_cnt = poller_cnt
+        self.__error_backoff_sec = error_backoff_sec
+        self.__supervise_interval_sec = supervise_interval_sec
+
+        self.__pollers: set[asyncio.Task] = set()
+        self.__delete_tasks: set[asyncio.Task] = set()
 
     async def run(self):
+        # Each poller runs its own loop, so a long poll never holds up the others.
+        # They are background tasks of the cron loop, because the cron job can only stop between the runs,
+        # and this run just restarts the pollers that are gone.
+        while len(self.__pollers) < self.__poller_cnt:
+            self.__pollers.add(asyncio.create_task(self.__poll_forever()))
+        done, _ = await asyncio.wait(
+            self.__pollers, timeout=self.__supervise_interval_sec, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            self.__pollers.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                log.error("SQS poller stopped", error_dict(task.exception()))  # type: ignore
+
+    async def __poll_forever(self):
+        # The receive long-polls by itself, so only the errors back off
+        while True:
+            try:
+                await self.__poll()
+            except Exception as e:
+                log.error("Failed to poll SQS messages", error_dict(e))
+                await asyncio.sleep(self.__error_backoff_sec)
+
+    async def __poll(self) -> int:
         messages = await self.__sqs.receive()
+        if len(messages) == 0:
+            return 0
 
+        completed: list[RecnodeMsg] = []
         for recnode_msg in [RecnodeMsg(**json.loads(msg.body)) for msg in messages]:
             if recnode_msg.status == RecnodeDoneStatus.COMPLETE:
-                await self.__queue.push(recnode_msg)
+                completed.append(recnode_msg)
             elif recnode_msg.status == RecnodeDoneStatus.CANCELED:
                 queue_name = self.__registrar.resolve_queue(recnode_msg)
                 self.__registrar.register(recnode_msg, queue_name)
+        await self.__queue.push_many(completed)
+
+        # The messages are deleted only after they are queued, and the next receive does not wait for it
+        task = asyncio.create_task(self.__delete(messages))
+        self.__delete_tasks.add(task)
+        task.add_done_callback(self.__delete_tasks.discard)
+        return len(messages)
 
-        if len(messages) > 0:
+    async def __delete(self, messages: list[SQSMessage]):
+        try:
             await self.__sqs.delete(messages)
+        except Exception as e:
+            # The messages are received again after the visibility timeout, and the duplicates are claimed only once
+            err_info = error_dict(e)
+            err_info["count"] = len(messages)
+            log.error("Failed to delete SQS messages", err_info)
+
+    async def close(self):
+        for task in self.__pollers:
+            task.cancel()
+        await asyncio.gather(*self.__pollers, return_exceptions=True)
+        self.__pollers = set()
+        await asyncio.gather(*self.__delete_tasks, return_exceptions=True)
+        await self.__sqs.close()
@@ -1,41 +1,102 @@
 import asyncio
+import os
+import socket
+import time
+
+from pyutils import log
 
 from .recnode_task_registrar import RecnodeTaskRegistrar
-from ...celery import CeleryRedisBrokerClient, find_active_worker_names, app
+from ...celery import CeleryRedisBrokerClient, CeleryWorkerRegistry
 from ...common.job import Job
-from ...external.redis import RedisConfig
-from ...recnode import RecnodeMsg, RecnodeMsgQueue
+from ...recnode import RecnodeMsgQueue, RecnodeQueuedMsg
 
 RECNODE_TASK_REGISTER_JOB_NAME = "recnode_task_register_job"
+DEFAULT_WAIT_TIMEOUT_SEC = 5
+DEFAULT_ERROR_BACKOFF_SEC = 5
+DEFAULT_REAP_INTERVAL_SEC = 60
 
 
 class RecnodeTaskRegisterJob(Job):
     def __init__(
         self,
-        redis_conf: RedisConfig,
+        queue: RecnodeMsgQueue,
         registrar: RecnodeTaskRegistrar,
         celery_redis: CeleryRedisBrokerClient,
-        received_task_threshold: int = 1,
+        worker_registry: CeleryWorkerRegistry,
+        per_worker_threshold: int = 1,  # received tasks allowed per worker consuming the queue
+        wait_timeout_sec: float = DEFAULT_WAIT_TIMEOUT_SEC,
+        error_backoff_sec: float = DEFAULT_ERROR_BACKOFF_SEC,
+        reap_interval_sec: float = DEFAULT_REAP_INTERVAL_SEC,
+        consumer_id: str | None = None,
     ):
         super().__init__(name=RECNODE_TASK_REGISTER_JOB_NAME)
 
-        self.__queue = RecnodeMsgQueue(redis_conf)
+        self.__queue = queue
         self.__registrar = registrar
         self.__celery_redis = celery_redis
+        self.__worker_registry = worker_registry
+
+        self.per_worker_threshold = per_worker_threshold
+        self.wait_timeout_sec = wait_timeout_sec
+        self.error_backoff_sec = error_backoff_sec
+        self.reap_interval_sec = reap_interval_sec
+        self.consumer_id = consumer_id or f"{socket.gethostname()}:{os.getpid()}"
 
-        self.received_task_threshold = received_task_threshold
+        self.__recovered = False
+        self.__reaped_at = 0.0
 
     async def run(self):
-        workers = await asyncio.to_thread(find_active_worker_names, app)
-        if len(workers) == 0:
-            return
+        # The cron job runs this without an interval: it blocks until a message is pushed or a slot is freed,
+        # and falls back to the timeout for the changes that are not signaled (e.g. a worker joining or leaving)
+        try:
+            await self.__queue.keep_alive(self.consumer_id)
+            await self.__reap()
 
-        msg: RecnodeMsg | None = await self.__queue.get()
-        if msg is None:
-            return
+            item = await self.__queue.take(self.consumer_id, timeout_sec=self.wait_timeout_sec)
+            if item is None:
+                return
+            if not await self.dispatch(item):
+                await self.__queue.wait(timeout_sec=self.wait_timeout_sec)
+        except Exception:
+            await asyncio.sleep(self.error_backoff_sec)
+            raise
+
+    async def dispatch(self, first: RecnodeQueuedMsg) -> bool:  # return False if stopped by a full queue
+        capacities: dict[str, int] = {}
+        for worker in await self.__worker_registry.list_workers():
+            for queue_name in worker.queues:
+                capacities[queue_name] = capacities.get(queue_name, 0) + self.per_worker_threshold
 
-        queue_name = self.__registrar.resolve_queue(msg)
-        received_tasks = await self.__celery_redis.get_received_tasks(queue_name)
-        if len(received_tasks) < self.received_task_threshold:
-            self.__registrar.register(msg, queue_name)
-            await self.__queue.pop()
+        free_slots: dict[str, int] = {}
+        item: RecnodeQueuedMsg | None = first
+        while item is not None:
+            queue_name = self.__registrar.resolve_queue(item.msg)
+            if queue_name not in free_slots:
+                received_cnt = await self.__celery_redis.count(queue_name)
+                free_slots[queue_name] = capacities.get(queue_name, 0) - received_cnt
+            # Messages are dispatched in order, so a full queue holds back the ones behind it
+            if free_slots[queue_name] <= 0:
+                await self.__queue.release(self.consumer_id)
+                return False
+
+            self.__registrar.register(item.msg, queue_name)
+            await self.__queue.ack(self.consumer_id, item)
+            free_slots[queue_name] -= 1
+            item = await self.__queue.take(self.consumer_id)
+        return True
+
+    async def __reap(self):
+        # Messages left in flight by a previous run with the same id are requeued first,
+        # then those of the dispatchers whose lease expired
+        if not self.__recovered:
+            cnt = await self.__queue.recover(self.consumer_id)
+            self.__recovered = True
+            if cnt > 0:
+                log.warn("Requeued in-flight recnode messages", {"consumer_id": self.consumer_id, "count": cnt})
+
+        if time.monotonic() - self.__reaped_at < self.reap_interval_sec:
+            return
+        self.__reaped_at = time.monotonic()
+        cnt = await self.__queue.reap()
+        if cnt > 0:
+            log.warn("Requeued stale recnode messages", {"count": cnt})
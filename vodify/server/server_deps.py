@@ -1,21 +1,30 @@
+import asyncio
+
 from fastapi import APIRouter
 
-from .celery import CeleryController
+from .celery import CeleryController, CeleryInspectJob
 from .recnode import RecnodeController, RecnodeTaskRegistrar, RecnodeTaskRegisterJob, RecnodeMsgConsumeJob
-from ..celery import CeleryRedisBrokerClient
+from ..celery import app, CeleryRedisBrokerClient, CeleryWorkerRegistry
 from ..common.job import CronJob
+from ..common.task import TaskStatusRepository
 from ..env import get_server_env, get_celery_env
+from ..external.redis import get_redis_pool_stats, close_redis_pools
 from ..external.sqs import SQSAsyncClient
+from ..recnode import RecnodeMsgQueue
 
 
 class DefaultController:
     def __init__(self):
         self.router = APIRouter(prefix="/api")
         self.router.add_api_route("/health", self.health, methods=["GET"])
+        self.router.add_api_route("/redis/pools", self.get_redis_pools, methods=["GET"])
 
     def health(self):
         return {"status": "UP"}
 
+    def get_redis_pools(self):
+        return get_redis_pool_stats()
+
 
 class ServerDependencyManager:
     def __init__(self):
@@ -29,17 +38,43 @@ class ServerDependencyManager:
 
         # celery
         celery_redis_broker = CeleryRedisBrokerClient(self.celery_env.redis)
-        celery_controller = CeleryController(celery_redis_broker)
+        celery_inspect_job = CeleryInspectJob(app)
+        interval_sec = self.server_env.celery_inspect_interval_sec
+        self.celery_inspect_cron = CronJob(job=celery_inspect_job, interval_sec=interval_sec, unstoppable=True)
+        celery_controller = CeleryController(celery_redis_broker, celery_inspect_job)
         self.celery_router = celery_controller.router
 
         # recnode
         recnode_registrar = RecnodeTaskRegistrar()
+        recnode_queue = RecnodeMsgQueue(redis_conf)
 
-        recnode_register_job = RecnodeTaskRegisterJob(redis_conf, recnode_registrar, celery_redis_broker)
-        self.recnode_register_cron = CronJob(job=recnode_register_job, interval_sec=5, unstoppable=True)
+        recnode_register_job = RecnodeTaskRegisterJob(
+            recnode_queue,
+            recnode_registrar,
+            celery_redis_broker,
+            CeleryWorkerRegistry(redis_conf),
+        )
+        # The job waits for the queue signals by itself
+        self.recnode_register_cron = CronJob(job=recnode_register_job, interval_sec=0, unstoppable=True)
 
-        recnode_consume_job = RecnodeMsgConsumeJob(redis_conf, SQSAsyncClient(self.server_env.sqs), recnode_registrar)
-        self.recnode_consume_cron = CronJob(job=recnode_consume_job, interval_sec=1, unstoppable=True)
+        poller_cnt = self.server_env.sqs_poller_cnt
+        # Each poller holds a connection for its long poll, and the deletes run alongside
+        sqs = SQSAsyncClient(self.server_env.sqs, max_pool_connections=poller_cnt * 2)
+        recnode_consume_job = RecnodeMsgConsumeJob(recnode_queue, sqs, recnode_registrar, poller_cnt=poller_cnt)
+        # The pollers long-poll in their own loops, and the runs only supervise them
+        self.recnode_consume_cron = CronJob(job=recnode_consume_job, interval_sec=0, unstoppable=True)
 
-        recnode_controller = RecnodeController(redis_conf, self.recnode_register_cron, recnode_registrar)
+        recnode_controller = RecnodeController(
+            recnode_queue,
+            self.recnode_register_cron,
+            recnode_registrar,
+            TaskStatusRepository(redis_conf),
+        )
         self.recnode_router = recnode_controller.router
+
+    async def close(self):
+        # The cron jobs are stopped first, so that their loops are done with the pools before they are closed
+        for cron in [self.recnode_consume_cron, self.recnode_register_cron, self.celery_inspect_cron]:
+            if cron.is_running():
+                await asyncio.to_thread(cron.stop)
+        await close_redis_pools()
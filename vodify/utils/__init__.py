@@ -9,26 +9,34 @@ from .file import (
     ensure_dir,
     read_dir_recur,
     move_directory_not_recur,
+    move_files,
+    MoveResult,
     listdir_recur,
     rmtree,
     move_file,
+    is_same_device,
     copy_file,
     copy_file2,
+    concat_files,
     open_tar,
     utime,
 )
+from .disk import DiskReservationLedger, DiskReservationResult
 from .http import get_headers, fetch_text, fetch_json
 from .limiter import nio_limiter
 from .proxy import ProxyConfig
+from .tar import TarStreamExtractor, TarMemberHeader, HashFactory, extract_tar_file, read_tar_headers, extract_tar_ranges
 from .yaml import write_yaml_file
 
 targets = [
+    "disk",
     "file",
     "http",
     "limiter",
     "process",
     "proxy",
     "stats",
+    "tar",
     "time",
     "yaml",
 ]
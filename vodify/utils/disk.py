@@ -0,0 +1,157 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import socket
+import time
+from typing import Callable, TypeVar
+
+from pydantic import BaseModel
+from pyutils import path_join
+
+LEDGER_FILE_NAME = ".disk_reservations.json"
+LOCK_FILE_NAME = ".disk_reservations.lock"
+BOOT_ID_FILE_PATH = "/proc/sys/kernel/random/boot_id"
+
+T = TypeVar("T")
+
+
+class DiskReservation(BaseModel):
+    size: int
+    pid: int
+    created_at: float
+    path: str | None = None  # where the reserved space is written, if known
+    host: str = ""  # hostname of the reserving process, which differs per container
+    boot_id: str = ""
+
+
+class DiskReservationResult(BaseModel):
+    reserved: bool
+    required: int
+    available: int
+    reserved_by_others: int
+
+
+# Reservations of the disk space shared by the worker processes of a node.
+# The ledger is a json file guarded by `flock`, so it is only consistent within a single node
+class DiskReservationLedger:
+    def __init__(self, dir_path: str, get_free_size: Callable[[str], int] | None = None):
+        self.__dir_path = dir_path
+        self.__ledger_path = path_join(dir_path, LEDGER_FILE_NAME)
+        self.__lock_path = path_join(dir_path, LOCK_FILE_NAME)
+        self.__get_free_size = get_free_size or _get_free_size
+        self.__host = socket.gethostname()
+        self.__boot_id = _read_boot_id()
+
+    async def reserve(self, key: str, size: int, path: str | None = None) -> DiskReservationResult:
+        return await asyncio.to_thread(self.__reserve_sync, key, size, path)
+
+    async def update(self, key: str, size: int):
+        await asyncio.to_thread(self.__transact, lambda entries: self.__update(entries, key, size))
+
+    async def release(self, key: str):
+        await asyncio.to_thread(self.__transact, lambda entries: entries.pop(key, None))
+
+    async def reserved_size(self) -> int:
+        return await asyncio.to_thread(self.__transact, lambda entries: sum(e.size for e in entries.values()))
+
+    def __reserve_sync(self, key: str, size: int, path: str | None) -> DiskReservationResult:
+        # The directories are walked without the lock, a reservation added meanwhile is counted as fully unwritten
+        paths = self.__transact(lambda entries: {k: e.path for k, e in entries.items() if k != key and e.path is not None})
+        written = {k: _get_dir_size(p) for k, p in paths.items()}
+        return self.__transact(lambda entries: self.__reserve(entries, key, size, path, written))
+
+    def __reserve(
+        self,
+        entries: dict[str, DiskReservation],
+        key: str,
+        size: int,
+        path: str | None,
+        written: dict[str, int],
+    ) -> DiskReservationResult:
+        # The written part of the others' space is already missing from the free space, so only the rest is excluded
+        others = sum(max(entry.size - written.get(k, 0), 0) for k, entry in entries.items() if k != key)
+        available = self.__get_free_size(self.__dir_path) - others
+        if size > available:
+            return DiskReservationResult(reserved=False, required=size, available=available, reserved_by_others=others)
+        entries[key] = DiskReservation(
+            size=size, pid=os.getpid(), created_at=time.time(), path=path, host=self.__host, boot_id=self.__boot_id
+        )
+        return DiskReservationResult(reserved=True, required=size, available=available, reserved_by_others=others)
+
+    def __update(self, entries: dict[str, DiskReservation], key: str, size: int):
+        entry = entries.get(key)
+        if entry is not None:
+            entry.size = size
+
+    def __transact(self, fn: Callable[[dict[str, DiskReservation]], T]) -> T:
+        os.makedirs(self.__dir_path, exist_ok=True)
+        with open(self.__lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                entries = self.__load()
+                result = fn(entries)
+                self.__save(entries)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def __load(self) -> dict[str, DiskReservation]:
+        if not os.path.exists(self.__ledger_path):
+            return {}
+        with open(self.__ledger_path, "r") as f:
+            text = f.read()
+        if len(text) == 0:
+            return {}
+        entries = {k: DiskReservation(**v) for k, v in json.loads(text).items()}
+        # Reservations of dead processes are never released by themselves
+        return {k: entry for k, entry in entries.items() if not self.__is_stale(entry)}
+
+    def __is_stale(self, entry: DiskReservation) -> bool:
+        # A pid is only meaningful in the pid namespace of its own container, and nothing survives a reboot.
+        # The reservations of other live containers are kept until they are released
+        if entry.boot_id != self.__boot_id:
+            return True
+        if entry.host != self.__host:
+            return False
+        return not _is_alive(entry.pid)
+
+    def __save(self, entries: dict[str, DiskReservation]):
+        tmp_path = f"{self.__ledger_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({k: entry.model_dump() for k, entry in entries.items()}, f)
+        os.replace(tmp_path, self.__ledger_path)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _get_free_size(dir_path: str) -> int:
+    return shutil.disk_usage(dir_path).free
+
+
+def _read_boot_id() -> str:
+    try:
+        with open(BOOT_ID_FILE_PATH, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _get_dir_size(dir_path: str) -> int:
+    size = 0
+    for root, _, file_names in os.walk(dir_path):
+        for file_name in file_names:
+            try:
+                size += os.lstat(os.path.join(root, file_name)).st_size
+            except FileNotFoundError:
+                pass  # deleted while walking
+    return size
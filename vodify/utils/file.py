@@ -1,13 +1,22 @@
 import asyncio
+import errno
 import os
 import shutil
 import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import FileIO
 from pathlib import Path
 
 import aiofiles
 from aiofiles import os as aios
+from pydantic import BaseModel
 from pyutils import path_join, dirpath
 
+DEFAULT_CONCAT_BUF_SIZE = 1024 * 1024
+DEFAULT_CONCAT_CHUNK_SIZE = 1024 * 1024 * 1024
+DEFAULT_MOVE_COPY_CONCURRENCY = 4
+
 
 def stem(file_path: str) -> str:
     return Path(file_path).stem
@@ -54,16 +63,81 @@ def read_dir_recur(dir_path: str):
     return paths
 
 
-async def move_directory_not_recur(src_dir_path: str, dst_dir_path: str):
-    move_start = asyncio.get_event_loop().time()
-    await aios.makedirs(dst_dir_path, exist_ok=True)
-    for file_path in await aios.listdir(src_dir_path):
-        if await aios.path.isdir(file_path):
-            raise ValueError("only supports files")
-        src = path_join(src_dir_path, file_path)
-        dst = path_join(dst_dir_path, file_path)
-        await move_file(src=src, dst=dst)
-    return asyncio.get_event_loop().time() - move_start
+class MoveResult(BaseModel):
+    file_count: int
+    renamed_count: int
+    copied_count: int
+    duration: float
+
+
+async def move_directory_not_recur(src_dir_path: str, dst_dir_path: str) -> MoveResult:
+    return await asyncio.to_thread(_move_directory_not_recur, src_dir_path, dst_dir_path)
+
+
+def _move_directory_not_recur(src_dir_path: str, dst_dir_path: str) -> MoveResult:
+    start = time.monotonic()
+    os.makedirs(dst_dir_path, exist_ok=True)
+    pairs = []
+    with os.scandir(src_dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                raise ValueError(f"only supports files: {entry.path}")
+            pairs.append((entry.path, path_join(dst_dir_path, entry.name)))
+    return _move_files(pairs, DEFAULT_MOVE_COPY_CONCURRENCY, start)
+
+
+async def move_files(pairs: list[tuple[str, str]], copy_concurrency: int = DEFAULT_MOVE_COPY_CONCURRENCY) -> MoveResult:
+    # Moves all files in a single thread hop, renaming them if the source and destination are on the same device
+    return await asyncio.to_thread(_move_files, pairs, copy_concurrency, time.monotonic())
+
+
+def _move_files(pairs: list[tuple[str, str]], copy_concurrency: int, start: float) -> MoveResult:
+    dev_cache: dict[str, int] = {}
+
+    def get_dev(dir_path: str) -> int:
+        if dir_path not in dev_cache:
+            dev_cache[dir_path] = os.stat(dir_path).st_dev
+        return dev_cache[dir_path]
+
+    cross_pairs = []
+    for src, dst in pairs:
+        if get_dev(os.path.dirname(src)) != get_dev(os.path.dirname(dst)):
+            cross_pairs.append((src, dst))
+            continue
+        try:
+            os.rename(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            cross_pairs.append((src, dst))
+
+    if len(cross_pairs) > 0:
+        with ThreadPoolExecutor(max_workers=copy_concurrency) as executor:
+            for _ in executor.map(lambda pair: _copy_and_unlink(*pair), cross_pairs):
+                pass
+
+    return MoveResult(
+        file_count=len(pairs),
+        renamed_count=len(pairs) - len(cross_pairs),
+        copied_count=len(cross_pairs),
+        duration=round(time.monotonic() - start, 2),
+    )
+
+
+def _copy_and_unlink(src: str, dst: str):
+    copy_file_nocache(src, dst)
+    shutil.copystat(src, dst)
+    os.remove(src)
+
+
+def copy_file_nocache(src: str, dst: str):
+    # Drops the copied pages from the page cache, so that a large copy does not evict the cache of the other tasks
+    with open(src, "rb", buffering=0) as src_file, open(dst, "wb", buffering=0) as dst_file:
+        FileRangeCopier().copy(src_file, dst_file, os.fstat(src_file.fileno()).st_size)
+        if hasattr(os, "posix_fadvise"):
+            os.fdatasync(dst_file.fileno())
+            os.posix_fadvise(src_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            os.posix_fadvise(dst_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
 
 
 async def rmtree(dir_path: str):
@@ -71,7 +145,28 @@ async def rmtree(dir_path: str):
 
 
 async def move_file(src: str, dst: str):
-    await asyncio.to_thread(shutil.move, src=src, dst=dst)
+    await asyncio.to_thread(_move_file, src, dst)
+
+
+def _move_file(src: str, dst: str):
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        _copy_and_unlink(src, dst)
+
+
+def is_same_device(path1: str, path2: str) -> bool:
+    return _get_device(path1) == _get_device(path2)
+
+
+def _get_device(path: str) -> int:
+    # The path may not be created yet, so the nearest existing parent is used
+    cur = os.path.abspath(path)
+    while not os.path.exists(cur):
+        cur = os.path.dirname(cur)
+    return os.stat(cur).st_dev
 
 
 async def copy_file(src: str, dst: str):
@@ -86,6 +181,62 @@ async def utime(path: str, times: tuple[float, float]):
     await asyncio.to_thread(os.utime, path, times)
 
 
+async def concat_files(src_paths: list[str], dst_path: str, remove_src: bool = False):
+    await asyncio.to_thread(_concat_files, src_paths, dst_path, remove_src)
+
+
+def _concat_files(src_paths: list[str], dst_path: str, remove_src: bool):
+    copier = FileRangeCopier()
+    # Unbuffered, because the kernel copies move the file offsets directly
+    with open(dst_path, "wb", buffering=0) as dst:
+        for src_path in src_paths:
+            with open(src_path, "rb", buffering=0) as src:
+                copier.copy(src, dst, os.fstat(src.fileno()).st_size)
+            if remove_src:
+                os.remove(src_path)
+
+
+# Copies `size` bytes from the current offset of `src` to the current offset of `dst`.
+# Copies in the kernel if possible, so that the file data never passes through python objects
+class FileRangeCopier:
+    def __init__(self, buf_size: int = DEFAULT_CONCAT_BUF_SIZE):
+        self.__use_copy_file_range = hasattr(os, "copy_file_range")
+        self.__use_sendfile = hasattr(os, "sendfile")
+        self.__buf = bytearray(buf_size)
+
+    def copy(self, src: FileIO, dst: FileIO, size: int):
+        src_fd = src.fileno()
+        dst_fd = dst.fileno()
+        remaining = size
+        while remaining > 0:
+            size = min(remaining, DEFAULT_CONCAT_CHUNK_SIZE)
+            if self.__use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(src_fd, dst_fd, size)
+                except OSError:
+                    self.__use_copy_file_range = False
+                    continue
+            elif self.__use_sendfile:
+                try:
+                    copied = os.sendfile(dst_fd, src_fd, None, size)
+                except OSError:
+                    self.__use_sendfile = False
+                    continue
+            else:
+                copied = self.__copy_buffered(src, dst, size)
+            if copied == 0:
+                raise ValueError(f"Unexpected end of file: {src.name}")
+            remaining -= copied
+
+    def __copy_buffered(self, src: FileIO, dst: FileIO, size: int) -> int:
+        view = memoryview(self.__buf)
+        copied = src.readinto(view[: min(size, len(self.__buf))]) or 0
+        written = 0
+        while written < copied:
+            written += dst.write(view[written:copied]) or 0
+        return copied
+
+
 def _open_tar(tar_path: str, out_dir_path: str):
     with tarfile.open(tar_path, "r:*") as tar:
         tar.extractall(path=out_dir_path)
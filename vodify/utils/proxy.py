@@ -9,7 +9,7 @@ class ProxyConfig(BaseModel):
     password: constr(min_length=1)
     rdns: bool
 
-    def proxy_connector(self):
+    def proxy_connector(self, **kwargs):
         return ProxyConnector(
             proxy_type=ProxyType.SOCKS5,
             host=self.host,
@@ -17,4 +17,5 @@ class ProxyConfig(BaseModel):
             username=self.username,
             password=self.password,
             rdns=self.rdns,
+            **kwargs,
         )
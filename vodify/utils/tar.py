@@ -0,0 +1,252 @@
+import asyncio
+import os
+import queue
+import shutil
+import tarfile
+from asyncio import Task
+from pathlib import Path
+from typing import IO, Any, BinaryIO, Callable
+
+from pydantic import BaseModel
+from pyutils import path_join
+
+from .file import FileRangeCopier
+
+_EOF = b""
+_ABORT = None
+
+DEFAULT_STREAM_QUEUE_SIZE = 64
+DEFAULT_COPY_BUF_SIZE = 1024 * 1024
+
+# Called with the output path of each extracted member, returns the function fed with its data while it is copied
+HashFactory = Callable[[str], Callable[[memoryview], Any]]
+
+
+class TarStreamAbortedError(Exception):
+    def __init__(self):
+        super().__init__("Tar stream aborted")
+
+
+# File-like object for `tarfile`, fed with chunks from the event loop
+class _QueueReader:
+    def __init__(self, chunks: queue.Queue, tee: IO[bytes] | None):
+        self.__chunks = chunks
+        self.__tee = tee
+        self.__buf = bytearray()
+        self.__eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.__eof and (size < 0 or len(self.__buf) < size):
+            self.__fill()
+        if size < 0 or size >= len(self.__buf):
+            data = bytes(self.__buf)
+            self.__buf.clear()
+            return data
+        data = bytes(self.__buf[:size])
+        del self.__buf[:size]
+        return data
+
+    def drain(self):
+        self.__buf.clear()
+        while not self.__eof:
+            self.__fill()
+            self.__buf.clear()
+
+    def __fill(self):
+        chunk = self.__chunks.get()
+        if chunk is _ABORT:
+            raise TarStreamAbortedError()
+        if chunk == _EOF:
+            self.__eof = True
+            return
+        if self.__tee is not None:
+            self.__tee.write(chunk)
+        self.__buf.extend(chunk)
+
+
+class TarMemberHeader(BaseModel):
+    tar_path: str
+    name: str
+    size: int
+    offset: int  # offset of the member data in the tar file
+
+
+def _read_tar_headers(tar_path: str) -> list[TarMemberHeader]:
+    # Only uncompressed tars are supported, because the member data is copied by its offset
+    headers = []
+    with tarfile.open(tar_path, "r:") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            header = TarMemberHeader(tar_path=tar_path, name=member.name, size=member.size, offset=member.offset_data)
+            headers.append(header)
+    return headers
+
+
+async def read_tar_headers(tar_path: str) -> list[TarMemberHeader]:
+    return await asyncio.to_thread(_read_tar_headers, tar_path)
+
+
+def _extract_tar_ranges(targets: list[tuple[TarMemberHeader, str]]):
+    by_tar: dict[str, list[tuple[TarMemberHeader, str]]] = {}
+    for header, out_file_path in targets:
+        by_tar.setdefault(header.tar_path, []).append((header, out_file_path))
+
+    copier = FileRangeCopier()
+    for tar_path, tar_targets in by_tar.items():
+        with open(tar_path, "rb", buffering=0) as src:
+            for header, out_file_path in sorted(tar_targets, key=lambda x: x[0].offset):
+                src.seek(header.offset)
+                with open(out_file_path, "wb", buffering=0) as dst:
+                    copier.copy(src, dst, header.size)
+
+
+async def extract_tar_ranges(targets: list[tuple[TarMemberHeader, str]]):
+    # Extracts each member to its output path, opening each tar only once
+    await asyncio.to_thread(_extract_tar_ranges, targets)
+
+
+def extract_tar_members(
+    tar: tarfile.TarFile,
+    out_dir_path: str,
+    ext: str,
+    paths: list[str],
+    hash_factory: HashFactory | None = None,
+):
+    for member in tar:
+        if not member.isfile():
+            continue
+        if not member.name.endswith(ext):
+            raise ValueError(f"Invalid file ext: {member.name}")
+        src = tar.extractfile(member)
+        if src is None:
+            continue
+        out_file_path = path_join(out_dir_path, Path(member.name).name)
+        paths.append(out_file_path)
+        with open(out_file_path, "wb") as dst:
+            if hash_factory is None:
+                shutil.copyfileobj(src, dst, DEFAULT_COPY_BUF_SIZE)
+            else:
+                _copy_with_hash(src, dst, hash_factory(out_file_path))
+
+
+def _copy_with_hash(src: IO[bytes], dst: IO[bytes], update: Callable[[memoryview], Any]):
+    while True:
+        chunk = src.read(DEFAULT_COPY_BUF_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+        update(memoryview(chunk))
+
+
+def _extract_tar_file(tar_path: str, out_dir_path: str, ext: str, hash_factory: HashFactory | None) -> list[str]:
+    paths: list[str] = []
+    with tarfile.open(name=tar_path, mode="r|*") as tar:
+        extract_tar_members(tar, out_dir_path, ext, paths, hash_factory)
+    return paths
+
+
+async def extract_tar_file(
+    tar_path: str, out_dir_path: str, ext: str = ".ts", hash_factory: HashFactory | None = None
+) -> list[str]:
+    return await asyncio.to_thread(_extract_tar_file, tar_path, out_dir_path, ext, hash_factory)
+
+
+# Extracts the `ext` members of a tar while it is being received, failing on any other file,
+# optionally teeing the raw archive to `tee_file_path` in the same pass
+class TarStreamExtractor:
+    def __init__(
+        self,
+        out_dir_path: str,
+        ext: str = ".ts",
+        tee_file_path: str | None = None,
+        queue_size: int = DEFAULT_STREAM_QUEUE_SIZE,
+        hash_factory: HashFactory | None = None,  # called again for the members extracted again after `reset()`
+    ):
+        self.__out_dir_path = out_dir_path
+        self.__ext = ext
+        self.__tee_file_path = tee_file_path
+        self.__hash_factory = hash_factory
+        self.__queue_size = queue_size
+
+        self.__chunks: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__task: Task | None = None
+        self.paths: list[str] = []
+
+    def start(self):
+        if self.__task is not None:
+            raise ValueError("TarStreamExtractor already started")
+        self.__chunks = queue.Queue(maxsize=self.__queue_size)
+        self.paths = []
+        self.__task = asyncio.create_task(asyncio.to_thread(self.__run))
+
+    async def write(self, chunk: bytes):
+        if len(chunk) == 0:
+            return
+        await self.__put(chunk)
+
+    async def close(self) -> list[str]:
+        task = self.__check_task()
+        await self.__put(_EOF)
+        await task
+        self.__task = None
+        return self.paths
+
+    async def reset(self):
+        await self.abort()
+        self.start()
+
+    async def abort(self):
+        task = self.__task
+        if task is None:
+            return
+        if not task.done():
+            await self.__put(_ABORT)
+        try:
+            await task
+        except Exception:
+            pass
+        self.__task = None
+        await asyncio.to_thread(self.__clear_outputs)
+
+    async def __put(self, item: bytes | None):
+        task = self.__check_task()
+        while True:
+            if task.done():
+                await task  # raise the exception from the extracting thread
+                raise ValueError("Tar stream already closed")
+            try:
+                self.__chunks.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    await asyncio.to_thread(self.__chunks.put, item, True, 0.5)
+                    return
+                except queue.Full:
+                    continue
+
+    def __check_task(self) -> Task:
+        if self.__task is None:
+            raise ValueError("TarStreamExtractor not started")
+        return self.__task
+
+    def __run(self):
+        tee: BinaryIO | None = None
+        if self.__tee_file_path is not None:
+            tee = open(self.__tee_file_path, "wb")
+        try:
+            reader = _QueueReader(self.__chunks, tee)
+            with tarfile.open(fileobj=reader, mode="r|") as tar:  # type: ignore
+                extract_tar_members(tar, self.__out_dir_path, self.__ext, self.paths, self.__hash_factory)
+            reader.drain()
+        finally:
+            if tee is not None:
+                tee.close()
+
+    def __clear_outputs(self):
+        for path in self.paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.paths = []
+        if self.__tee_file_path is not None and os.path.exists(self.__tee_file_path):
+            os.remove(self.__tee_file_path)